@@ -18,6 +18,8 @@ class Client:
         name="dualsens",
         deadzone=5,
         dummy_ws=False,
+        max_speed=0.6,
+        max_rotation=4.0,
     ):
         self.name = name
         self.websocket_url = websocket_url
@@ -40,6 +42,8 @@ class Client:
         self.throttle = 0
         self.steering = 0
         self.reverse = False
+        self.max_speed = max_speed  # m/s at full throttle
+        self.max_rotation = max_rotation  # rad/s with the joystick on a side
 
         self.run = True
 
@@ -93,9 +97,7 @@ class Client:
             )
             print("l_throttle: ", self.throttle_l, " - reverse: ", self.reverse_l)
         else:
-            await self.send_data(
-                f"self.robot.l_motor({0}, {True})"
-            )
+            await self.send_data(f"self.robot.l_motor({0}, {True})")
 
         if self.throttle_r > 0:
             await self.send_data(
@@ -103,35 +105,21 @@ class Client:
             )
             print("r_throttle: ", self.throttle_r, " - reverse: ", self.reverse_r)
         else:
-            await self.send_data(
-                f"self.robot.r_motor({0}, {True})"
-            )
+            await self.send_data(f"self.robot.r_motor({0}, {True})")
 
     async def auto_handler(self):
-        l_force = self.throttle + self.steering
-        r_force = self.throttle - self.steering
+        # The robot does the mixing (Pipou.drive): one message, both wheels at once
+        v = self.throttle / 255 * self.max_speed
+        # Joystick on the right (steering > 0): clockwise
+        omega = -self.steering / 128 * self.max_rotation
 
         if self.reverse:
-            l_force = -l_force
-            r_force = -r_force
-
-        l_reverse = l_force < 0 
-        r_reverse = r_force < 0
-        if l_reverse:
-            l_force = -l_force
-        if r_reverse:
-            r_force = -r_force
-
-        if l_force > 255:
-            l_force = 255
-        if r_force > 255:
-            r_force = 255
-
-        print("l_force: ", l_force, " - l_reverse: ", l_reverse)
-        print("r_force: ", r_force, " - r_reverse: ", r_reverse)
-
-        await self.send_data(f"self.robot.l_motor({l_force}, {l_reverse})")
-        await self.send_data(f"self.robot.r_motor({r_force}, {r_reverse})")
+            v = -v
+            omega = -omega
+
+        print("v: ", round(v, 3), " - omega: ", round(omega, 3))
+
+        await self.send_data(f"self.robot.drive({v:.4f}, {omega:.4f})")
 
     def joystick_handler(self, stateX, stateY):
         self.steering = stateX
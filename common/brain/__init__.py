@@ -1 +1,4 @@
 from brain.brain import Brain
+from brain.shared_state import SharedState, SharedArray, SharedRecord
+from brain.scheduling import OverrunPolicies
+from brain.worker_pool import WorkerPool
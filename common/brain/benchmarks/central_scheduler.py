@@ -0,0 +1,119 @@
+"""
+Event loop load of the brain routines: one asyncio task per routine (the default of
+Brain.get_tasks) against one RoutineScheduler task (get_tasks(central_scheduler=True)),
+with and without fixed_rate.
+
+50 routines with periods of 10, 20, 50 and 100 ms and an empty body. The wakeups are
+the waits of the event loop in the OS (calls of its selector with a timeout, the loop
+had nothing to run), the iterations all the calls of the selector (one per pass of the
+loop). The CPU is the process time over the wall time.
+
+Run from the common directory:
+    python -m brain.benchmarks.central_scheduler [seconds] [tick]
+"""
+
+from brain.task_wrappers import AsynchronousWrapper
+from brain.scheduling import RoutineScheduler, OverrunPolicies, ROUTINE_STATS
+
+import asyncio
+import sys, time
+
+NB_ROUTINES = 50
+PERIODS = (0.01, 0.02, 0.05, 0.1)
+
+
+class QuietBrain:
+    """
+    What the wrappers use of a brain: a logger, here silent
+    """
+
+    class logger:
+        @staticmethod
+        def log(*args, **kwargs):
+            pass
+
+
+def make_routines(runs: list) -> list:
+    routines = []
+    for index in range(NB_ROUTINES):
+
+        async def task(self, index=index):
+            runs[index] += 1
+
+        task.__name__ = f"routine_{index}"
+        routines.append((task, PERIODS[index % len(PERIODS)]))
+    return routines
+
+
+async def run(mode: str, fixed_rate: bool, seconds: float, tick: float) -> dict:
+    runs = [0] * NB_ROUTINES
+    routines = make_routines(runs)
+    if mode == "tasks":
+        coroutines = [
+            AsynchronousWrapper.wrap_to_routine(
+                QuietBrain, task, period, fixed_rate, OverrunPolicies.SKIP
+            )
+            for task, period in routines
+        ]
+    else:
+        scheduler = RoutineScheduler(QuietBrain.logger, tick)
+        for task, period in routines:
+            scheduler.add(QuietBrain, task, period, fixed_rate)
+        coroutines = [scheduler.run()]
+
+    # Count the returns from the OS wait of the event loop
+    selector = asyncio.get_running_loop()._selector
+    select = selector.select
+    wakeups, iterations = [0], [0]
+
+    def counting_select(timeout=None):
+        iterations[0] += 1
+        if timeout is None or timeout > 0:
+            wakeups[0] += 1
+        return select(timeout)
+
+    selector.select = counting_select
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    start, cpu_start = time.monotonic(), time.process_time()
+    await asyncio.sleep(seconds)
+    wall, cpu = time.monotonic() - start, time.process_time() - cpu_start
+    selector.select = select
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    ROUTINE_STATS.clear()
+
+    expected = sum(seconds / period for _, period in routines)
+    return {
+        "wakeups_per_s": wakeups[0] / wall,
+        "iterations_per_s": iterations[0] / wall,
+        "runs_per_s": sum(runs) / wall,
+        "rate": sum(runs) / expected,
+        "cpu": cpu / wall,
+    }
+
+
+def main() -> None:
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    tick = float(sys.argv[2]) if len(sys.argv) > 2 else 0.001
+    print(
+        f"{NB_ROUTINES} routines, periods {[p * 1e3 for p in PERIODS]} ms, "
+        f"{seconds:.0f} s, tick {tick * 1e3:g} ms"
+    )
+    print(
+        f"  {'mode':<22}{'wakeups/s':>10}{'iterations/s':>13}{'runs/s':>9}"
+        f"{'of nominal':>12}{'CPU':>8}"
+    )
+    for mode in ("tasks", "scheduler"):
+        for fixed_rate in (False, True):
+            r = asyncio.run(run(mode, fixed_rate, seconds, tick))
+            name = f"{mode}{' fixed_rate' if fixed_rate else ''}"
+            print(
+                f"  {name:<22}{r['wakeups_per_s']:>10.0f}{r['iterations_per_s']:>13.0f}"
+                f"{r['runs_per_s']:>9.0f}"
+                f"{r['rate']:>11.0%}{r['cpu']:>8.1%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Latency of the one-shot process tasks: a new process per run (the brain without a
+WorkerPool) against the warm workers of a WorkerPool.
+
+The task increments a counter of a SharedState (checked at the end). The dispatch
+latency is the time from the call to the end of the task seen by the brain:
+* process (fork / spawn): multiprocessing.Process running
+SynchronousWrapper.wrap_to_one_shot, start then join, with the start method of the
+brain on Linux (fork) and the one of macOS and Windows (spawn: new interpreter, imports),
+* timed process: SynchronousWrapper.wrap_timeout_task (a timed task, polls the
+process every 0.1 s),
+* pool: WorkerPool.run, without and with a timeout.
+The startup is the time to fork the workers of the pool, then until each one ran a
+first task.
+
+Run from the common directory:
+    python -m brain.benchmarks.process_dispatch [nb_runs]
+"""
+
+from brain.shared_state import SharedState
+from brain.task_wrappers import SynchronousWrapper
+from brain.worker_pool import WorkerPool
+
+from functools import partial
+import multiprocessing
+import asyncio
+import sys, time
+
+POOL_SIZE = 2
+
+
+class QuietLogger:
+    def log(self, *args, **kwargs):
+        pass
+
+
+def task(self):
+    self.counter = self.counter + 1
+
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    last = len(samples) - 1
+    return (
+        f"p50 {samples[last // 2] * 1e3:8.2f} ms  "
+        f"p99 {samples[round(last * 0.99)] * 1e3:8.2f} ms"
+    )
+
+
+def process_runs(shared, nb_runs: int, method: str) -> list:
+    context = multiprocessing.get_context(method)
+    samples = []
+    for _ in range(nb_runs):
+        start = time.perf_counter()
+        process = context.Process(
+            target=partial(SynchronousWrapper.wrap_to_one_shot, shared, task)
+        )
+        process.start()
+        process.join()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def timed_process_runs(shared, nb_runs: int) -> list:
+    samples = []
+    for _ in range(nb_runs):
+        start = time.perf_counter()
+        await SynchronousWrapper.wrap_timeout_task(
+            shared,
+            partial(SynchronousWrapper.wrap_to_one_shot, shared, task),
+            10,
+            task.__name__,
+        )
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def pool_runs(pool: WorkerPool, nb_runs: int, timeout) -> list:
+    samples = []
+    for _ in range(nb_runs):
+        start = time.perf_counter()
+        await pool.run(task, timeout)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def pool_startup(shared) -> tuple:
+    pool = WorkerPool(size=POOL_SIZE)
+    start = time.perf_counter()
+    pool.start(shared, shared.logger)
+    forked = time.perf_counter() - start
+    await asyncio.gather(*(pool.run(task) for _ in range(POOL_SIZE)))
+    return pool, forked, time.perf_counter() - start
+
+
+async def main_async(shared, nb_runs: int) -> None:
+    pool, forked, ready = await pool_startup(shared)
+    print(
+        f"pool startup ({POOL_SIZE} workers): fork {forked * 1e3:.1f} ms, "
+        f"first runs done {ready * 1e3:.1f} ms"
+    )
+    results = {
+        "process (fork)": process_runs(shared, nb_runs, "fork"),
+        "process (spawn)": process_runs(shared, max(nb_runs // 10, 5), "spawn"),
+        "timed process": await timed_process_runs(shared, max(nb_runs // 10, 5)),
+        "pool": await pool_runs(pool, nb_runs, None),
+        "pool, timed": await pool_runs(pool, nb_runs, 10),
+    }
+    for name, samples in results.items():
+        print(f"  {name:<17} {len(samples):>5} runs  {percentiles(samples)}")
+    print(f"pool {pool.stats()}")
+    pool.close()
+    expected = POOL_SIZE + sum(len(samples) for samples in results.values())
+    print(f"counter {shared.counter} (expected {expected})")
+
+
+def main() -> None:
+    nb_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    shared = SharedState({"counter": "q"}, name="process_dispatch")
+    shared.logger = QuietLogger()
+    asyncio.run(main_async(shared, nb_runs))
+    shared.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Timing of the brain routines, sleep after each run (the default) against fixed rate
+deadlines (fixed_rate=True), for the three overrun policies.
+
+Each routine has a period of 20 ms and blocks the event loop for a given duration
+(time.sleep, as a computation would), in two scenarios:
+* on time: 5 ms runs, the sleep mode drifts by the duration of the run,
+* overrun: 30 ms runs every third one (a run passes the next deadline).
+The measured period is the mean interval between two starts, the drift the lag of the
+last start behind start + k * period.
+
+Run from the common directory:
+    python -m brain.benchmarks.routine_drift [seconds]
+"""
+
+from brain.task_wrappers import AsynchronousWrapper
+from brain.scheduling import OverrunPolicies, ROUTINE_STATS
+
+import asyncio
+import sys, time
+
+PERIOD = 0.02
+SCENARIOS = {"on time": (0.005, 0.005), "overrun": (0.005, 0.030)}
+
+
+class QuietBrain:
+    """
+    What the wrappers use of a brain: a logger, here silent
+    """
+
+    class logger:
+        @staticmethod
+        def log(*args, **kwargs):
+            pass
+
+
+def make_task(name: str, durations: tuple, starts: list):
+    short, long = durations
+
+    async def task(self):
+        starts.append(time.monotonic())
+        time.sleep(long if len(starts) % 3 == 0 else short)
+
+    task.__name__ = name
+    return task
+
+
+async def run(mode: str, durations: tuple, seconds: float) -> dict:
+    starts = []
+    task = make_task(mode, durations, starts)
+    if mode == "sleep":
+        routine = AsynchronousWrapper.wrap_to_routine(QuietBrain, task, PERIOD)
+    else:
+        routine = AsynchronousWrapper.wrap_to_routine(
+            QuietBrain, task, PERIOD, True, OverrunPolicies[mode]
+        )
+    try:
+        await asyncio.wait_for(routine, seconds)
+    except asyncio.TimeoutError:
+        pass
+    intervals = [b - a for a, b in zip(starts, starts[1:])]
+    result = {
+        "runs": len(starts),
+        "period_ms": sum(intervals) / len(intervals) * 1e3,
+        "drift_ms": (starts[-1] - starts[0] - (len(starts) - 1) * PERIOD) * 1e3,
+    }
+    stats = ROUTINE_STATS.pop(mode, None)
+    if stats is not None:
+        snapshot = stats.snapshot()
+        result["jitter_ms"] = snapshot["jitter_ms"]
+        result["missed"] = snapshot["missed"]
+        result["skipped"] = snapshot["skipped"]
+    return result
+
+
+def main() -> None:
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    modes = ["sleep"] + [policy.name for policy in OverrunPolicies]
+    for scenario, durations in SCENARIOS.items():
+        print(f"{scenario} ({seconds:.0f} s, period {PERIOD * 1e3:.0f} ms)")
+        print(
+            f"  {'mode':<10}{'runs':>6}{'period ms':>11}{'drift ms':>10}"
+            f"{'jitter ms':>11}{'missed':>8}{'skipped':>9}"
+        )
+        for mode in modes:
+            r = asyncio.run(run(mode, durations, seconds))
+            print(
+                f"  {mode:<10}{r['runs']:>6}{r['period_ms']:>11.2f}{r['drift_ms']:>10.1f}"
+                f"{r.get('jitter_ms', float('nan')):>11.2f}"
+                f"{r.get('missed', '-'):>8}{r.get('skipped', '-'):>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Latency of the shared_self attribute accesses from a process task, for the two
+backends of Brain:
+
+* manager: DictProxyAccessor, a Manager().dict() (each access is a pickled request to
+the manager process and its answer),
+* shared: SharedState, a shared_memory block with a schema (scalars, record, array).
+
+Same attributes on both: score (int), pose (3 floats, a record in the block) and lidar
+(360 float32, a tuple in the manager dict as it holds no arrays). The accesses run in a
+child process started as the brain does (multiprocessing.Process), the values written
+by the child are checked in the parent. Creation is the time to build the accessor (the
+manager starts its server process).
+
+Run from the common directory:
+    python -m brain.benchmarks.shared_state_access [nb_accesses]
+"""
+
+from brain.dict_proxy import DictProxyAccessor
+from brain.shared_state import SharedState, SharedArray, SharedRecord
+
+from multiprocessing import Process, Pipe
+import sys, time
+import numpy as np
+
+SCHEMA = {
+    "score": "q",
+    "pose": SharedRecord(x="d", y="d", theta="d"),
+    "lidar": SharedArray("f4", 360),
+}
+
+
+def measure(shared, nb_accesses: int) -> dict:
+    """
+    :return: mean ns per access of each operation
+    """
+    lidar = np.arange(360, dtype=np.float32)
+    if isinstance(shared, DictProxyAccessor):
+        lidar = tuple(lidar.tolist())
+    operations = {
+        "read scalar": lambda k: shared.score,
+        "write scalar": lambda k: setattr(shared, "score", k),
+        "read record": lambda k: shared.pose,
+        "write record": lambda k: setattr(shared, "pose", (k, 2.0 * k, 3.0 * k)),
+        "read array": lambda k: np.array(shared.lidar),
+        "write array": lambda k: setattr(shared, "lidar", lidar),
+    }
+    results = {}
+    for name, operation in operations.items():
+        start = time.perf_counter()
+        for k in range(nb_accesses):
+            operation(k)
+        results[name] = (time.perf_counter() - start) / nb_accesses * 1e9
+    return results
+
+
+def child(shared, nb_accesses: int, connection) -> None:
+    connection.send(measure(shared, nb_accesses))
+    connection.close()
+
+
+def run(backend: str, nb_accesses: int) -> tuple[float, dict]:
+    start = time.perf_counter()
+    if backend == "manager":
+        shared = DictProxyAccessor(name="benchmark")
+    else:
+        shared = SharedState(SCHEMA, name="benchmark")
+    creation = time.perf_counter() - start
+    shared.score = 0
+    shared.pose = (0.0, 0.0, 0.0)
+    shared.lidar = (0.0,) * 360 if backend == "manager" else np.zeros(360)
+
+    parent, child_end = Pipe()
+    process = Process(target=child, args=(shared, nb_accesses, child_end))
+    process.start()
+    results = parent.recv()
+    process.join()
+
+    last = nb_accesses - 1
+    if shared.score != last or tuple(shared.pose) != (last, 2.0 * last, 3.0 * last):
+        raise AssertionError(f"{backend}: writes of the child not seen")
+    if list(shared.lidar) != list(range(360)):
+        raise AssertionError(f"{backend}: array of the child not seen")
+    if backend == "shared":
+        shared.close()
+    return creation, results
+
+
+if __name__ == "__main__":
+    nb_accesses = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    table = {}
+    for backend in ("manager", "shared"):
+        creation, table[backend] = run(backend, nb_accesses)
+        print(f"{backend:>8} | creation {creation * 1e3:7.2f} ms")
+    print(f"{'':>13} | {'manager':>10} | {'shared':>10} | speedup")
+    for name in table["manager"]:
+        manager, shared = table["manager"][name], table["shared"][name]
+        print(
+            f"{name:>13} | {manager / 1e3:7.2f} us | {shared / 1e3:7.3f} us"
+            f" | x{manager / shared:6.0f}"
+        )
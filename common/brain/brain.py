@@ -3,7 +3,10 @@ from utils import Utils
 
 from brain.task_wrappers import SynchronousWrapper, AsynchronousWrapper
 from brain.dict_proxy import DictProxyAccessor
+from brain.shared_state import SharedState
+from brain.scheduling import OverrunPolicies, RoutineScheduler, ROUTINE_STATS
 from brain.task import Task
+from brain.worker_pool import WorkerPool
 
 from typing import TypeVar, Type, List, Callable, Coroutine
 from multiprocessing import Process
@@ -12,6 +15,7 @@ import threading
 import functools
 import inspect
 import asyncio
+import time
 
 TBrain = TypeVar("TBrain", bound="Brain")
 
@@ -32,6 +36,9 @@ class Brain:
         main process)
         * Create a routine task by using the decorator @Brain.task(refresh_rate=<refresh rate you want>) (it will be
         executed periodically according to the refresh rate and in the main process)
+        * Add fixed_rate=True to start it on fixed deadlines (every refresh rate seconds from its start) instead of
+        sleeping the refresh rate after each run, overrun=OverrunPolicies.<policy> chooses what happens when a run
+        passes the next deadline (SKIP, CATCH_UP or RUN_LATE). Its timing is given by brain.routine_stats().
     - Subprocess task (executed in a subprocess), they have to be synchronous
         * Create a subprocess one-shot task by using the decorator @Brain.task(process=True) (it will be executed only
         once in a subprocess)
@@ -39,10 +46,17 @@ class Brain:
         refresh_rate=<refresh rate you want>, process=True) (it will be executed periodically according to the refresh
         and in a subprocess)
     - Get the tasks by calling the method brain.get_tasks() and add them to the background tasks of the application
+        * With brain.get_tasks(worker_pool=WorkerPool(...)), the one-shot subprocess tasks run in warm processes
+        forked once (see WorkerPool)
+        * With brain.get_tasks(central_scheduler=True), the routines of the main process (without timeout) run from
+        one task, a RoutineScheduler, by decreasing priority (@Brain.task(priority=...)) when they are due together
 
     -> Be careful by using subprocesses, the shared data between the main process and the subprocesses is limited,
     only serializable data can be shared. More over the data synchronization is not real-time, it is done by a routine.
     Subprocesses are useful to execute heavy tasks or tasks that can block the main process.
+    - To share the data at memory speed, declare a schema in the child class (class attribute):
+    shared_schema = {"score": "q", "lidar": SharedArray("f4", 360), "pose": SharedRecord(x="d", y="d")}
+    shared_self is then a SharedState (shared memory block) instead of a DictProxyAccessor (manager process).
     """
 
     def __init__(self, logger: Logger, child: TBrain) -> None:
@@ -54,12 +68,29 @@ class Brain:
             raise ValueError("Logger is required for the brain to work properly.")
         self.logger = logger
 
-        self.__shared_self = DictProxyAccessor(name=child.__str__())
+        schema = getattr(child, "shared_schema", None)
+        if schema is None:
+            self.__shared_self = DictProxyAccessor(name=child.__str__())
+        else:
+            self.__shared_self = SharedState(schema, name=child.__str__())
         self.__processes = []
         self.__async_functions = []
+        self.__worker_pool = None
 
         child.dynamic_init()
 
+        # Writes of the shared attributes in this process: key -> time.monotonic_ns,
+        # pushed by the sync routine (see __setattr__)
+        self.__shared_keys = set(self.shared_self.versions())
+        self.__local_changes = {}
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        # Only after __init__ (the shared keys are known) and for the shared attributes
+        shared_keys = self.__dict__.get("_Brain__shared_keys")
+        if shared_keys is not None and name in shared_keys:
+            self.__local_changes[name] = time.monotonic_ns()
+
     """
         Dynamic initialization
     """
@@ -72,7 +103,8 @@ class Brain:
         * The attributes of the child class will be initialized, based on the parameters of the caller.
         They will have the same name as the parameters of the child's __init__.
         * This method will also instantiate the shared_self attribute, which is a clone of the actual self but
-        accessible by processes. It is a DictProxyAccessor object. It will only contain public and serializable attributes.
+        accessible by processes. It is a DictProxyAccessor object (a SharedState with a shared_schema). It will only
+        contain public and serializable attributes.
         """
         # Get the frame of the caller (the __init__ method of the child class)
         frame = inspect.currentframe().f_back.f_back
@@ -93,8 +125,8 @@ class Brain:
                 and name != "self"
             ):
                 # Try to serialize the attribute
-                if DictProxyAccessor.is_serialized(value):
-                    setattr(self.shared_self, name, value)
+                if self.shared_self.can_share(name, value):
+                    self.shared_self.set(name, value)
                 else:
                     self.logger.log(
                         f"[dynamic_init] cannot serialize attribute [{name}].",
@@ -126,6 +158,9 @@ class Brain:
         timeout: int = -1,
         define_loop_later: bool = False,
         start_loop_marker="# ---Loop--- #",
+        fixed_rate: bool = False,
+        overrun: OverrunPolicies = OverrunPolicies.SKIP,
+        priority: int = 0,
     ):
         """
         Decorator to add a task function to the brain. There are 3 cases:
@@ -133,6 +168,8 @@ class Brain:
         - If the task has no refresh rate, it becomes a 'one-shot' task
         - If the task is a subprocess, it becomes a 'subprocess' task --> it can also be a 'routine'
         or a 'one-shot' task (depending on the refresh rate)
+        A routine with fixed_rate runs on absolute deadlines, overrun is its policy when a run is late.
+        The priority orders the routines due at the same time in a RoutineScheduler (the highest first).
         """
 
         def decorator(func):
@@ -148,6 +185,9 @@ class Brain:
                     timeout,
                     define_loop_later,
                     start_loop_marker,
+                    fixed_rate,
+                    overrun,
+                    priority,
                 )
             )
             return func
@@ -161,7 +201,9 @@ class Brain:
     def __evaluate_task(self, task: Task):
         if task.run_to_start:
             evaluated_task = task.evaluate(
-                brain_executor=self, shared_brain_executor=self.shared_self
+                brain_executor=self,
+                shared_brain_executor=self.shared_self,
+                worker_pool=self.__worker_pool,
             )
             if task.is_process:
                 self.__processes.append(evaluated_task)
@@ -171,7 +213,9 @@ class Brain:
 
             async def coroutine_executor():
                 return await task.evaluate(
-                    brain_executor=self, shared_brain_executor=self.shared_self
+                    brain_executor=self,
+                    shared_brain_executor=self.shared_self,
+                    worker_pool=self.__worker_pool,
                 )
 
             setattr(self, task.name, coroutine_executor)
@@ -189,29 +233,76 @@ class Brain:
         Need to be a routine with a very low refresh rate.
         * Need to be wrap by routine task wrapper.
         * Add this method in the async functions list only if a subprocess task is defined.
+        * Only the changed attributes are touched: the ones written in the shared_self since the previous pass
+        (their versions, see shared_self.changes) and the ones assigned on the instance (see __setattr__).
+        When both sides wrote an attribute, the last write wins (versions are time.monotonic_ns, the same
+        clock in all the processes).
+        -> An attribute modified in place (list.append, array[...] = ...) has to be assigned again to be synchronized.
         """
-        for key in self.shared_self.get_dict().keys():
-            self_attr_value = getattr(self, key)
-            self_shared_attr_value = eval(f"self.shared_self.{key}")
-
-            # Verify if the value is different between the instance and the shared data
-            if self_attr_value != self_shared_attr_value:
-                # The value has changed on the virtual self ?
-                if key in self.shared_self.get_updated_attributes():
-                    setattr(self, key, self_shared_attr_value)
-                    self.shared_self.remove_updated_attribute(key)
-                else:
-                    setattr(self.shared_self, key, self_attr_value)
+        local_changes, self.__local_changes = self.__local_changes, {}
+        for key, version in self.shared_self.changes().items():
+            # A field of the schema may only live in the shared_self
+            if key not in self.__dict__:
+                continue
+            if local_changes.get(key, -1) > version:
+                continue  # Written again by this process since, pushed below
+            local_changes.pop(key, None)
+            object.__setattr__(self, key, self.shared_self.get(key))
+
+        for key, version in local_changes.items():
+            self.shared_self.set(key, getattr(self, key), version)
+
+    """
+        Routines timing
+    """
+
+    @staticmethod
+    def routine_stats() -> dict:
+        """
+        :return: name -> timing (see RoutineStats.snapshot) of the fixed rate routines of this process
+        (the ones of the subprocesses stay in their process)
+        """
+        return {name: stats.snapshot() for name, stats in ROUTINE_STATS.items()}
 
     """
         Get evaluated tasks which need to be added to the background tasks of the application
     """
 
-    def get_tasks(self):
+    def get_tasks(
+        self,
+        central_scheduler: bool = False,
+        scheduler_tick: float = 0.001,
+        worker_pool: WorkerPool | None = None,
+    ):
+        """
+        :param central_scheduler: run the routines of the main process without timeout from one RoutineScheduler
+        task, instead of one task sleeping in a loop per routine
+        :param scheduler_tick: the deadlines of the RoutineScheduler are rounded up to it (s)
+        :param worker_pool: run the one-shot process tasks in its warm workers, instead of a new process per run.
+        It is started here (with the shared_self) if the brain has such tasks.
+        """
+        scheduler = (
+            RoutineScheduler(self.logger, scheduler_tick) if central_scheduler else None
+        )
+
         # Evaluate all tasks and add them to the list of async functions or processes
         if hasattr(self, "_tasks"):
+            if worker_pool is not None and any(
+                task.can_use_pool for task in self._tasks
+            ):
+                if not worker_pool.started:
+                    worker_pool.start(self.shared_self, self.logger)
+                self.__worker_pool = worker_pool
+
             for task in self._tasks:
-                self.__evaluate_task(task)
+                if (
+                    scheduler is not None
+                    and task.run_to_start
+                    and task.can_be_scheduled
+                ):
+                    task.schedule(self, scheduler)
+                else:
+                    self.__evaluate_task(task)
 
             # Add a one-shot task to start all processes and routine to synchronize self_shared and self
             if any(task.is_process for task in self._tasks):
@@ -220,11 +311,17 @@ class Brain:
                         self, self.__start_subprocesses
                     )
                 )
-                self.__async_functions.append(
-                    lambda: AsynchronousWrapper.wrap_to_routine(
-                        self, self.__sync_self_and_shared_self, 0.01
+                if scheduler is not None:
+                    scheduler.add(self, self.__sync_self_and_shared_self, 0.01)
+                else:
+                    self.__async_functions.append(
+                        lambda: AsynchronousWrapper.wrap_to_routine(
+                            self, self.__sync_self_and_shared_self, 0.01
+                        )
                     )
-                )
+
+        if scheduler is not None and len(scheduler):
+            self.__async_functions.append(scheduler.run)
 
         return self.__async_functions
 
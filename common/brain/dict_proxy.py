@@ -1,24 +1,32 @@
 from multiprocessing import Manager
+import time
 
 from logger import Logger
 
+PRIVATE_ATTRIBUTES = ["_dict_proxy", "_versions", "_name", "_seen"]
+
 
 class DictProxyAccessor:
     """
     Class to access a DictProxy object as if it were a normal object.
     Avoid dict["key"] notation by using dict.key notation
+    Each write also stores the version of the key (time.monotonic_ns, the same clock in
+    all the processes) in a second dict of the same manager, see changes().
     """
 
     def __init__(self, name="Undefined name") -> None:
         """
         Initialize the DictProxyAccessor by creating a DictProxy object
         """
-        self._dict_proxy = Manager().dict()
+        manager = Manager()
+        self._dict_proxy = manager.dict()
+        self._versions = manager.dict()
         self._name = name
-        self._updated_attributes = set()
+        # Versions last seen by changes() in this process
+        self._seen = {}
 
     def __getattr__(self, item):
-        if item in ["_dict_proxy", "_name", "_updated_attributes"]:
+        if item in PRIVATE_ATTRIBUTES:
             return object.__getattribute__(self, item)
 
         try:
@@ -37,19 +45,47 @@ class DictProxyAccessor:
             )
 
     def __setattr__(self, key, value):
-        if key in ["_dict_proxy", "_name", "_updated_attributes"]:
+        if key in PRIVATE_ATTRIBUTES:
             object.__setattr__(self, key, value)
         else:
             self._dict_proxy[key] = value
-            if key not in self._updated_attributes:
-                self._updated_attributes.add(key)
+            self._versions[key] = time.monotonic_ns()
+
+    def can_share(self, key, value) -> bool:
+        """
+        True if the attribute can be added to the shared dict
+        """
+        return DictProxyAccessor.is_serialized(value)
+
+    def get(self, key):
+        return self._dict_proxy[key]
 
-    def get_updated_attributes(self):
-        return self._updated_attributes
+    def set(self, key, value, version=None):
+        """
+        Write a key with the given version (time.monotonic_ns of the write), this
+        process does not see it as a change
+        """
+        if version is None:
+            version = time.monotonic_ns()
+        self._dict_proxy[key] = value
+        self._versions[key] = version
+        self._seen[key] = version
+
+    def versions(self) -> dict:
+        return dict(self._versions.items())
 
-    def remove_updated_attribute(self, key):
-        if key in self._updated_attributes:
-            self._updated_attributes.remove(key)
+    def changes(self) -> dict:
+        """
+        Return {key: version} of the keys written since the previous call (or set by
+        this process), one request to the manager for the versions
+        """
+        changed = {
+            key: version
+            for key, version in self._versions.items()
+            if self._seen.get(key) != version
+        }
+        self._seen.update(changed)
+        return changed
 
     def get_dict(self) -> dict:
         """
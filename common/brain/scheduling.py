@@ -0,0 +1,294 @@
+from logger import LogLevels
+
+from collections import deque
+from enum import IntEnum
+import asyncio
+import heapq
+import math
+import time
+
+# Samples kept by the statistics of each routine
+STATS_WINDOW = 256
+# Deadlines run back to back at most by a CATCH_UP routine, the older ones are skipped
+MAX_CATCH_UP = 10
+# Seconds between two logs of the same error of a fixed rate routine
+ERROR_LOG_PERIOD = 1.0
+# Minimum delay before running again a routine of the RoutineScheduler which failed
+# (as the error sleep of AsynchronousWrapper.safe_execute)
+ERROR_DELAY = 0.5
+
+
+class OverrunPolicies(IntEnum):
+    """
+    What a fixed rate routine does when a run ends after its next deadline
+    """
+
+    SKIP = 0  # The passed deadlines are dropped, the next run waits for the next one
+    CATCH_UP = 1  # The passed deadlines are run back to back (MAX_CATCH_UP at most)
+    RUN_LATE = 2  # One run right away, the following deadlines are shifted from it
+
+
+class RoutineStats:
+    """
+    Timing of a fixed rate routine: counters, and the last STATS_WINDOW start times
+    compared to their deadlines (lateness) and to the previous start (period, jitter)
+    """
+
+    def __init__(self, name: str, period: float) -> None:
+        self.name = name
+        self.period = period
+        self.runs = 0
+        self.errors = 0
+        self.missed = 0  # Deadlines passed while a run was going on
+        self.skipped = 0  # Missed deadlines never run
+        self._lateness = deque(maxlen=STATS_WINDOW)
+        self._intervals = deque(maxlen=STATS_WINDOW)
+        self._last_start = None
+
+    def record_start(self, start: float, deadline: float) -> None:
+        self.runs += 1
+        self._lateness.append(start - deadline)
+        if self._last_start is not None:
+            self._intervals.append(start - self._last_start)
+        self._last_start = start
+
+    def snapshot(self) -> dict:
+        """
+        :return: the counters, the mean measured period, its jitter (standard deviation
+        of the intervals between two starts) and the lateness percentiles, in ms
+        """
+        snapshot = {
+            "period_ms": self.period * 1e3,
+            "runs": self.runs,
+            "errors": self.errors,
+            "missed": self.missed,
+            "skipped": self.skipped,
+        }
+        if self._intervals:
+            intervals = list(self._intervals)
+            mean = sum(intervals) / len(intervals)
+            variance = sum((x - mean) ** 2 for x in intervals) / len(intervals)
+            snapshot["measured_period_ms"] = mean * 1e3
+            snapshot["jitter_ms"] = math.sqrt(variance) * 1e3
+        if self._lateness:
+            lateness = sorted(self._lateness)
+            last = len(lateness) - 1
+            snapshot["lateness_ms"] = {
+                "p50": lateness[last // 2] * 1e3,
+                "p99": lateness[round(last * 0.99)] * 1e3,
+                "max": lateness[last] * 1e3,
+            }
+        return snapshot
+
+
+# Statistics of the fixed rate routines running in this process, by name
+ROUTINE_STATS: dict[str, RoutineStats] = {}
+
+
+class FixedRateClock:
+    """
+    Deadlines of a fixed rate routine: start + k * period on time.monotonic, so the
+    duration of the runs does not shift the next ones (unlike a sleep after each run).
+    The wrappers call start() before a run and end() after it, then sleep the returned
+    delay.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        period: float,
+        overrun: OverrunPolicies,
+        start: float | None = None,
+    ) -> None:
+        """
+        :param start: first deadline (time.monotonic), defaults to now
+        """
+        self.period = period
+        self.overrun = OverrunPolicies(overrun)
+        self.stats = RoutineStats(name, period)
+        ROUTINE_STATS[name] = self.stats
+        self.deadline = time.monotonic() if start is None else start
+        # Newest deadline already counted as missed
+        self._counted = self.deadline
+        self._last_error = (None, -math.inf)  # (message, time.monotonic)
+
+    def start(self) -> None:
+        self.stats.record_start(time.monotonic(), self.deadline)
+
+    def end(self) -> float:
+        """
+        Move to the next deadline, following the overrun policy when it has passed
+        :return: seconds to sleep before the next run
+        """
+        now = time.monotonic()
+        self.deadline += self.period
+        if now <= self.deadline:
+            return self.deadline - now
+
+        # Deadlines passed since the last count: deadline, deadline + period, ...
+        newest = self.deadline + math.floor((now - self.deadline) / self.period) * (
+            self.period
+        )
+        if newest > self._counted:
+            first = max(self.deadline, self._counted + self.period)
+            self.stats.missed += round((newest - first) / self.period) + 1
+            self._counted = newest
+
+        if self.overrun == OverrunPolicies.SKIP:
+            self.stats.skipped += round((newest - self.deadline) / self.period) + 1
+            self.deadline = newest + self.period
+            return self.deadline - now
+        if self.overrun == OverrunPolicies.CATCH_UP:
+            backlog = round((newest - self.deadline) / self.period) + 1
+            if backlog > MAX_CATCH_UP:
+                dropped = backlog - MAX_CATCH_UP
+                self.stats.skipped += dropped
+                self.deadline += dropped * self.period
+            return 0.0
+        # RUN_LATE: the grid restarts from now
+        self.deadline = now
+        self._counted = now
+        return 0.0
+
+    def error(self, error: Exception) -> bool:
+        """
+        Count an error of the run
+        :return: True if it has to be logged (new message, or ERROR_LOG_PERIOD passed)
+        """
+        self.stats.errors += 1
+        now = time.monotonic()
+        message, logged_at = self._last_error
+        if str(error) != message or now - logged_at >= ERROR_LOG_PERIOD:
+            self._last_error = (str(error), now)
+            return True
+        return False
+
+
+class RoutineScheduler:
+    """
+    Runs the routines of the main process from one asyncio task, in place of a task
+    sleeping in a loop per routine: a heap holds the next deadline of each routine, the
+    scheduler sleeps until the first one, rounded up to the next tick, then runs all the
+    routines due at that tick, by decreasing priority. Routines whose deadlines land in
+    the same tick share one wakeup of the event loop.
+
+    * A routine is awaited by the scheduler: when it waits (I/O, asyncio.sleep...), the
+    routines due after it wait too. The routines which wait for long stay on their own
+    task (see Brain.get_tasks).
+    * Without fixed_rate, the next run is refresh_rate after the tick the previous one
+    was due at, so the routines stay on the tick grid and keep sharing their wakeups
+    (measured from the end of each run, as AsynchronousWrapper.wrap_to_routine, the
+    deadlines drift apart). A run ending after that deadline waits refresh_rate from its
+    end. With fixed_rate, the next run follows a FixedRateClock.
+    * A failing routine is delayed by ERROR_DELAY at least, the others keep running.
+    """
+
+    def __init__(self, logger, tick: float = 0.001) -> None:
+        """
+        :param logger: logger of the brain
+        :param tick: width of the wakeup slots (s), the deadlines are rounded up to it
+        """
+        self.logger = logger
+        self.tick = tick
+        self._heap = []
+        self._count = 0  # Insertion order of the routines, breaks the ties
+        self.wakeups = 0
+        self.runs = 0
+
+    def add(
+        self,
+        executor,
+        task,
+        refresh_rate: float,
+        fixed_rate: bool = False,
+        overrun: OverrunPolicies = OverrunPolicies.SKIP,
+        priority: int = 0,
+    ) -> None:
+        """
+        Schedule a routine, due right away (before run() or from a routine)
+        :param executor: the brain given to the task
+        :param task: coroutine function of the routine, called with the executor
+        :param priority: the highest runs first among the routines due at the same tick
+        """
+        slot = self._slot(time.monotonic())
+        # The clocks start on the tick grid: the routines added together share it
+        clock = (
+            FixedRateClock(task.__name__, refresh_rate, overrun, slot * self.tick)
+            if fixed_rate
+            else None
+        )
+        routine = (-priority, self._count, executor, task, refresh_rate, clock)
+        self._count += 1
+        heapq.heappush(self._heap, (slot, routine[1], routine))
+
+    def _slot(self, deadline: float) -> int:
+        # Index of the tick of a deadline (rounded up), a deadline on the grid (tick
+        # multiple + period) stays on its tick despite the float rounding
+        return math.ceil(deadline / self.tick - 1e-6)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def stats(self) -> dict:
+        return {
+            "routines": len(self._heap),
+            "wakeups": self.wakeups,
+            "runs": self.runs,
+            "runs_per_wakeup": self.runs / self.wakeups if self.wakeups else 0.0,
+        }
+
+    async def run(self) -> None:
+        heap, tick = self._heap, self.tick
+        self.logger.log(
+            f"[RoutineScheduler] {len(heap)} routines (Main-process: async functions) "
+            f"-> started [tick {tick}s]",
+            LogLevels.INFO,
+        )
+        while True:
+            # Wake up at the tick of the first deadline (or later if the loop was busy)
+            slot = heap[0][0]
+            await asyncio.sleep(max(slot * tick - time.monotonic(), 0.0))
+            self.wakeups += 1
+            slot = max(slot, math.floor(time.monotonic() / tick))
+
+            # The routines due at this tick, by priority then insertion order
+            due = []
+            while heap and heap[0][0] <= slot:
+                due_slot, _, routine = heapq.heappop(heap)
+                due.append((routine, due_slot * tick))
+            due.sort(key=lambda item: item[0][:2])
+
+            for routine, due_time in due:
+                deadline = await self._run(due_time, *routine[2:])
+                heapq.heappush(heap, (self._slot(deadline), routine[1], routine))
+            self.runs += len(due)
+
+    async def _run(self, start, executor, task, refresh_rate, clock) -> float:
+        """
+        :param start: time of the tick the routine was due at
+        :return: the next deadline of the routine
+        """
+        if clock is not None:
+            clock.start()
+        try:
+            await task(executor)
+        except Exception as error:
+            if clock is None:
+                self.logger.log(
+                    f"[{task.__name__}] executor (Main-process: async function) -> "
+                    f"error: {error}",
+                    LogLevels.ERROR,
+                )
+                return time.monotonic() + max(refresh_rate, ERROR_DELAY)
+            if clock.error(error):
+                self.logger.log(
+                    f"[{task.__name__}] executor (Main-process: async function) -> "
+                    f"error: {error} [{clock.stats.errors} errors]",
+                    LogLevels.ERROR,
+                )
+        if clock is None:
+            # On the grid of the ticks, unless the run overran the deadline
+            now = time.monotonic()
+            deadline = start + refresh_rate
+            return deadline if deadline > now else now + refresh_rate
+        return time.monotonic() + clock.end()
@@ -0,0 +1,382 @@
+from multiprocessing import shared_memory
+from collections import namedtuple
+import multiprocessing
+import struct
+import weakref
+import time
+import os
+
+import numpy as np
+
+from brain.dict_proxy import DictProxyAccessor
+
+# Every field starts on this boundary: the scalars are naturally aligned
+ALIGNMENT = 8
+# Key of the header views in SharedState._views
+HEADER = None
+# Struct formats of the scalar fields (native sizes, no padding with "=")
+SCALAR_FORMATS = "?bBhHiIlLqQfd"
+
+
+class SharedArray:
+    """
+    Field of a SharedState: NumPy array of a fixed dtype and shape, read as a view
+    """
+
+    def __init__(self, dtype, shape: tuple | int) -> None:
+        self.dtype = np.dtype(dtype)
+        self.shape = (shape,) if isinstance(shape, int) else tuple(shape)
+
+    @property
+    def size(self) -> int:
+        return self.dtype.itemsize * int(np.prod(self.shape))
+
+    def __repr__(self) -> str:
+        return f"SharedArray({self.dtype.str!r}, {self.shape})"
+
+
+class SharedRecord:
+    """
+    Field of a SharedState: scalars read and written together, behind a seqlock
+    """
+
+    def __init__(self, **fields: str) -> None:
+        """
+        :param fields: name -> struct format of a scalar (see SCALAR_FORMATS)
+        """
+        for name, fmt in fields.items():
+            if fmt not in SCALAR_FORMATS:
+                raise ValueError(f"Record field [{name}]: unknown format {fmt!r}")
+        self.fields = fields
+        self.struct = struct.Struct("=" + "".join(fields.values()))
+
+    @property
+    def size(self) -> int:
+        # The sequence counter, then the values
+        return ALIGNMENT + self.struct.size
+
+    def __reduce__(self):
+        # struct.Struct does not pickle
+        return _record, (self.fields,)
+
+    def __repr__(self) -> str:
+        return f"SharedRecord({self.fields})"
+
+
+class SharedState:
+    """
+    shared_self of a brain declaring a schema (class attribute shared_schema), in place of
+    the DictProxyAccessor: the fields live in one multiprocessing.shared_memory block,
+    a read or a write is a memory access in every process, no manager process.
+
+    The schema maps each attribute name to:
+    * a struct format ("d", "q", "?", ...): a scalar at a fixed offset,
+    * a SharedArray: the attribute is a NumPy view on the block (assigning it copies the
+    values into the view), an array is not protected against concurrent writes,
+    * a SharedRecord: the attribute is a named tuple, read and written as a whole.
+    A seqlock protects it: the writers (serialized by a lock) make the sequence counter
+    odd, write the values, make it even again; the readers never block, they read again
+    while the counter is odd or changed during their read.
+    The other public attributes (logger, CONFIG...) are plain attributes: each process
+    has the copy it got at its start.
+
+    Each write stamps the version of the field (time.monotonic_ns, the same clock in all
+    the processes) and increments the generation of the block, in its header, under a
+    lock of the block (two writers never leave the same generation): changes() costs a
+    read when nothing was written, then a vectorized compare of the versions.
+
+    The block is unlinked when the creating process releases the state (close or exit).
+    """
+
+    def __init__(
+        self,
+        schema: dict,
+        name: str = "Undefined name",
+    ) -> None:
+        """
+        :param schema: attribute name -> format, SharedArray or SharedRecord
+        """
+        layout, size = _layout(schema)
+        memory = _Block(create=True, size=max(size, 1))
+        memory.buf[:size] = bytes(size)
+        # Writers of each record, and of the generation (HEADER), inherited by the
+        # processes of the tasks
+        locks = {
+            key: multiprocessing.Lock()
+            for key, spec in schema.items()
+            if isinstance(spec, SharedRecord)
+        }
+        locks[HEADER] = multiprocessing.Lock()
+        self._setup(schema, name, memory, locks, os.getpid())
+
+    def _setup(self, schema, name, memory, locks, owner) -> None:
+        self._name = name
+        self._schema = dict(schema)
+        self._keys = list(schema)
+        self._index = {key: index for index, key in enumerate(self._keys)}
+        self._memory = memory
+        self._locks = locks
+        self._layout, _ = _layout(schema)
+        self._views = {}
+        self._finalizer = weakref.finalize(self, _release, memory, owner, self._views)
+        self._bind()
+
+    def _bind(self) -> None:
+        # The class of the instance carries one property per field (see _state_class)
+        views = self._views
+        buf = self._memory.buf
+        # Header: generation, then the version of each field
+        end = ALIGNMENT * (len(self._keys) + 1)
+        self._generation = buf[:ALIGNMENT].cast("Q")
+        self._stamps = buf[ALIGNMENT:end].cast("Q")
+        self._versions = np.ndarray(len(self._keys), np.uint64, buf, ALIGNMENT)
+        views[HEADER] = (self._generation, self._stamps)
+        # Versions last seen by changes() in this process
+        self._seen = self._versions.copy()
+        self._seen_generation = self._generation[0]
+        for key, spec in self._schema.items():
+            offset = self._layout[key]
+            if isinstance(spec, SharedArray):
+                views[key] = np.ndarray(spec.shape, spec.dtype, buf, offset)
+            elif isinstance(spec, SharedRecord):
+                views[key] = (
+                    buf[offset : offset + ALIGNMENT].cast("Q"),
+                    buf[offset + ALIGNMENT : offset + spec.size],
+                )
+            else:
+                size = struct.calcsize("=" + spec)
+                views[key] = buf[offset : offset + size].cast(spec)
+        self.__class__ = _state_class(self)
+
+    ##########################################
+    # DictProxyAccessor compatible interface #
+    ##########################################
+    def can_share(self, key: str, value) -> bool:
+        return key in self._schema or DictProxyAccessor.is_serialized(value)
+
+    def get(self, key: str):
+        return getattr(self, key)
+
+    def set(self, key: str, value, version: int | None = None) -> None:
+        """
+        Write a field with the given version (time.monotonic_ns of the write), this
+        process does not see it as a change
+        """
+        setattr(self, key, value)
+        if key not in self._index:
+            return  # Attribute of this process only
+        index = self._index[key]
+        if version is not None:
+            self._stamps[index] = version
+        self._seen[index] = self._stamps[index]
+
+    def versions(self) -> dict:
+        return dict(zip(self._keys, self._versions.tolist()))
+
+    def changes(self) -> dict:
+        """
+        :return: {key: version} of the fields written since the previous call (or set by
+        this process)
+        """
+        generation = self._generation[0]
+        if generation == self._seen_generation:
+            return {}
+        self._seen_generation = generation
+        versions = self._versions.copy()
+        changed = np.flatnonzero(versions != self._seen)
+        self._seen[changed] = versions[changed]
+        return {self._keys[index]: int(versions[index]) for index in changed}
+
+    def get_dict(self) -> dict:
+        """
+        Values of the shared fields (the arrays are copied)
+        """
+        return {
+            key: (
+                getattr(self, key).copy()
+                if isinstance(spec, SharedArray)
+                else getattr(self, key)
+            )
+            for key, spec in self._schema.items()
+        }
+
+    def close(self) -> None:
+        """
+        Detach from the block (unlinked if this process created it)
+        """
+        self._finalizer()
+
+    def __reduce__(self):
+        # For the spawn and forkserver start methods: attach to the block by name
+        public = {
+            key: value for key, value in vars(self).items() if not key.startswith("_")
+        }
+        return _unpickle, (
+            self._schema,
+            self._name,
+            self._memory.name,
+            self._locks,
+            public,
+        )
+
+    def __str__(self):
+        return self._name
+
+
+def _layout(schema: dict) -> tuple[dict, int]:
+    """
+    :return: (offset of each field, size of the block)
+    """
+    layout = {}
+    # After the header: generation and versions
+    offset = ALIGNMENT * (len(schema) + 1)
+    for key, spec in schema.items():
+        if isinstance(spec, (SharedArray, SharedRecord)):
+            size = spec.size
+        elif isinstance(spec, str) and len(spec) == 1 and spec in SCALAR_FORMATS:
+            size = struct.calcsize("=" + spec)
+        else:
+            raise ValueError(f"Shared field [{key}]: unknown spec {spec!r}")
+        layout[key] = offset
+        offset += -(-size // ALIGNMENT) * ALIGNMENT
+    return layout, offset
+
+
+def _state_class(state: SharedState) -> type:
+    """
+    Subclass of SharedState with a property per field, closed over its views: an
+    attribute access is a property call and a memoryview (or ndarray) indexing, no
+    lookup. One class per instance (a brain has one shared_self).
+    """
+    properties = {}
+    for name, spec in state._schema.items():
+        view = state._views[name]
+        stamp = _stamper(state, name)
+        if isinstance(spec, SharedArray):
+            properties[name] = property(
+                lambda self, view=view: view, _array_setter(view, stamp)
+            )
+        elif isinstance(spec, SharedRecord):
+            lock = state._locks[name]
+            properties[name] = property(
+                _record_getter(name, spec, *view),
+                _record_setter(spec, lock, *view, stamp),
+            )
+        else:
+            properties[name] = property(
+                lambda self, view=view: view[0], _scalar_setter(view, stamp)
+            )
+    return type("SharedState", (SharedState,), properties)
+
+
+def _stamper(state: SharedState, name: str):
+    stamps, generation, index = state._stamps, state._generation, state._index[name]
+    lock = state._locks[HEADER]
+
+    def stamp():
+        # After the value: a reader seeing the version sees the value
+        stamps[index] = time.monotonic_ns()
+        # Read-modify-write shared by the processes: unlocked, two writers could store
+        # the same generation and changes() would miss the second write
+        with lock:
+            generation[0] += 1
+
+    return stamp
+
+
+def _scalar_setter(view: memoryview, stamp):
+    def setter(self, value):
+        view[0] = value
+        stamp()
+
+    return setter
+
+
+def _array_setter(view: np.ndarray, stamp):
+    def setter(self, value):
+        view[...] = value
+        stamp()
+
+    return setter
+
+
+def _record_getter(name: str, spec: SharedRecord, counter, data):
+    make = namedtuple(name, spec.fields)._make
+    unpack = spec.struct.unpack
+
+    # Python has no memory fence: the counter and the values are ordered by the
+    # interpreter (separate calls, each one a C memcpy), as on x86 (TSO). The writer
+    # lock orders the writers between them.
+    def getter(self):
+        while True:
+            start = counter[0]
+            if start & 1:
+                os.sched_yield()
+                continue
+            values = unpack(data)
+            if counter[0] == start:
+                return make(values)
+
+    return getter
+
+
+def _record_setter(spec: SharedRecord, lock, counter, data, stamp):
+    pack_into = spec.struct.pack_into
+    fields = list(spec.fields)
+
+    def setter(self, value):
+        if isinstance(value, dict):
+            value = [value[field] for field in fields]
+        with lock:
+            counter[0] += 1
+            pack_into(data, 0, *value)
+            counter[0] += 1
+        stamp()
+
+    return setter
+
+
+class _Block(shared_memory.SharedMemory):
+    def __del__(self):
+        try:
+            self.close()
+        except BufferError:
+            pass  # Arrays still alive on the block, the OS unmaps it at the exit
+
+
+def _attach(memory_name: str) -> _Block:
+    try:
+        return _Block(name=memory_name, track=False)
+    except TypeError:
+        # Python < 3.13 registers the block again: harmless, the processes of the tasks
+        # share the resource tracker of the brain, the block stays in its set
+        return _Block(name=memory_name)
+
+
+def _release(memory: _Block, owner: int | None, views: dict) -> None:
+    for view in views.values():
+        for part in view if isinstance(view, tuple) else (view,):
+            if isinstance(part, memoryview):
+                part.release()
+    views.clear()
+    try:
+        memory.close()
+    except BufferError:
+        pass  # Arrays still alive on the block, the OS unmaps it at the exit
+    if owner == os.getpid():
+        try:
+            memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _unpickle(schema, name, memory_name, locks, public) -> SharedState:
+    state = SharedState.__new__(SharedState)
+    state._setup(schema, name, _attach(memory_name), locks, None)
+    for key, value in public.items():
+        setattr(state, key, value)
+    return state
+
+
+def _record(fields: dict) -> SharedRecord:
+    return SharedRecord(**fields)
@@ -1,6 +1,8 @@
 from logger import Logger, LogLevels
 
 from brain.task_wrappers import SynchronousWrapper, AsynchronousWrapper
+from brain.scheduling import OverrunPolicies, RoutineScheduler
+from brain.worker_pool import WorkerPool
 
 import functools
 from typing import TypeVar
@@ -19,6 +21,9 @@ class Task:
         timeout,
         define_loop_later,
         start_loop_marker,
+        fixed_rate=False,
+        overrun=OverrunPolicies.SKIP,
+        priority=0,
     ):
         self._function = function
         self._is_process = is_process
@@ -27,6 +32,9 @@ class Task:
         self._timeout = timeout
         self._define_loop_later = define_loop_later
         self._start_loop_marker = start_loop_marker
+        self._fixed_rate = fixed_rate
+        self._overrun = OverrunPolicies(overrun)
+        self._priority = priority
 
     @property
     def is_process(self) -> bool:
@@ -60,12 +68,43 @@ class Task:
     def run_to_start(self) -> bool:
         return self._run_on_start
 
-    def __evaluate_process_task(self, brain_executor: TDictProxyAccessor):
+    @property
+    def can_be_scheduled(self) -> bool:
+        """
+        Routine of the main process, without timeout: it can run in a RoutineScheduler
+        """
+        return not self.is_process and self.is_routine and not self.is_timed
+
+    def schedule(self, brain_executor: TBrain, scheduler: RoutineScheduler):
+        scheduler.add(
+            brain_executor,
+            self._function,
+            self._refresh_rate,
+            self._fixed_rate,
+            self._overrun,
+            self._priority,
+        )
+
+    @property
+    def can_use_pool(self) -> bool:
+        """
+        One-shot process task (timed or not): it can run in a WorkerPool
+        """
+        return self.is_process and self.is_one_shot
+
+    def __evaluate_process_task(
+        self, brain_executor: TDictProxyAccessor, worker_pool: WorkerPool | None
+    ):
         """
         - Routine with initialisation (one-shoot then routine)
-        - One-shot
+        - One-shot (in a worker of the pool if there is one)
         - Routine
         """
+        if worker_pool is not None and self.can_use_pool:
+            return worker_pool.run(
+                self._function, self._timeout if self.is_timed else None, self.name
+            )
+
         # Routine with initialisation
         if self.is_routine_with_initialisation:
             # Check that the refresh rate has been set
@@ -80,6 +119,8 @@ class Task:
                 self._function,
                 self._refresh_rate,
                 self._start_loop_marker,
+                self._fixed_rate,
+                self._overrun,
             )
         # One-shot
         elif self.is_one_shot:
@@ -93,6 +134,8 @@ class Task:
                 brain_executor,
                 self._function,
                 self._refresh_rate,
+                self._fixed_rate,
+                self._overrun,
             )
         # Unknown task type
         else:
@@ -127,7 +170,11 @@ class Task:
         # Routine
         elif self.is_routine:
             wrapped_task = AsynchronousWrapper.wrap_to_routine(
-                brain_executor, self._function, self._refresh_rate
+                brain_executor,
+                self._function,
+                self._refresh_rate,
+                self._fixed_rate,
+                self._overrun,
             )
         # Unknown task type
         else:
@@ -148,9 +195,12 @@ class Task:
         return wrapped_task
 
     def evaluate(
-        self, brain_executor: TBrain, shared_brain_executor: TDictProxyAccessor
+        self,
+        brain_executor: TBrain,
+        shared_brain_executor: TDictProxyAccessor,
+        worker_pool: WorkerPool | None = None,
     ):
         if self.is_process:
-            return self.__evaluate_process_task(shared_brain_executor)
+            return self.__evaluate_process_task(shared_brain_executor, worker_pool)
         else:
             return self.__evaluate_classic_task(brain_executor)
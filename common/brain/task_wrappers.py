@@ -3,6 +3,7 @@ from utils import Utils
 
 from brain.dict_proxy import DictProxyAccessor
 from brain.execution_states import ExecutionStates
+from brain.scheduling import FixedRateClock, OverrunPolicies
 from multiprocessing import Process
 
 import functools
@@ -50,15 +51,27 @@ class SynchronousWrapper:
             return ExecutionStates.ERROR_OCCURRED
 
     @staticmethod
-    def wrap_to_routine(self, task, refresh_rate):
+    def wrap_to_routine(
+        self,
+        task,
+        refresh_rate,
+        fixed_rate: bool = False,
+        overrun: OverrunPolicies = OverrunPolicies.SKIP,
+    ):
         """
         It wraps the function into a routine which is executed every refresh_rate seconds
         * It logs the start of the routine
         :param self: the shared_self which has to be synchronized with the main process
         :param task: the function to execute
         :param refresh_rate: the time to sleep between each execution
+        :param fixed_rate: run on fixed deadlines instead (see wrap_to_fixed_rate_routine)
+        :param overrun: what a fixed rate routine does when a run passes its next deadline
         :return:
         """
+        if fixed_rate:
+            return SynchronousWrapper.wrap_to_fixed_rate_routine(
+                self, task, refresh_rate, overrun
+            )
         self.logger.log(
             f"[{task.__name__}] routine (Subprocess: sync function) -> started",
             LogLevels.INFO,
@@ -67,6 +80,38 @@ class SynchronousWrapper:
             SynchronousWrapper.safe_execute(self, task, error_sleep=refresh_rate)
             time.sleep(refresh_rate)
 
+    @staticmethod
+    def wrap_to_fixed_rate_routine(self, task, refresh_rate, overrun):
+        """
+        It wraps the function into a routine started every refresh_rate seconds, on
+        absolute deadlines: the duration of a run does not delay the next ones, an error
+        adds no sleep (only its log is throttled). The timing is in ROUTINE_STATS of the
+        process of the task.
+        :param self: the shared_self which has to be synchronized with the main process
+        :param task: the function to execute
+        :param refresh_rate: the period of the deadlines
+        :param overrun: what to do when a run passes its next deadline
+        :return:
+        """
+        clock = FixedRateClock(task.__name__, refresh_rate, overrun)
+        self.logger.log(
+            f"[{task.__name__}] fixed rate routine (Subprocess: sync function) -> "
+            f"started [{refresh_rate}s, {clock.overrun.name}]",
+            LogLevels.INFO,
+        )
+        while True:
+            clock.start()
+            try:
+                task(self)
+            except Exception as error:
+                if clock.error(error):
+                    self.logger.log(
+                        f"[{task.__name__}] executor (Subprocess: sync function) -> "
+                        f"error: {error} [{clock.stats.errors} errors]",
+                        LogLevels.ERROR,
+                    )
+            time.sleep(clock.end())
+
     @staticmethod
     def wrap_to_one_shot(self, task):
         """
@@ -146,7 +191,14 @@ class SynchronousWrapper:
         # process.join()
 
     @staticmethod
-    def wrap_routine_with_initialization(self, task, refresh_rate, start_loop_marker):
+    def wrap_routine_with_initialization(
+        self,
+        task,
+        refresh_rate,
+        start_loop_marker,
+        fixed_rate: bool = False,
+        overrun: OverrunPolicies = OverrunPolicies.SKIP,
+    ):
         """
         Wraps a task function into a routine with initialization and repetitive execution phases.
 
@@ -155,6 +207,7 @@ class SynchronousWrapper:
         - task: Function to execute, containing initialization and loop parts divided by start_loop_marker.
         - refresh_rate: Time to sleep between each execution in seconds.
         - start_loop_marker: Unique string to separate the initialization part from the loop part within the task function.
+        - fixed_rate, overrun: scheduling of the loop part (see wrap_to_routine).
         """
         src = inspect.getsource(task)
         original_signature = get_task_name(task)
@@ -210,7 +263,7 @@ class SynchronousWrapper:
         )
         loop_func_partial_initialized.__name__ = f"{original_signature}__loop_func"
         SynchronousWrapper.wrap_to_routine(
-            self, loop_func_partial_initialized, refresh_rate
+            self, loop_func_partial_initialized, refresh_rate, fixed_rate, overrun
         )
 
 
@@ -233,7 +286,17 @@ class AsynchronousWrapper:
             return ExecutionStates.ERROR_OCCURRED
 
     @staticmethod
-    async def wrap_to_routine(self: TBrain, task, refresh_rate: float or int):
+    async def wrap_to_routine(
+        self: TBrain,
+        task,
+        refresh_rate: float or int,
+        fixed_rate: bool = False,
+        overrun: OverrunPolicies = OverrunPolicies.SKIP,
+    ):
+        if fixed_rate:
+            return await AsynchronousWrapper.wrap_to_fixed_rate_routine(
+                self, task, refresh_rate, overrun
+            )
         self.logger.log(
             f"[{task.__name__}] routine (Main-process: async function) -> started",
             LogLevels.INFO,
@@ -242,6 +305,34 @@ class AsynchronousWrapper:
             await AsynchronousWrapper.safe_execute(self, task, error_sleep=refresh_rate)
             await asyncio.sleep(refresh_rate)
 
+    @staticmethod
+    async def wrap_to_fixed_rate_routine(
+        self: TBrain, task, refresh_rate: float or int, overrun: OverrunPolicies
+    ):
+        """
+        Routine started on absolute deadlines (see SynchronousWrapper.wrap_to_fixed_rate_routine),
+        its timing is given by brain.routine_stats()
+        """
+        clock = FixedRateClock(task.__name__, refresh_rate, overrun)
+        self.logger.log(
+            f"[{task.__name__}] fixed rate routine (Main-process: async function) -> "
+            f"started [{refresh_rate}s, {clock.overrun.name}]",
+            LogLevels.INFO,
+        )
+        while True:
+            clock.start()
+            try:
+                await task(self)
+            except Exception as error:
+                if clock.error(error):
+                    self.logger.log(
+                        f"[{task.__name__}] executor (Main-process: async function) -> "
+                        f"error: {error} [{clock.stats.errors} errors]",
+                        LogLevels.ERROR,
+                    )
+            # 0 when late: still yields to the event loop
+            await asyncio.sleep(clock.end())
+
     @staticmethod
     async def wrap_to_one_shot(self, task):
         self.logger.log(
@@ -0,0 +1,225 @@
+from logger import LogLevels
+
+from brain.task_wrappers import SynchronousWrapper
+from brain.execution_states import ExecutionStates
+
+from collections import deque
+from multiprocessing import Process, Pipe
+import itertools
+import resource
+import asyncio
+import sys
+
+
+class WorkerPool:
+    """
+    Warm processes running the one-shot process tasks (timed or not), in place of a new
+    process per run (fork, then the imports and the connection to the manager done
+    again in each run of a task).
+
+    * The workers are forked once, by Brain.get_tasks (only if the brain has one-shot
+    process tasks), with the shared_self of the brain: a task runs in a worker as in its
+    own process, SynchronousWrapper.wrap_to_one_shot(shared_self, task).
+    * A run waits for a free worker, sends it the task (pickled by reference: a function
+    of a module or a method of the brain class) and awaits its output.
+    * A worker is replaced after max_tasks runs or when its memory grew by more than
+    max_memory since its fork, and when a run reaches its timeout (the worker is killed).
+    * The workers are daemons: killed with the brain, they cannot start processes.
+    """
+
+    def __init__(self, size: int = 2, max_tasks: int = 100, max_memory: float = 0):
+        """
+        :param size: number of workers
+        :param max_tasks: runs of a worker before its replacement (0: no limit)
+        :param max_memory: growth of the memory of a worker before its replacement,
+        in MB (0: no limit), see _memory
+        """
+        self.size = size
+        self.max_tasks = max_tasks
+        self.max_memory = max_memory
+        self.shared_self = None
+        self.logger = None
+        self._idle = deque()
+        self._waiters = deque()
+        self._workers = set()
+        self.tasks = 0
+        self.recycled = 0
+        self.timeouts = 0
+
+    @property
+    def started(self) -> bool:
+        return self.shared_self is not None
+
+    def start(self, shared_self, logger) -> None:
+        """
+        Fork the workers
+        :param shared_self: the shared_self of the brain, given to the tasks
+        """
+        self.shared_self = shared_self
+        self.logger = logger
+        for _ in range(self.size):
+            self._idle.append(self._spawn())
+        self.logger.log(
+            f"[WorkerPool] {self.size} workers (Subprocess: sync functions) -> started",
+            LogLevels.INFO,
+        )
+
+    def _spawn(self) -> "_Worker":
+        worker = _Worker(self.shared_self, self.max_tasks, self.max_memory)
+        self._workers.add(worker)
+        return worker
+
+    def _replace(self, worker: "_Worker") -> None:
+        self._workers.discard(worker)
+        worker.stop()
+        self._release(self._spawn())
+
+    async def _acquire(self) -> "_Worker":
+        while not self._idle:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+        return self._idle.popleft()
+
+    def _release(self, worker: "_Worker") -> None:
+        self._idle.append(worker)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    async def run(self, task, timeout: float | None = None, task_name: str = None):
+        """
+        Run a task in a free worker
+        :param task: the function of the task, called with the shared_self
+        :param timeout: seconds before killing the worker (None: no timeout)
+        :return: the output of the task (None if it does not pickle), or
+        ExecutionStates.TIMEOUT / ERROR_OCCURRED
+        """
+        if task_name is None:
+            task_name = task.__name__
+        worker = await self._acquire()
+        self.tasks += 1
+        try:
+            worker.connection.send(task)
+            output, retire = await asyncio.wait_for(worker.result(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.logger.log(
+                f"[{task_name}] pooled task (Subprocess: sync function) -> "
+                f"ended by reaching the timeout [{timeout}]",
+                LogLevels.INFO,
+            )
+            self._replace(worker)
+            return ExecutionStates.TIMEOUT
+        except Exception as error:
+            # Task not picklable, or worker dead
+            self.logger.log(
+                f"[{task_name}] pooled task (Subprocess: sync function) -> "
+                f"ended because an error occurred [{error}]",
+                LogLevels.ERROR,
+            )
+            self._replace(worker)
+            return ExecutionStates.ERROR_OCCURRED
+        except BaseException:
+            # Cancelled: the worker may still run the task
+            self._replace(worker)
+            raise
+
+        if retire:
+            self.recycled += 1
+            self._replace(worker)
+        else:
+            self._release(worker)
+        return output
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "idle": len(self._idle),
+            "tasks": self.tasks,
+            "recycled": self.recycled,
+            "timeouts": self.timeouts,
+        }
+
+    def close(self) -> None:
+        for worker in self._workers:
+            worker.stop()
+        self._workers.clear()
+        self._idle.clear()
+
+
+class _Worker:
+    def __init__(self, shared_self, max_tasks: int, max_memory: float) -> None:
+        self.connection, child_connection = Pipe()
+        self.process = Process(
+            target=_work,
+            args=(shared_self, child_connection, max_tasks, max_memory),
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+
+    async def result(self) -> tuple:
+        """
+        :return: (output, retire) sent by the worker at the end of the task
+        """
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        fd = self.connection.fileno()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(fd)
+        return self.connection.recv()
+
+    def stop(self) -> None:
+        self.connection.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+
+
+def _memory() -> float:
+    """
+    Memory of the process, in MB: its private pages on Linux (the pages still shared
+    with the brain since the fork are not counted), its peak resident memory elsewhere
+    (inherited from the brain at the fork, only its growth is meaningful)
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as file:
+            return (
+                sum(
+                    int(line.split()[1])
+                    for line in file
+                    if line.startswith(("Private_Clean:", "Private_Dirty:"))
+                )
+                / 1024
+            )
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def _work(shared_self, connection, max_tasks: int, max_memory: float) -> None:
+    """
+    Loop of a worker: run the tasks received on the connection, until its replacement
+    """
+    start_memory = _memory()
+    for count in itertools.count(1):
+        try:
+            task = connection.recv()
+        except (EOFError, OSError):
+            return  # Pool closed
+        output = SynchronousWrapper.wrap_to_one_shot(shared_self, task)
+        retire = 0 < max_tasks <= count or 0 < max_memory < _memory() - start_memory
+        try:
+            connection.send((output, retire))
+        except Exception:
+            connection.send((None, retire))  # Output not picklable
+        if retire:
+            return
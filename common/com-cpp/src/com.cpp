@@ -96,6 +96,25 @@ void Com::send_msg(byte *msg, byte size, bool is_nack = false)
     free(full_msg);
     // free(crc_b);
 }
+/// @brief Send a link control message (HELLO, ACK, SNACK), last_msg is kept for the NACKs
+void Com::send_control(byte *msg, byte size)
+{
+    CRC crc;
+    byte full_msg[256];
+
+    for (byte i = 0; i < size; i++)
+        full_msg[i] = msg[i];
+    full_msg[size] = size;
+
+    byte crc_b = crc.digest(full_msg, size + 1);
+
+    this->stream->write(msg, size);
+    this->stream->write(size);
+    this->stream->write(crc_b);
+    this->stream->write(this->signature, 4);
+    this->stream->flush();
+}
+
 /// @brief Envoi un message text pour le debug 
 /// @param text DOIT ETRE EN ASCII et MAX 253 charactères
 /// @example com->print("hehe ca marche grace a Thomas Ledos")
@@ -0,0 +1 @@
+from planning.grid_planner import GridPlanner, PlanningException
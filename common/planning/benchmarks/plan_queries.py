@@ -0,0 +1,122 @@
+"""
+Random queries on a 3 m x 2 m table at 1 cm with static obstacles (GridPlanner):
+
+* build: rasterization, distance transform, A* graph and landmarks, once at startup,
+* cold: each query planned (start and goal drawn among the free cells),
+* cached: the same queries asked again.
+
+The distance transform is checked against a brute force one on random cells, and each
+path against the clearance (the robot never closer than robot_radius to an obstacle,
+except on the legs leaving a blocked start). Times in ms, this machine: a Raspberry Pi
+runs the search loop 3 to 4 times slower.
+
+Run from the common directory:
+    python -m planning.benchmarks.plan_queries [nb_queries] [--coarse N] [--landmarks N]
+"""
+
+from planning import GridPlanner
+
+import sys, time
+import numpy as np
+
+OBSTACLES = [
+    # Construction zones along the borders
+    {"type": "rectangle", "x0": 0.45, "y0": 0.0, "x1": 1.05, "y1": 0.45},
+    {"type": "rectangle", "x0": 1.95, "y0": 0.0, "x1": 2.55, "y1": 0.45},
+    # Central ramp and its wall
+    {"type": "rectangle", "x0": 1.05, "y0": 1.55, "x1": 1.95, "y1": 2.0},
+    {"type": "rectangle", "x0": 1.45, "y0": 0.9, "x1": 1.55, "y1": 1.55},
+    # Fixed plants
+    {"type": "circle", "x": 0.7, "y": 1.2, "radius": 0.12},
+    {"type": "circle", "x": 2.3, "y": 1.2, "radius": 0.12},
+]
+
+
+def option(name: str, default: int) -> int:
+    if name in sys.argv:
+        return int(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+
+def check_distance_transform(planner: GridPlanner, rng, nb_cells: int = 300) -> None:
+    grid = np.ones((planner.shape[0] + 2, planner.shape[1] + 2), dtype=bool)
+    grid[1:-1, 1:-1] = planner.occupancy
+    obstacle_rows, obstacle_columns = np.nonzero(grid)
+    for _ in range(nb_cells):
+        row, column = rng.integers(0, planner.shape[0]), rng.integers(
+            0, planner.shape[1]
+        )
+        distance = np.sqrt(
+            np.min(
+                (obstacle_rows - row - 1) ** 2 + (obstacle_columns - column - 1) ** 2
+            )
+        )
+        expected = max(distance * planner.resolution - planner.resolution / 2, 0.0)
+        if abs(planner.clearance[row, column] - expected) > 1e-9:
+            raise AssertionError(f"Clearance of {(row, column)}: {expected} expected")
+
+
+def check_path(planner: GridPlanner, path: list) -> None:
+    points = np.array(path)
+    clearance = planner._segments_clearance(points[:-1], points[1:])
+    # Lower bounds, within a sample step of the true clearance
+    tolerance = planner.resolution * 2
+    for k, leg in enumerate(clearance):
+        if leg < planner.robot_radius - tolerance and not (
+            k == 0 and not planner.is_free(*path[0])
+        ):
+            raise AssertionError(f"Leg {k} of {path} at {leg:.3f} m of an obstacle")
+
+
+def random_free_points(planner: GridPlanner, rng, nb_points: int) -> list:
+    points = []
+    while len(points) < nb_points:
+        x, y = rng.uniform(0, planner.width), rng.uniform(0, planner.height)
+        if planner.is_free(x, y):
+            points.append((x, y))
+    return points
+
+
+def percentiles(times: list) -> str:
+    times = np.array(times) * 1e3
+    return (
+        f"p50 {np.percentile(times, 50):6.3f} ms p99 {np.percentile(times, 99):6.3f} ms"
+        f" max {times.max():6.3f} ms"
+    )
+
+
+if __name__ == "__main__":
+    nb_queries = (
+        int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 200
+    )
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    planner = GridPlanner(
+        obstacles=OBSTACLES,
+        coarse=option("--coarse", 4),
+        landmarks=option("--landmarks", 8),
+        cache_size=nb_queries,
+    )
+    print(f" build | {(time.perf_counter() - start) * 1e3:7.1f} ms")
+    check_distance_transform(planner, rng)
+
+    starts = random_free_points(planner, rng, nb_queries)
+    goals = random_free_points(planner, rng, nb_queries)
+    for mode in ("cold", "cached"):
+        times = []
+        expansions = planner.expansions
+        for begin, goal in zip(starts, goals):
+            t = time.perf_counter()
+            path = planner.plan(begin, goal)
+            times.append(time.perf_counter() - t)
+            if mode == "cold" and path is not None:
+                check_path(planner, path)
+        print(
+            f"{mode:>6} | {percentiles(times)}"
+            f" | {(planner.expansions - expansions) / nb_queries:6.1f} expansions/query"
+        )
+    stats = planner.stats()
+    if stats["cache_hits"] != nb_queries:
+        raise AssertionError(f"Cache missed: {stats}")
+    print(f"        {stats}")
@@ -0,0 +1,461 @@
+from collections import OrderedDict
+from heapq import heappush, heappop
+import math
+import time
+
+import numpy as np
+
+SQRT2 = math.sqrt(2)
+# Cost per cell of the cells where the robot does not fit, see _build_search_grid
+BLOCKED_COST = 1000.0
+# Cells between two samples of a line of sight, see _segments_clearance
+SAMPLE_STEP = 2
+
+
+class PlanningException(Exception):
+    pass
+
+
+class GridPlanner:
+    """
+    Path planner of the game table, for the static obstacles (borders, fixed elements).
+
+    * The table is rasterized once into an occupancy grid (resolution, 1 cm), then the
+    clearance of each cell (distance to the nearest obstacle or border) is computed by
+    an exact Euclidean distance transform, separable: distance along each row with
+    cumulative max/min of the obstacle indices, then the lower envelope along the
+    columns, one vectorized pass per row offset, stopped as soon as the offset is beyond
+    the largest distance.
+    * A* runs on a coarse grid (coarse x coarse cells): a coarse cell is free when the
+    smallest clearance of its cells is at least robot_radius, its cost grows as the
+    clearance goes below robot_radius + inflation, so the paths keep away from the
+    obstacles when there is room.
+    * The coarse path is then shortened on the fine grid (any-angle, as Theta*): a
+    waypoint is dropped when the straight line skipping it keeps the clearance of the
+    part it replaces (capped to robot_radius + inflation).
+    * The paths are cached by (start cell, goal cell) of the fine grid, LRU.
+    Units are m, x along the width, y along the height, origin at a corner.
+    """
+
+    def __init__(
+        self,
+        width: float = 3.0,
+        height: float = 2.0,
+        resolution: float = 0.01,
+        obstacles: list[dict] = (),
+        robot_radius: float = 0.15,
+        inflation: float = 0.1,
+        inflation_cost: float = 4.0,
+        coarse: int = 4,
+        landmarks: int = 8,
+        cache_size: int = 256,
+    ) -> None:
+        """
+        :param width: size of the table along x, in m
+        :param height: size of the table along y, in m
+        :param resolution: side of a cell of the occupancy grid, in m
+        :param obstacles: static obstacles, {"type": "rectangle", "x0", "y0", "x1", "y1"}
+        or {"type": "circle", "x", "y", "radius"}
+        :param robot_radius: the center of the robot stays this far from the obstacles
+        :param inflation: margin beyond robot_radius where the cost grows
+        :param inflation_cost: extra cost (per m) at robot_radius, 0 at the margin end
+        :param coarse: fine cells per side of an A* cell, 1 to search the fine grid
+        :param landmarks: landmarks of the ALT heuristic (see _landmarks), 0 for octile
+        :param cache_size: paths kept by the cache
+        """
+        self.width = width
+        self.height = height
+        self.resolution = resolution
+        self.robot_radius = robot_radius
+        self.inflation = inflation
+        self.inflation_cost = inflation_cost
+        self.coarse = coarse
+        self.landmarks = landmarks
+        self.cache_size = cache_size
+
+        self.shape = (math.ceil(height / resolution), math.ceil(width / resolution))
+        self.occupancy = self._rasterize(obstacles)
+        self.clearance = self._distance_transform(self.occupancy)
+        self._build_search_grid()
+
+        self._cache = OrderedDict()
+        self.queries = 0
+        self.cache_hits = 0
+        self.expansions = 0  # A* nodes expanded, all queries
+        self.planning_time = 0.0  # s spent in the queries not cached
+
+    ############
+    # The grid #
+    ############
+    def _rasterize(self, obstacles: list[dict]) -> np.ndarray:
+        """
+        :return: bool grid (row = y, column = x), True on the cells touched by an obstacle
+        """
+        occupancy = np.zeros(self.shape, dtype=bool)
+        rows, columns = self.shape
+        res = self.resolution
+        for obstacle in obstacles:
+            if obstacle["type"] == "rectangle":
+                x0, x1 = sorted((obstacle["x0"], obstacle["x1"]))
+                y0, y1 = sorted((obstacle["y0"], obstacle["y1"]))
+                occupancy[
+                    max(int(y0 / res), 0) : min(math.ceil(y1 / res), rows),
+                    max(int(x0 / res), 0) : min(math.ceil(x1 / res), columns),
+                ] = True
+            elif obstacle["type"] == "circle":
+                x, y, radius = obstacle["x"], obstacle["y"], obstacle["radius"]
+                row0 = max(int((y - radius) / res), 0)
+                row1 = min(math.ceil((y + radius) / res), rows)
+                column0 = max(int((x - radius) / res), 0)
+                column1 = min(math.ceil((x + radius) / res), columns)
+                # Cells whose nearest point to the center is in the circle
+                ys = np.arange(row0, row1) * res
+                xs = np.arange(column0, column1) * res
+                dy = np.maximum(np.maximum(ys - y, y - ys - res), 0)
+                dx = np.maximum(np.maximum(xs - x, x - xs - res), 0)
+                occupancy[row0:row1, column0:column1] |= (
+                    dy[:, None] ** 2 + dx[None, :] ** 2 <= radius**2
+                )
+            else:
+                raise PlanningException(f"Unknown obstacle type: {obstacle['type']}")
+        return occupancy
+
+    def _distance_transform(self, occupancy: np.ndarray) -> np.ndarray:
+        """
+        :return: clearance of each cell in m, from its center to the nearest obstacle
+        cell or to the border of the table (0 in the obstacles)
+        """
+        # A ring of obstacles stands for the borders
+        grid = np.ones((self.shape[0] + 2, self.shape[1] + 2), dtype=bool)
+        grid[1:-1, 1:-1] = occupancy
+        rows, columns = grid.shape
+
+        # Distance along each row to the nearest obstacle, the ring bounds it
+        index = np.arange(columns)
+        left = np.maximum.accumulate(np.where(grid, index, -columns), axis=1)
+        right = np.minimum.accumulate(
+            np.where(grid, index, 2 * columns)[:, ::-1], axis=1
+        )[:, ::-1]
+        along_row = np.minimum(index - left, right - index).astype(np.int64) ** 2
+
+        # Lower envelope along the columns: min over dy of along_row[y + dy] + dy²
+        squared = along_row.copy()
+        for dy in range(1, rows):
+            if dy * dy >= squared.max():
+                break
+            offset = dy * dy
+            np.minimum(squared[dy:], along_row[:-dy] + offset, out=squared[dy:])
+            np.minimum(squared[:-dy], along_row[dy:] + offset, out=squared[:-dy])
+
+        # Distance between centers, minus half a cell: up to the obstacle cell edge
+        distance = np.sqrt(squared[1:-1, 1:-1]) * self.resolution
+        return np.maximum(distance - self.resolution / 2, 0.0)
+
+    def _build_search_grid(self) -> None:
+        """
+        Coarse grid of A*, as adjacency lists of (neighbour, edge cost) built once, so the
+        search loop only does list lookups. The blocked cells (too close to an obstacle)
+        stay in the graph at BLOCKED_COST per cell: a start or a goal in one is left by
+        the shortest way, the paths never go through one otherwise (see _search).
+        """
+        c = self.coarse
+        rows, columns = self.shape
+        coarse_rows, coarse_columns = math.ceil(rows / c), math.ceil(columns / c)
+        padded = np.full((coarse_rows * c, coarse_columns * c), np.inf)
+        padded[:rows, :columns] = self.clearance
+        block_clearance = padded.reshape(coarse_rows, c, coarse_columns, c).min(
+            axis=(1, 3)
+        )
+
+        margin = np.clip(
+            (self.robot_radius + self.inflation - block_clearance) / self.inflation,
+            0.0,
+            1.0,
+        )
+        cost = 1.0 + self.inflation_cost * margin**2
+        cost[block_clearance < self.robot_radius] = BLOCKED_COST
+        # In an obstacle, or out of the table (ring around the grid)
+        cost[block_clearance <= 0] = np.inf
+        grid = np.full((coarse_rows + 2, coarse_columns + 2), np.inf)
+        grid[1:-1, 1:-1] = cost
+
+        self._columns = coarse_columns + 2
+        self._cell_size = c * self.resolution
+        self._blocked = (grid >= BLOCKED_COST).ravel().tolist()
+        size = grid.size
+        flat = grid.ravel()
+        index = np.arange(size)
+        inner = np.isfinite(flat)
+        self._adjacency = [[] for _ in range(size)]
+        for dy, dx in (
+            (0, 1),
+            (0, -1),
+            (1, 0),
+            (-1, 0),
+            (1, 1),
+            (1, -1),
+            (-1, 1),
+            (-1, -1),
+        ):
+            offset = dy * self._columns + dx
+            # The ring is infinite: the neighbours of the inner cells exist
+            valid = inner.copy()
+            valid[inner] &= np.isfinite(flat[index[inner] + offset])
+            length = 1.0
+            if dx and dy:
+                # No corner cutting: both orthogonal neighbours are passable
+                length = SQRT2
+                for corner in (dy * self._columns, dx):
+                    valid[inner] &= np.isfinite(flat[index[inner] + corner])
+            sources = index[valid]
+            weights = length * (flat[sources] + flat[sources + offset]) / 2
+            for source, weight in zip(sources.tolist(), weights.tolist()):
+                self._adjacency[source].append((source + offset, weight))
+
+        # Octile heuristic of the coarse cells, from the indices
+        self._rows_of = index // self._columns
+        self._columns_of = index % self._columns
+        self._landmark_costs = self._landmarks(block_clearance)
+
+    def _landmarks(self, block_clearance: np.ndarray) -> np.ndarray:
+        """
+        Costs from a few landmarks (free cells nearest to the corners and to the middle
+        of the sides) to every cell, by Dijkstra. By the triangle inequality,
+        |cost(L, goal) - cost(L, n)| is a lower bound of the cost from n to goal (ALT):
+        unlike the octile distance it sees the walls and the inflated zones, A* expands
+        far fewer cells around the obstacles.
+        :return: (landmarks, cells) array, in cells as the A* costs
+        """
+        free = np.argwhere(block_clearance >= self.robot_radius)
+        if self.landmarks <= 0 or len(free) == 0:
+            return np.zeros((0, len(self._adjacency)))
+        rows, columns = block_clearance.shape
+        anchors = [
+            (row, column)
+            for row in (0, (rows - 1) / 2, rows - 1)
+            for column in (0, (columns - 1) / 2, columns - 1)
+            if (row, column) != ((rows - 1) / 2, (columns - 1) / 2)
+        ][: self.landmarks]
+        costs = []
+        for anchor in anchors:
+            row, column = free[np.argmin(np.sum((free - anchor) ** 2, axis=1))]
+            costs.append(self._dijkstra((row + 1) * self._columns + column + 1))
+        return np.array(costs)
+
+    def _dijkstra(self, source: int) -> list[float]:
+        adjacency = self._adjacency
+        cost = [math.inf] * len(adjacency)
+        cost[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            cost_index, index = heappop(heap)
+            if cost_index > cost[index]:
+                continue
+            for neighbour, weight in adjacency[index]:
+                tentative = cost_index + weight
+                if tentative < cost[neighbour]:
+                    cost[neighbour] = tentative
+                    heappush(heap, (tentative, neighbour))
+        return cost
+
+    def cell(self, x: float, y: float) -> tuple[int, int]:
+        """
+        :return: (row, column) of the fine grid, clamped to the table
+        """
+        rows, columns = self.shape
+        return (
+            min(max(int(y / self.resolution), 0), rows - 1),
+            min(max(int(x / self.resolution), 0), columns - 1),
+        )
+
+    def clearance_at(self, x: float, y: float) -> float:
+        return float(self.clearance[self.cell(x, y)])
+
+    def is_free(self, x: float, y: float) -> bool:
+        """
+        :return: True if the center of the robot can be at (x, y)
+        """
+        return self.clearance_at(x, y) >= self.robot_radius
+
+    ###########
+    # Queries #
+    ###########
+    def plan(
+        self, start: tuple[float, float], goal: tuple[float, float]
+    ) -> list[tuple[float, float]] | None:
+        """
+        :param start: (x, y) of the robot, it may be too close to an obstacle (pushed
+        against a border), the path leaves it by the cheapest way
+        :param goal: (x, y) to reach
+        :return: waypoints from start to goal included, None if goal is not reachable
+        """
+        self.queries += 1
+        key = (self.cell(*start), self.cell(*goal))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            waypoints = self._cache[key]
+        else:
+            begin = time.perf_counter()
+            waypoints = self._plan(start, goal, *key)
+            self.planning_time += time.perf_counter() - begin
+            self._cache[key] = waypoints
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        if waypoints is None:
+            return None
+        return [tuple(start), *waypoints, tuple(goal)]
+
+    def cache_clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        misses = self.queries - self.cache_hits
+        return {
+            "queries": self.queries,
+            "cache_hits": self.cache_hits,
+            "cache_size": len(self._cache),
+            "expansions": self.expansions,
+            "mean_planning_ms": self.planning_time / misses * 1e3 if misses else 0.0,
+        }
+
+    def _plan(self, start, goal, start_cell, goal_cell):
+        """
+        :return: the intermediate waypoints as a tuple (cached, shared), None if there
+        is no path
+        """
+        if self.clearance[goal_cell] < self.robot_radius:
+            return None
+        coarse_path = self._search(
+            self._search_index(*start_cell), self._search_index(*goal_cell)
+        )
+        if coarse_path is None:
+            return None
+        # Centers of the coarse cells (the ring shifts the indices by one cell)
+        rows, columns = np.divmod(np.array(coarse_path[1:-1]), self._columns)
+        points = np.empty((len(coarse_path), 2))
+        points[0], points[-1] = start, goal
+        points[1:-1, 0] = np.minimum((columns - 0.5) * self._cell_size, self.width)
+        points[1:-1, 1] = np.minimum((rows - 0.5) * self._cell_size, self.height)
+        return tuple(self._shorten(points)[1:-1])
+
+    def _search_index(self, row: int, column: int) -> int:
+        return (row // self.coarse + 1) * self._columns + column // self.coarse + 1
+
+    def _search(self, start: int, goal: int) -> list[int] | None:
+        """
+        A* on the coarse grid, 8 neighbours without cutting the corners, octile
+        heuristic (admissible: the costs are at least 1 per cell, computed for the whole
+        grid at once), ties broken towards the deepest node
+        :return: the cell indices from start to goal, None if the only paths go through
+        blocked cells
+        """
+        dx = np.abs(self._columns_of - self._columns_of[goal])
+        dy = np.abs(self._rows_of - self._rows_of[goal])
+        heuristic = dx + dy + (SQRT2 - 2) * np.minimum(dx, dy)
+        if len(self._landmark_costs):
+            landmarks = self._landmark_costs
+            bounds = np.abs(landmarks[:, goal : goal + 1] - landmarks)
+            # inf - inf between two cells out of reach of a landmark
+            bounds[np.isnan(bounds)] = 0.0
+            heuristic = np.maximum(heuristic, bounds.max(axis=0))
+        heuristic = heuristic.tolist()
+        adjacency = self._adjacency
+        size = len(adjacency)
+        g = [math.inf] * size
+        parent = [-1] * size
+        closed = bytearray(size)
+
+        g[start] = 0.0
+        heap = [(heuristic[start], 0.0, start)]
+        expansions = 0
+        while heap:
+            _, depth, index = heappop(heap)
+            if closed[index]:
+                continue
+            if index == goal:
+                break
+            closed[index] = 1
+            expansions += 1
+            g_index = -depth
+            for neighbour, weight in adjacency[index]:
+                tentative = g_index + weight
+                if tentative < g[neighbour]:
+                    g[neighbour] = tentative
+                    parent[neighbour] = index
+                    heappush(
+                        heap, (tentative + heuristic[neighbour], -tentative, neighbour)
+                    )
+        self.expansions += expansions
+        if g[goal] == math.inf:
+            return None
+
+        path = [goal]
+        while path[-1] != start:
+            path.append(parent[path[-1]])
+        path.reverse()
+        # Blocked cells are only allowed to leave the start and to reach the goal
+        blocked = [self._blocked[index] for index in path]
+        first = blocked.index(False) if False in blocked else len(path)
+        last = len(path) - blocked[::-1].index(False) if False in blocked else 0
+        if any(blocked[first:last]):
+            return None
+        return path
+
+    def _segments_clearance(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """
+        Lower bound of the clearance on each segment (a[k], b[k]), all the segments in
+        one pass. The clearance is a distance: it changes by at most the distance
+        travelled, sampled every SAMPLE_STEP cells the minimum is at most SAMPLE_STEP / 2
+        cells above the true one.
+        """
+        lengths = np.hypot(*(b - a).T)
+        samples = (lengths / (self.resolution * SAMPLE_STEP)).astype(np.intp) + 2
+        starts = np.concatenate(([0], np.cumsum(samples)[:-1]))
+        segment = np.repeat(np.arange(len(a)), samples)
+        t = (np.arange(segment.size) - starts[segment]) / (samples[segment] - 1)
+        points = a[segment] + (b - a)[segment] * t[:, None]
+        rows = np.minimum(
+            (points[:, 1] / self.resolution).astype(np.intp), self.shape[0] - 1
+        )
+        columns = np.minimum(
+            (points[:, 0] / self.resolution).astype(np.intp), self.shape[1] - 1
+        )
+        return np.minimum.reduceat(self.clearance[rows, columns], starts) - (
+            self.resolution * SAMPLE_STEP / 2
+        )
+
+    def _shorten(self, points: np.ndarray) -> list[tuple[float, float]]:
+        """
+        Any-angle path: from each kept waypoint, jump to the farthest one reachable by a
+        straight line as clear as the path it skips (or as robot_radius + inflation)
+        """
+        # Only the turns of the grid path can be kept
+        directions = np.diff(points, axis=0)
+        cross = (
+            directions[:-1, 0] * directions[1:, 1]
+            - directions[:-1, 1] * directions[1:, 0]
+        )
+        turn = np.abs(cross) > 1e-12
+        corners = points[
+            np.concatenate(([0], np.flatnonzero(turn) + 1, [len(points) - 1]))
+        ]
+        # Clearance of each leg of the grid path
+        legs = self._segments_clearance(corners[:-1], corners[1:])
+        wanted = self.robot_radius + self.inflation
+
+        kept = [0]
+        anchor = 0
+        while anchor < len(corners) - 1:
+            candidates = np.arange(anchor + 1, len(corners))
+            # Clearance of the grid path from the anchor to each candidate
+            needed = np.minimum(np.minimum.accumulate(legs[anchor:]), wanted)
+            direct = self._segments_clearance(
+                np.repeat(corners[anchor : anchor + 1], len(candidates), axis=0),
+                corners[candidates],
+            )
+            # The next one is always reachable: it is the grid path
+            visible = np.flatnonzero(direct >= needed)
+            anchor = int(candidates[visible[-1]]) if len(visible) else anchor + 1
+            kept.append(anchor)
+        return [(float(corners[k][0]), float(corners[k][1])) for k in kept]
@@ -0,0 +1,142 @@
+from typing import Callable
+import asyncio, os
+
+
+class AsyncSerialTransport:
+    """
+    Non-blocking transport between a serial port and an asyncio event loop.
+    * The file descriptor of the port is watched by the loop (add_reader / add_writer),
+    so no thread is needed and no call ever blocks the loop.
+    * Every chunk read is given to on_data, as a loop callback.
+    * write() never waits for the port: the bytes which can't be written right away are
+    buffered and flushed when the port becomes writable again.
+    * Ports without file descriptor (DummySerial) are written directly and give their
+    input through set_on_input.
+    * A port which fails (unplugged) is no longer watched and on_error is called.
+    """
+
+    def __init__(
+        self,
+        port,
+        on_data: Callable[[bytes], None],
+        loop: asyncio.AbstractEventLoop | None = None,
+        read_size: int = 4096,
+        on_error: Callable[[Exception], None] | None = None,
+    ) -> None:
+        self._port = port
+        self._on_data = on_data
+        self._on_error = on_error
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._read_size = read_size
+
+        self._fd = port.fileno() if hasattr(port, "fileno") else None
+        self._out_buffer = bytearray()
+        # (absolute end offset of a frame in the output stream, future)
+        self._pending = []
+        self._written = 0  # Bytes handed to the OS since the start
+        self._queued = 0  # Bytes given to write() since the start
+        self._writing = False
+
+    def start(self) -> None:
+        if self._fd is not None:
+            self._loop.add_reader(self._fd, self._on_readable)
+        elif hasattr(self._port, "set_on_input"):
+            self._port.set_on_input(
+                lambda data: self._loop.call_soon_threadsafe(self._on_data, data)
+            )
+
+    def close(self) -> None:
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            if self._writing:
+                self._loop.remove_writer(self._fd)
+        elif hasattr(self._port, "set_on_input"):
+            self._port.set_on_input(None)
+        for _, future in self._pending:
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+        self._out_buffer.clear()
+        self._writing = False
+
+    @property
+    def out_waiting(self) -> int:
+        """
+        Number of bytes buffered by the transport and not yet handed to the OS
+        """
+        return len(self._out_buffer)
+
+    def write(self, data: bytes) -> asyncio.Future:
+        """
+        Queue data and try to write it immediately.
+        :return: future resolved once all the data is handed to the OS
+        """
+        future = self._loop.create_future()
+
+        if self._fd is None:
+            self._port.write(data)
+            future.set_result(None)
+            return future
+
+        self._out_buffer += data
+        self._queued += len(data)
+        self._pending.append((self._queued, future))
+        if not self._writing:
+            self._flush()
+            if self._out_buffer:
+                self._writing = True
+                self._loop.add_writer(self._fd, self._on_writable)
+        return future
+
+    def _flush(self) -> None:
+        try:
+            written = os.write(self._fd, self._out_buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as error:
+            self._fail(error)
+            return
+        del self._out_buffer[:written]
+        self._written += written
+
+        while self._pending and self._pending[0][0] <= self._written:
+            _, future = self._pending.pop(0)
+            if not future.done():
+                future.set_result(None)
+
+    def _fail(self, error: Exception) -> None:
+        for _, future in self._pending:
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+        self._written += len(self._out_buffer)
+        self._out_buffer.clear()
+        if self._on_error is not None:
+            self._on_error(error)
+
+    def _on_writable(self) -> None:
+        self._flush()
+        if not self._out_buffer:
+            self._writing = False
+            self._loop.remove_writer(self._fd)
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self._fd, self._read_size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as error:
+            # Port closed (teensy unplugged ?), stop watching it
+            self._loop.remove_reader(self._fd)
+            if self._on_error is not None:
+                self._on_error(error)
+            return
+        if not data:
+            # Readable without data: end of file, the device is gone
+            self._loop.remove_reader(self._fd)
+            if self._on_error is not None:
+                self._on_error(
+                    OSError("device reports readiness to read but returned no data")
+                )
+            return
+        self._on_data(data)
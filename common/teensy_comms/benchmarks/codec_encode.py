@@ -0,0 +1,98 @@
+"""
+Encoding cost per command: previous encoder (struct.pack concatenations + crc8 package)
+against FrameCodec (precompiled struct, pack_into a preallocated frame, table CRC8).
+
+Before timing, every FrameCodec frame is checked byte for byte against the previous
+encoder (golden frames), over the whole speed range of the rolling basis commands.
+
+Run from the common directory:
+    python -m teensy_comms.benchmarks.codec_encode [nb_iterations]
+"""
+
+from teensy_comms.codec import FrameCodec, crc8_digest
+
+import crc8, struct, sys, timeit
+
+END_BYTES = b"\xba\xdd\x1c\xc5"
+
+# (name, msg_type, struct format) as registered by Pipou
+COMMANDS = (
+    ("vromm", 0, "H?"),
+    ("rotate", 1, "H?"),
+    ("l_motor", 2, "H?"),
+    ("r_motor", 3, "H?"),
+    ("stop", 4, ""),
+)
+
+
+def legacy_encode(msg_type: int, *values) -> bytes:
+    """
+    Pipou command + Teensy.send_bytes framing, as they were written before FrameCodec
+    """
+    msg = bytes([msg_type])
+    if values:
+        msg += struct.pack("<H", values[0]) + struct.pack("<?", values[1])
+    msg += bytes([len(msg)])
+    checker = crc8.crc8()
+    checker.reset()
+    checker.update(msg)
+    msg += checker.digest()
+    checker.reset()
+    return msg + END_BYTES
+
+
+def check_golden_frames(codec: FrameCodec) -> int:
+    checked = 0
+    for name, msg_type, fmt in COMMANDS:
+        values_list = (
+            [()]
+            if fmt == ""
+            else [
+                (speed, direction)
+                for speed in range(0, 65536, 7)
+                for direction in (False, True)
+            ]
+        )
+        for values in values_list:
+            expected = legacy_encode(msg_type, *values)
+            frame = codec.encode(msg_type, *values)
+            if bytes(frame) != expected:
+                raise AssertionError(
+                    f"{name}{values}: {bytes(frame).hex()} != {expected.hex()}"
+                )
+            if codec.encode_bytes(expected[: -codec.trailer_size]) != expected:
+                raise AssertionError(f"{name}{values}: encode_bytes mismatch")
+            checked += 1
+    # The table CRC8 is the crc8 package one
+    for byte in range(256):
+        assert (
+            crc8_digest(bytes([byte, 255 - byte]))
+            == crc8.crc8(bytes([byte, 255 - byte])).digest()[0]
+        )
+    return checked
+
+
+if __name__ == "__main__":
+    nb_iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    codec = FrameCodec(END_BYTES, crc=True)
+    for _, msg_type, fmt in COMMANDS:
+        codec.register(msg_type, fmt)
+
+    print(
+        f"Golden frames: {check_golden_frames(codec)} frames identical to the previous encoder"
+    )
+
+    for name, msg_type, fmt in COMMANDS:
+        values = (1234, True) if fmt else ()
+        legacy = timeit.timeit(
+            lambda: legacy_encode(msg_type, *values), number=nb_iterations
+        )
+        new = timeit.timeit(
+            lambda: codec.encode(msg_type, *values), number=nb_iterations
+        )
+        print(
+            f"{name:>8} | previous {legacy / nb_iterations * 1e9:7.0f} ns"
+            f" | codec {new / nb_iterations * 1e9:7.0f} ns"
+            f" | x{legacy / new:.1f}"
+        )
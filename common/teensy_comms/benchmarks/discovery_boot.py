@@ -0,0 +1,107 @@
+"""
+Board lookup at boot, for K boards:
+
+* legacy: the comports are walked for every board (Teensy.__find_port)
+* cold: no cache file, one walk (scan_ports) for all the boards, the cache is written
+* cached: the cache file of a previous boot, only the cached paths are checked
+
+Without Teensy plugged, the boards are ptys behind fake /dev/serial/by-id links written
+in the cache, as a previous boot would have done; the walks are the real ones of this
+machine. The scans done by each path are checked, and a stale entry must cost one scan.
+
+Run from the common directory:
+    python -m teensy_comms.benchmarks.discovery_boot [nb_boards] [repeat]
+"""
+
+from teensy_comms.discovery import DeviceCache, scan_ports
+
+import json, os, sys, tempfile, time
+import serial.tools.list_ports
+
+VID, PID = 0x16C0, 0x0483
+
+
+def legacy_lookup(serial_numbers: list[int]) -> None:
+    for ser in serial_numbers:
+        for port in serial.tools.list_ports.comports():
+            if (
+                port.vid == VID
+                and port.pid == PID
+                and port.serial_number is not None
+                and int(port.serial_number) == ser
+            ):
+                break
+
+
+def make_boards(directory: str, nb_boards: int) -> dict[int, str]:
+    """
+    Fake udev links to ptys, serial number -> link
+    """
+    by_id = os.path.join(directory, "by-id")
+    os.makedirs(by_id)
+    boards = {}
+    for i in range(nb_boards):
+        _, slave = os.openpty()
+        ser = 12675800 + i
+        link = os.path.join(by_id, f"usb-Teensyduino_USB_Serial_{ser}-if00")
+        os.symlink(os.ttyname(slave), link)
+        boards[ser] = link
+    return boards
+
+
+def timed(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    nb_boards = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    directory = tempfile.mkdtemp()
+    boards = make_boards(directory, nb_boards)
+    by_id_dir = os.path.join(directory, "by-id")
+    cache_path = os.path.join(directory, "teensy_devices.json")
+    serial_numbers = list(boards)
+
+    def cold_lookup():
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        cache = DeviceCache(cache_path, VID, PID, by_id_dir)
+        for ser in serial_numbers:
+            cache.device(ser)
+
+    def write_previous_boot():
+        with open(cache_path, "w") as file:
+            json.dump({"vid": VID, "pid": PID, "devices": boards}, file)
+
+    caches = []
+
+    def cached_lookup():
+        cache = DeviceCache(cache_path, VID, PID, by_id_dir)
+        for ser in serial_numbers:
+            cache.device(ser)
+        caches.append(cache)
+
+    legacy = timed(lambda: legacy_lookup(serial_numbers), repeat)
+    cold = timed(cold_lookup, repeat)
+    write_previous_boot()
+    cached = timed(cached_lookup, repeat)
+
+    if any(cache.scans or cache.hits != nb_boards for cache in caches):
+        raise AssertionError("The cached boot walked the comports")
+    # A board unplugged: its cached link is gone, the others are still hits
+    os.remove(boards[serial_numbers[0]])
+    cache = DeviceCache(cache_path, VID, PID, by_id_dir)
+    for ser in serial_numbers[1:] + serial_numbers[:1]:
+        cache.device(ser)
+    if cache.hits != nb_boards - 1 or cache.scans != 1:
+        raise AssertionError(f"Stale entry: {cache.hits} hits, {cache.scans} scans")
+
+    nb_ports = len(serial.tools.list_ports.comports())
+    print(f"{nb_boards} boards, {nb_ports} comports on this machine")
+    print(f"legacy | {legacy * 1e3:8.3f} ms ({nb_boards} walks)")
+    print(f"cold   | {cold * 1e3:8.3f} ms (1 walk + cache written)")
+    print(f"cached | {cached * 1e3:8.3f} ms (0 walk), x{legacy / cached:.0f} vs legacy")
@@ -0,0 +1,80 @@
+"""
+Frames per second of the receive path: read_until + slicing (previous receiver)
+against the streaming FrameDecoder, on an in-memory stream of telemetry-like frames.
+
+Run from the common directory:
+    python -m teensy_comms.benchmarks.frame_decoder_fps [nb_frames] [chunk_size]
+"""
+
+from teensy_comms.frame_decoder import FrameDecoder
+from teensy_comms.codec import crc8_digest
+
+import crc8, io, os, serial, sys, time
+
+END_BYTES = b"\xba\xdd\x1c\xc5"
+
+
+def build_frame(data: bytes) -> bytes:
+    msg = data + bytes([len(data)])
+    return msg + crc8.crc8(msg).digest() + END_BYTES
+
+
+class MemoryPort(io.BytesIO):
+    """
+    Stream with the pyserial reading API (read_until reads byte per byte, as pyserial does)
+    """
+
+    _timeout = None
+    read_until = serial.SerialBase.read_until
+
+
+def old_receiver(stream: bytes, nb_frames: int) -> int:
+    port = MemoryPort(stream)
+    checker = crc8.crc8()
+    handled = 0
+    for _ in range(nb_frames):
+        msg = port.read_until(END_BYTES)
+        crc = msg[-5:-4]
+        msg = msg[:-5]
+        checker.reset()
+        checker.update(msg)
+        if checker.digest() != crc:
+            continue
+        if msg[-1] > len(msg):
+            continue
+        payload = msg[1:-1]
+        handled += 1
+    return handled
+
+
+def new_receiver(stream: bytes, chunk_size: int) -> int:
+    port = MemoryPort(stream)
+    decoder = FrameDecoder(END_BYTES, crc=True, crc_func=crc8_digest)
+    handled = 0
+    while decoder.readinto(port, chunk_size):
+        for msg_type, payload in decoder.decode():
+            handled += 1
+    return handled
+
+
+def measure(func, *args) -> tuple[int, float]:
+    start = time.perf_counter()
+    handled = func(*args)
+    return handled, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    nb_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+
+    # 16 bytes telemetry payloads
+    frames = [build_frame(b"\x83" + os.urandom(16)) for _ in range(256)]
+    stream = b"".join(frames[i % 256] for i in range(nb_frames))
+
+    print(f"{nb_frames} frames of {len(frames[0])} bytes, chunks of {chunk_size} bytes")
+    for name, func, args in (
+        ("read_until", old_receiver, (stream, nb_frames)),
+        ("decoder", new_receiver, (stream, chunk_size)),
+    ):
+        handled, duration = measure(func, *args)
+        print(f"{name:>10} | {handled} frames | {handled / duration:10.0f} frames/s")
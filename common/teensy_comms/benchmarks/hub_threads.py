@@ -0,0 +1,124 @@
+"""
+Threads and wakeups of the serial stack as boards are added: K Teensy opened on ptys,
+each fake firmware sends one telemetry frame per millisecond (all of them written by
+one peer thread, the same in both modes).
+
+* own threads: every Teensy has its receiver and its dispatch worker
+* hub: one TeensyHub reader (selectors) and a shared pool of 2 workers
+
+For the threads of the serial stack (Teensy*), from /proc (Linux): number of threads,
+voluntary context switches per second and CPU. The frames handled are checked.
+
+Run from the common directory:
+    python -m teensy_comms.benchmarks.hub_threads [duration] [max_boards]
+"""
+
+from teensy_comms import Teensy
+from teensy_comms.hub import TeensyHub
+from teensy_comms.codec import FrameCodec
+from teensy_comms.benchmarks.pty_serial import thread_cpu_time
+from logger import Logger, LogLevels
+
+import json, os, struct, subprocess, sys, threading, time
+
+END_BYTES = b"\xba\xdd\x1c\xc5"
+ENCODERS = 131
+ENCODERS_RECORD = [("time_us", "<u4"), ("left_ticks", "<i4"), ("right_ticks", "<i4")]
+RATE = 1000  # frames per second and per board
+
+
+def stack_threads() -> list[threading.Thread]:
+    return [t for t in threading.enumerate() if t.name.startswith("Teensy")]
+
+
+def voluntary_switches(thread: threading.Thread) -> int:
+    try:
+        with open(f"/proc/self/task/{thread.native_id}/status") as file:
+            for line in file:
+                if line.startswith("voluntary_ctxt_switches"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def run(nb_boards: int, duration: float, hub: TeensyHub | None, logger: Logger) -> dict:
+    masters, boards, rings = [], [], []
+    for _ in range(nb_boards):
+        master, slave = os.openpty()
+        masters.append(master)
+        teensy = Teensy(logger, ser=0, vid=0, pid=0, device=os.ttyname(slave), hub=hub)
+        rings.append(teensy.add_telemetry(ENCODERS, ENCODERS_RECORD))
+        boards.append(teensy)
+    time.sleep(0.1)
+
+    threads = stack_threads()
+    switches = sum(voluntary_switches(t) for t in threads)
+    cpu = sum(thread_cpu_time(t) for t in threads)
+    wakeups = hub.wakeups if hub is not None else 0
+
+    codec = FrameCodec(END_BYTES)
+    start = time.monotonic()
+    tick = 0
+    while time.monotonic() - start < duration:
+        frame = codec.encode_bytes(
+            bytes([ENCODERS]) + struct.pack("<Iii", tick * 1000, tick, -tick)
+        )
+        for master in masters:
+            os.write(master, frame)
+        tick += 1
+        time.sleep(max(0.0, start + tick / RATE - time.monotonic()))
+    time.sleep(0.1)
+    elapsed = time.monotonic() - start
+
+    result = {
+        "threads": len(threads),
+        "switches_per_s": (sum(voluntary_switches(t) for t in threads) - switches)
+        / elapsed,
+        "cpu_percent": (sum(thread_cpu_time(t) for t in threads) - cpu) / elapsed * 100,
+        "handled": sum(ring.frames for ring in rings),
+        "sent": tick * nb_boards,
+    }
+    if hub is not None:
+        result["select_per_s"] = (hub.wakeups - wakeups) / elapsed
+    return result
+
+
+def main(duration: float, max_boards: int) -> None:
+    nb_boards = 1
+    while nb_boards <= max_boards:
+        for mode in ("threads", "hub"):
+            # One process per run: the threads of a Teensy never stop
+            output = subprocess.run(
+                [sys.executable, "-m", __spec__.name, "--run", mode]
+                + [str(nb_boards), str(duration)],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            result = json.loads(output)
+            if result["handled"] != result["sent"]:
+                raise AssertionError(f"{mode}, {nb_boards} boards: {result}")
+            line = (
+                f"{nb_boards} boards | {mode:>7} | {result['threads']:3d} threads"
+                f" | {result['switches_per_s']:8.0f} switches/s"
+                f" | CPU {result['cpu_percent']:5.1f} %"
+            )
+            if mode == "hub":
+                line += f" | {result['select_per_s']:6.0f} select/s"
+            print(line)
+        nb_boards *= 2
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        logger = Logger(
+            identifier="hub", print_log=False, file_log_level=LogLevels.FATAL
+        )
+        hub = TeensyHub(logger, vid=0, pid=0) if sys.argv[2] == "hub" else None
+        print(json.dumps(run(int(sys.argv[3]), float(sys.argv[4]), hub, logger)))
+    else:
+        main(
+            float(sys.argv[1]) if len(sys.argv) > 1 else 2.0,
+            int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+        )
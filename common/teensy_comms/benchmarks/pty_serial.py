@@ -0,0 +1,318 @@
+"""
+Serial stack benchmark on a pseudo terminal: Teensy opens one end of an os.openpty()
+pair as a real serial.Serial (reset_output_buffer, out_waiting, blocking reads...), a
+scripted echo peer runs on the other end.
+
+* rtt: ECHO_REQUEST commands sent one at a time, the peer answers ECHO_REPLY with the
+same payload, round trip percentiles.
+* rasp -> teensy: commands sent back to back, frames per second received by the peer.
+* teensy -> rasp: frames sent back to back by the peer, frames per second handled.
+* receiver CPU: CPU time of the TeensyReceiver thread (/proc, Linux) during each test.
+
+Results are written to a JSON file, --compare prints the change against a previous one.
+
+Run from the common directory:
+    python -m teensy_comms.benchmarks.pty_serial [--transport thread asyncio] [--output file.json] [--compare old.json]
+"""
+
+from teensy_comms import Teensy
+from teensy_comms.codec import FrameCodec, crc8_digest
+from teensy_comms.frame_decoder import FrameDecoder
+from logger import Logger, LogLevels
+
+import argparse, asyncio, datetime, json, os, platform, struct
+import subprocess, sys, threading, time
+import numpy as np
+
+END_BYTES = b"\xba\xdd\x1c\xc5"
+ECHO_REQUEST = 120  # rasp -> teensy, unused by the firmware
+ECHO_REPLY = 250  # teensy -> rasp
+BLAST = 251  # teensy -> rasp
+SEQ_STRUCT = struct.Struct("<I")
+
+
+class EchoPeer:
+    """
+    Fake Teensy on the master side of the pty: answers the echo requests, counts the
+    other frames and sends bursts on demand
+    """
+
+    def __init__(self, fd: int) -> None:
+        self.fd = fd
+        self.codec = FrameCodec(END_BYTES)
+        self.decoder = FrameDecoder(END_BYTES, crc=True, crc_func=crc8_digest)
+        self.received = 0
+        self.echo = True
+        threading.Thread(target=self.__reader__, daemon=True).start()
+
+    def __reader__(self) -> None:
+        while True:
+            self.decoder.feed(os.read(self.fd, 4096))
+            for msg_type, msg in self.decoder.decode():
+                self.received += 1
+                if msg_type == ECHO_REQUEST and self.echo:
+                    os.write(
+                        self.fd, self.codec.encode_bytes(bytes([ECHO_REPLY]) + msg)
+                    )
+
+    def blast(self, nb_frames: int, payload_size: int = 16) -> None:
+        frame = self.codec.encode_bytes(bytes([BLAST]) + bytes(payload_size))
+        chunk = frame * 64
+        for _ in range(nb_frames // 64):
+            os.write(self.fd, chunk)
+        os.write(self.fd, frame * (nb_frames % 64))
+
+
+def thread_cpu_time(thread: threading.Thread | None) -> float:
+    """
+    CPU time (user + system) of a thread, in seconds (Linux only, 0 elsewhere)
+    """
+    if thread is None or thread.native_id is None:
+        return 0.0
+    try:
+        with open(f"/proc/self/task/{thread.native_id}/stat") as file:
+            fields = file.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return 0.0
+    # utime and stime are the fields 14 and 15 (12 and 13 after the command name)
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def percentiles(samples: list[float]) -> dict:
+    values = np.array(samples) * 1e6
+    return {
+        "p50_us": float(np.percentile(values, 50)),
+        "p90_us": float(np.percentile(values, 90)),
+        "p99_us": float(np.percentile(values, 99)),
+        "max_us": float(values.max()),
+    }
+
+
+def wait_count(count, expected: int, idle_timeout: float = 1.0) -> int:
+    """
+    Wait until count() reaches expected, or stops increasing for idle_timeout (lost frames)
+    """
+    last, last_change = count(), time.perf_counter()
+    while last < expected and time.perf_counter() - last_change < idle_timeout:
+        time.sleep(0.0005)
+        if count() != last:
+            last, last_change = count(), time.perf_counter()
+    return count()
+
+
+async def wait_count_async(count, expected: int, idle_timeout: float = 1.0) -> int:
+    last, last_change = count(), time.perf_counter()
+    while last < expected and time.perf_counter() - last_change < idle_timeout:
+        await asyncio.sleep(0.0005)
+        if count() != last:
+            last, last_change = count(), time.perf_counter()
+    return count()
+
+
+def rate(received: int, sent: int, start: float) -> dict:
+    """
+    Frames per second, the time waiting for lost frames is not counted
+    """
+    duration = time.perf_counter() - start
+    if received < sent:
+        duration -= 1.0
+    return {"fps": received / duration, "received": received, "lost": sent - received}
+
+
+class PtyBench:
+    def __init__(self, transport: str, logger: Logger) -> None:
+        self.master, slave = os.openpty()
+        os.set_blocking(self.master, True)
+        self.peer = EchoPeer(self.master)
+        self.teensy = Teensy(
+            logger,
+            ser=0,
+            vid=0,
+            pid=0,
+            device=os.ttyname(slave),
+            transport=transport,
+        )
+        self.transport = transport
+        self.replies = {}
+        self.reply_event = threading.Event()
+        self.blast_received = 0
+        self.teensy.add_callback(self._on_reply, ECHO_REPLY)
+        self.teensy.add_callback(self._on_blast, BLAST, queue_size=1 << 16)
+
+    @property
+    def receiver(self) -> threading.Thread | None:
+        return getattr(self.teensy, "_reciever", None)
+
+    def _on_reply(self, msg: bytes) -> None:
+        self.replies[SEQ_STRUCT.unpack(msg)[0]] = time.perf_counter()
+        self.reply_event.set()
+
+    def _on_blast(self, msg: bytes) -> None:
+        self.blast_received += 1
+
+    def _measured(self, func, *args) -> dict:
+        cpu = thread_cpu_time(self.receiver)
+        start = time.perf_counter()
+        result = func(*args)
+        duration = time.perf_counter() - start
+        result["duration_s"] = duration
+        if self.receiver is not None:
+            result["receiver_cpu_percent"] = (
+                (thread_cpu_time(self.receiver) - cpu) / duration * 100
+            )
+        return result
+
+    # Thread transport
+    def rtt(self, nb_commands: int) -> dict:
+        samples = []
+        for seq in range(nb_commands):
+            self.reply_event.clear()
+            sent = time.perf_counter()
+            self.teensy.send_bytes(bytes([ECHO_REQUEST]) + SEQ_STRUCT.pack(seq))
+            if not self.reply_event.wait(1):
+                raise TimeoutError(f"No echo for the command {seq}")
+            samples.append(self.replies.pop(seq) - sent)
+        return percentiles(samples)
+
+    def to_teensy(self, nb_frames: int) -> dict:
+        self.peer.echo = False
+        start_count = self.peer.received
+        start = time.perf_counter()
+        for seq in range(nb_frames):
+            self.teensy.send_bytes(bytes([ECHO_REQUEST]) + SEQ_STRUCT.pack(seq))
+        received = wait_count(lambda: self.peer.received - start_count, nb_frames)
+        self.peer.echo = True
+        return rate(received, nb_frames, start)
+
+    def from_teensy(self, nb_frames: int) -> dict:
+        self.blast_received = 0
+        start = time.perf_counter()
+        self.peer.blast(nb_frames)
+        received = wait_count(lambda: self.blast_received, nb_frames)
+        return rate(received, nb_frames, start)
+
+    def run(self, nb_commands: int, nb_frames: int) -> dict:
+        if self.transport == "asyncio":
+            return asyncio.run(self.run_async(nb_commands, nb_frames))
+        return {
+            "rtt": self._measured(self.rtt, nb_commands),
+            "rasp_to_teensy": self._measured(self.to_teensy, nb_frames),
+            "teensy_to_rasp": self._measured(self.from_teensy, nb_frames),
+        }
+
+    # Asyncio transport (no receiver thread, the event loop reads)
+    async def rtt_async(self, nb_commands: int) -> dict:
+        samples = []
+        for seq in range(nb_commands):
+            self.reply_event.clear()
+            sent = time.perf_counter()
+            await self.teensy.send_bytes(bytes([ECHO_REQUEST]) + SEQ_STRUCT.pack(seq))
+            while seq not in self.replies:
+                await asyncio.sleep(0)
+            samples.append(self.replies.pop(seq) - sent)
+        return percentiles(samples)
+
+    async def to_teensy_async(self, nb_frames: int) -> dict:
+        self.peer.echo = False
+        start_count = self.peer.received
+        start = time.perf_counter()
+        for seq in range(nb_frames):
+            self.teensy.send_bytes(bytes([ECHO_REQUEST]) + SEQ_STRUCT.pack(seq))
+            if seq % 64 == 0:
+                await asyncio.sleep(0)
+        received = await wait_count_async(
+            lambda: self.peer.received - start_count, nb_frames
+        )
+        self.peer.echo = True
+        return rate(received, nb_frames, start)
+
+    async def from_teensy_async(self, nb_frames: int) -> dict:
+        self.blast_received = 0
+        start = time.perf_counter()
+        await asyncio.to_thread(self.peer.blast, nb_frames)
+        received = await wait_count_async(lambda: self.blast_received, nb_frames)
+        return rate(received, nb_frames, start)
+
+    async def _measured_async(self, coroutine_func, *args) -> dict:
+        cpu = time.process_time()
+        start = time.perf_counter()
+        result = await coroutine_func(*args)
+        duration = time.perf_counter() - start
+        result["duration_s"] = duration
+        # The whole process: the loop does the reading
+        result["process_cpu_percent"] = (time.process_time() - cpu) / duration * 100
+        return result
+
+    async def run_async(self, nb_commands: int, nb_frames: int) -> dict:
+        await self.teensy.connect_async()
+        return {
+            "rtt": await self._measured_async(self.rtt_async, nb_commands),
+            "rasp_to_teensy": await self._measured_async(
+                self.to_teensy_async, nb_frames
+            ),
+            "teensy_to_rasp": await self._measured_async(
+                self.from_teensy_async, nb_frames
+            ),
+        }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, previous: dict) -> None:
+    for transport, tests in results["transports"].items():
+        old_tests = previous.get("transports", {}).get(transport)
+        if old_tests is None:
+            continue
+        for test, values in tests.items():
+            for key, value in values.items():
+                old = old_tests.get(test, {}).get(key)
+                if old:
+                    print(
+                        f"{transport:>8} {test:>15} {key:>22} | {old:12.1f} -> {value:12.1f}"
+                        f" ({(value - old) / old * 100:+6.1f} %)"
+                    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--transport", nargs="+", default=["thread", "asyncio"])
+    parser.add_argument("--commands", type=int, default=2000)
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None)
+    args = parser.parse_args()
+
+    logger = Logger(identifier="pty", print_log=False, file_log_level=LogLevels.FATAL)
+    results = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "commands": args.commands,
+        "frames": args.frames,
+        "transports": {},
+    }
+    for transport in args.transport:
+        results["transports"][transport] = PtyBench(transport, logger).run(
+            args.commands, args.frames
+        )
+    print(json.dumps(results, indent=2))
+
+    output = args.output or f"pty_serial_{results['date'].replace(':', '-')}.json"
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
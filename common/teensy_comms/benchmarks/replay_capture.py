@@ -0,0 +1,127 @@
+"""
+Replay of a raw serial capture through the Teensy receive path (decoder, link, dispatch).
+
+Without capture file, a synthetic one is recorded first: a Teensy opened on a pty with
+capture enabled, a fake firmware sending prints and encoder telemetry at 1 kHz while
+commands are sent. The replay is then checked against what the fake firmware sent.
+
+The capture is replayed as fast as possible (decode + dispatch throughput), then at
+10x and 1x to check the timing of the replay.
+
+Run from the common directory:
+    python -m teensy_comms.benchmarks.replay_capture [capture_file] [duration]
+"""
+
+from teensy_comms import Teensy
+from teensy_comms.capture import read_capture, CaptureDirection
+from teensy_comms.codec import FrameCodec
+from logger import Logger, LogLevels
+
+import os, struct, sys, tempfile, threading, time
+
+END_BYTES = b"\xba\xdd\x1c\xc5"
+PRINT, ENCODERS = 130, 131
+ENCODERS_RECORD = [("time_us", "<u4"), ("left_ticks", "<i4"), ("right_ticks", "<i4")]
+
+
+def record_capture(path: str, duration: float, logger: Logger) -> dict:
+    """
+    Capture the traffic of a fake firmware on a pty
+    :return: number of frames sent by the fake firmware for each message type
+    """
+    master, slave = os.openpty()
+    teensy = Teensy(logger, ser=0, vid=0, pid=0, device=os.ttyname(slave), capture=path)
+    teensy.add_telemetry(ENCODERS, ENCODERS_RECORD)
+    teensy.add_callback(lambda msg: None, PRINT)
+    codec = FrameCodec(END_BYTES)
+    sent = {PRINT: 0, ENCODERS: 0}
+
+    def fake_firmware():
+        start = time.monotonic()
+        tick = 0
+        while time.monotonic() - start < duration:
+            frame = codec.encode_bytes(
+                bytes([ENCODERS]) + struct.pack("<Iii", tick * 1000, tick, -tick)
+            )
+            sent[ENCODERS] += 1
+            if tick % 100 == 0:
+                frame += codec.encode_bytes(bytes([PRINT]) + f"tick {tick}".encode())
+                sent[PRINT] += 1
+            os.write(master, frame)
+            tick += 1
+            time.sleep(max(0.0, start + tick / 1000 - time.monotonic()))
+
+    def drain_commands():
+        while True:
+            os.read(master, 4096)
+
+    threading.Thread(target=drain_commands, daemon=True).start()
+    firmware = threading.Thread(target=fake_firmware)
+    firmware.start()
+    while firmware.is_alive():
+        teensy.send_bytes(b"\x02\x10\x00\x01")
+        time.sleep(0.02)
+    time.sleep(0.2)
+    teensy._capture.close()
+    return sent
+
+
+def replay(path: str, speed: float, logger: Logger) -> tuple[dict, float]:
+    """
+    :return: frames handled for each message type, replay duration
+    """
+    teensy = Teensy(
+        logger, ser=0, vid=0, pid=0, dummy=True, replay=path, replay_speed=speed
+    )
+    encoders = teensy.add_telemetry(ENCODERS, ENCODERS_RECORD, capacity=1 << 16)
+    prints = []
+    teensy.add_callback(prints.append, PRINT, queue_size=1024)
+
+    start = time.perf_counter()
+    teensy._replay.wait()
+    # Wait for the receiver and the dispatch workers
+    while (
+        teensy._replay.in_waiting
+        or teensy._decoder.pending
+        or sum(stats["handled"] for stats in teensy.dispatch_stats().values())
+        < teensy._decoder.frames
+    ):
+        time.sleep(0.0005)
+    duration = time.perf_counter() - start
+    return {PRINT: len(prints), ENCODERS: encoders.frames}, duration
+
+
+if __name__ == "__main__":
+    logger = Logger(
+        identifier="replay", print_log=False, file_log_level=LogLevels.FATAL
+    )
+
+    if len(sys.argv) > 1 and os.path.exists(sys.argv[1]):
+        path = sys.argv[1]
+        expected = None
+    else:
+        duration = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.tcap")
+        expected = record_capture(path, duration, logger)
+        print(f"Synthetic capture recorded in {path}: {expected}")
+
+    records = list(read_capture(path))
+    inbound = [r for r in records if r[1] == CaptureDirection.IN]
+    nb_bytes = sum(len(r[2]) for r in inbound)
+    span = records[-1][0] - records[0][0]
+    print(
+        f"{len(records)} chunks ({len(inbound)} received, {nb_bytes} bytes)"
+        f" over {span:.2f} s, {os.path.getsize(path)} bytes on disk"
+    )
+
+    for speed in (0, 10, 1):
+        handled, replay_duration = replay(path, speed, logger)
+        if expected is not None and handled != expected:
+            raise AssertionError(f"Replay handled {handled}, sent {expected}")
+        nb_frames = sum(handled.values())
+        line = f"speed {speed:>2} | {nb_frames} frames in {replay_duration:6.3f} s"
+        if speed == 0:
+            line += f" | {nb_frames / replay_duration:8.0f} frames/s"
+        else:
+            line += f" | expected {span / speed:6.3f} s"
+        print(line)
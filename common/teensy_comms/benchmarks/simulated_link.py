@@ -0,0 +1,103 @@
+"""
+Load test of the serial stack against the simulated rolling basis firmware
+(SimulatedSerial: 115200 bauds, USB latency, bit errors), no Teensy needed.
+
+* throughput: motor commands sent back to back, against the line limit.
+* bit errors: commands executed by the firmware with the legacy protocol (NACK resends
+the last message only) and with the sequenced one (sliding window, retransmissions).
+* telemetry: encoder + motor telemetry received while commands are sent.
+
+Run from the common directory:
+    python -m teensy_comms.benchmarks.simulated_link [nb_commands] [bit_error_rate]
+"""
+
+from teensy_comms import Teensy
+from logger import Logger, LogLevels
+
+import sys, time
+
+L_MOTOR = 2
+ENCODERS = 131
+ENCODERS_RECORD = [("time_us", "<u4"), ("left_ticks", "<i4"), ("right_ticks", "<i4")]
+
+
+def simulated_teensy(logger: Logger, protocol: int = 1, **simulation) -> Teensy:
+    teensy = Teensy(
+        logger,
+        ser=0,
+        vid=0,
+        pid=0,
+        dummy=True,
+        protocol=protocol,
+        simulation=simulation,
+    )
+    teensy.codec.register(L_MOTOR, "H?")
+    return teensy
+
+
+def send_commands(teensy: Teensy, nb_commands: int) -> float:
+    start = time.perf_counter()
+    for i in range(nb_commands):
+        teensy.send_command(L_MOTOR, i % 256, True)
+    return time.perf_counter() - start
+
+
+def wait_idle(teensy: Teensy, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if teensy._link.in_flight == 0 and teensy._link.backlog == 0:
+            time.sleep(0.05)
+            if teensy._link.in_flight == 0:
+                return
+        time.sleep(0.01)
+
+
+if __name__ == "__main__":
+    nb_commands = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    bit_error_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 1e-4
+    logger = Logger(identifier="sim", print_log=False, file_log_level=LogLevels.FATAL)
+
+    # Throughput: a L_MOTOR frame is 10 bytes, 100 bits
+    teensy = simulated_teensy(logger, latency=0.001)
+    duration = send_commands(teensy, nb_commands)
+    time.sleep(0.1)
+    port = teensy._teensy
+    print(
+        f"throughput | {nb_commands / duration:6.0f} commands/s"
+        f" (line limit {115200 / 100:.0f}) | executed {port.stats['commands']}"
+    )
+
+    # Bit errors
+    for protocol in (1, 2):
+        teensy = simulated_teensy(
+            logger, protocol=protocol, bit_error_rate=bit_error_rate, seed=1
+        )
+        send_commands(teensy, nb_commands)
+        wait_idle(teensy)
+        time.sleep(0.2)
+        port = teensy._teensy
+        print(
+            f"protocol {protocol} | bit error rate {bit_error_rate:g}"
+            f" | executed {port.stats['commands']}/{nb_commands}"
+            f" | CRC errors {port.stats['crc_errors']}"
+            f" | retransmits {teensy._link.retransmits}"
+            f" | corrupted bytes {port.stats['corrupted_bytes']}"
+        )
+
+    # Telemetry: an encoders + motors pair is 37 bytes, 1 kHz does not fit in 115200 bauds
+    for telemetry_rate in (250, 1000):
+        teensy = simulated_teensy(logger, telemetry_rate=telemetry_rate)
+        encoders = teensy.add_telemetry(ENCODERS, ENCODERS_RECORD)
+        start = time.monotonic()
+        while time.monotonic() - start < 1:
+            teensy.send_command(L_MOTOR, 100, True)
+            time.sleep(0.01)
+        port = teensy._teensy
+        _, latest = encoders.latest()
+        # Age of the newest sample received, in the firmware time
+        lag = time.monotonic() - port._start - latest["time_us"] / 1e6
+        print(
+            f"telemetry {telemetry_rate:>4} Hz | {encoders.frames} encoder frames in 1 s"
+            f" (sent {port.stats['telemetry_sent'] // 2})"
+            f" | newest sample age {lag * 1e3:6.1f} ms"
+        )
@@ -0,0 +1,119 @@
+"""
+Telemetry ingestion cost: decode + ring buffer store of encoder frames (struct.unpack
+per sample into a list, as a handler would do without TelemetryRing, against
+TelemetryRing.ingest), and cost of the latest() / since(t) queries.
+
+The ring content is first checked against the sent records (wrap around included), and
+the memory allocated while ingesting is measured with tracemalloc.
+
+Run from the common directory:
+    python -m teensy_comms.benchmarks.telemetry_ingest [nb_frames] [records_per_frame]
+"""
+
+from teensy_comms.telemetry import TelemetryRing
+
+import collections, numpy as np, struct, sys, time, tracemalloc
+
+ENCODERS_RECORD = [("time_us", "<u4"), ("left_ticks", "<i4"), ("right_ticks", "<i4")]
+RECORD_STRUCT = struct.Struct("<Iii")
+
+
+def build_frames(nb_frames: int, records_per_frame: int) -> list[bytes]:
+    frames = []
+    sample = 0
+    for _ in range(nb_frames):
+        frame = b""
+        for _ in range(records_per_frame):
+            frame += RECORD_STRUCT.pack(sample * 1000, sample, -sample)
+            sample += 1
+        frames.append(frame)
+    return frames
+
+
+def check_ring(records_per_frame: int) -> None:
+    # More records than the capacity, so the ring wraps around
+    frames = build_frames(2500, records_per_frame)
+    ring = TelemetryRing(ENCODERS_RECORD, capacity=1000)
+    for i, frame in enumerate(frames):
+        ring.ingest(frame, t=float(i))
+    total = len(frames) * records_per_frame
+    assert ring.count == total and len(ring) == min(total, 1000)
+
+    t, latest = ring.latest()
+    assert latest["left_ticks"] == total - 1 and t == len(frames) - 1
+
+    # Window crossing the wrap around of the ring
+    since = len(frames) - 1000 // records_per_frame // 2
+    times, records = ring.since(since)
+    first = since * records_per_frame
+    assert np.array_equal(records["left_ticks"], np.arange(first, total))
+    assert np.array_equal(records["right_ticks"], -np.arange(first, total))
+    assert np.all(times >= since) and len(times) == len(records)
+
+    times, records = ring.last(10)
+    assert np.array_equal(records["left_ticks"], np.arange(total - 10, total))
+
+    ring.ingest(b"\x00" * (RECORD_STRUCT.size + 1))
+    assert ring.invalid_frames == 1 and ring.count == total
+
+
+def struct_ingest(frames: list[bytes]) -> int:
+    samples = collections.deque(maxlen=4096)
+    for frame in frames:
+        t = time.monotonic()
+        for record in RECORD_STRUCT.iter_unpack(frame):
+            samples.append((t, *record))
+    return len(samples)
+
+
+def ring_ingest(frames: list[bytes]) -> int:
+    ring = TelemetryRing(ENCODERS_RECORD, capacity=4096)
+    for frame in frames:
+        ring.ingest(frame)
+    return len(ring)
+
+
+def allocated_while(func, *args) -> int:
+    """
+    Peak memory allocated by func (the ring and the deque are created inside)
+    """
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == "__main__":
+    nb_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    records_per_frame = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    frames = build_frames(nb_frames, records_per_frame)
+    check_ring(records_per_frame)
+    print("Ring content checked (wrap around, latest, since, last)")
+
+    nb_samples = nb_frames * records_per_frame
+    print(f"{nb_frames} frames of {records_per_frame} records ({nb_samples} samples)")
+    for name, func in (("struct", struct_ingest), ("ring", ring_ingest)):
+        start = time.perf_counter()
+        func(frames)
+        duration = time.perf_counter() - start
+        print(
+            f"{name:>8} | {nb_samples / duration:10.0f} samples/s"
+            f" | {duration / nb_frames * 1e6:6.2f} us/frame"
+            f" | peak memory {allocated_while(func, frames) / 1024:7.0f} KiB"
+        )
+
+    ring = TelemetryRing(ENCODERS_RECORD, capacity=4096)
+    for frame in frames:
+        ring.ingest(frame)
+    now = time.monotonic()
+    for name, query in (
+        ("latest()", lambda: ring.latest()),
+        ("since(t - 0.1 s)", lambda: ring.since(now - 0.1)),
+        ("last(100)", lambda: ring.last(100)),
+    ):
+        start = time.perf_counter()
+        for _ in range(10000):
+            query()
+        print(f"{name:>17} | {(time.perf_counter() - start) / 10000 * 1e6:6.2f} us")
@@ -0,0 +1,143 @@
+"""
+A velocity profile of N setpoints (10 ms each) played by the simulated rolling basis
+(SimulatedSerial, sequenced protocol):
+
+* loop: the rasp sends a LR_MOTORS frame at the time of each setpoint (sleep loop),
+* stream: the setpoints are uploaded at once as trajectory segments (TrajectoryStreamer),
+the firmware plays them from its buffer and sends back its credits.
+
+The times at which the firmware applies each setpoint are compared to the plan (error
+relative to the first setpoint), with the bytes sent per setpoint and the CPU used.
+The times are the planned times of the simulator events (arrival of a frame, end of a
+segment), without the delays of its thread: the stream is exact by construction here,
+the real firmware adds its loop period (Trajectory_Player::update is polled, ms clock).
+With --load, a thread burns CPU on the rasp meanwhile. The simulator runs in the same
+process, the CPU includes it.
+
+Run from the common directory:
+    python -m teensy_comms.benchmarks.trajectory_stream [nb_setpoints] [--load]
+"""
+
+from teensy_comms import Teensy
+from teensy_comms.trajectory import TrajectoryStreamer, MAX_SEGMENTS_PER_FRAME
+from logger import Logger, LogLevels
+
+import sys, threading, time
+import numpy as np
+
+LR_MOTORS, TRAJECTORY_SEGMENTS, TRAJECTORY_ABORT = 5, 6, 7
+TRAJECTORY_STATUS = 133
+PERIOD = 0.01
+
+
+def simulated_teensy(logger: Logger) -> Teensy:
+    teensy = Teensy(logger, ser=0, vid=0, pid=0, dummy=True, protocol=2, simulation={})
+    teensy.codec.register(LR_MOTORS, "H?H?")
+    teensy._teensy.pwm_log = []
+    return teensy
+
+
+def profile(nb_setpoints: int) -> tuple[np.ndarray, np.ndarray]:
+    # Two consecutive setpoints always differ, each one shows in the PWM log
+    k = np.arange(nb_setpoints)
+    left = np.rint(200 * np.sin(k / 20)) * 2 + k % 2
+    right = np.rint(200 * np.cos(k / 20)) * 2 + k % 2
+    return np.clip(left, -255, 255), np.clip(right, -255, 255)
+
+
+def run_loop(teensy: Teensy, left: np.ndarray, right: np.ndarray) -> None:
+    start = time.monotonic()
+    for k in range(len(left)):
+        delay = start + k * PERIOD - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        teensy.send_command(
+            LR_MOTORS,
+            abs(int(left[k])),
+            left[k] >= 0,
+            abs(int(right[k])),
+            right[k] >= 0,
+        )
+    time.sleep(PERIOD)
+    teensy.send_command(LR_MOTORS, 0, True, 0, True)
+
+
+def run_stream(
+    teensy: Teensy, streamer: TrajectoryStreamer, left: np.ndarray, right: np.ndarray
+) -> None:
+    streamer.upload(np.full(len(left), PERIOD), left, right)
+    if not streamer.wait(len(left) * PERIOD + 5):
+        raise AssertionError(f"Trajectory not played: {streamer.stats()}")
+
+
+def timing_errors(
+    pwm_log: list, left: np.ndarray, right: np.ndarray
+) -> np.ndarray | None:
+    """
+    :return: |applied - planned| of each setpoint in seconds, None if one is missing
+    """
+    applied = [entry for entry in pwm_log if entry[1:] != (0, 0)]
+    if len(applied) != len(left) or any(
+        (l, r) != (left[k], right[k]) for k, (_, l, r) in enumerate(applied)
+    ):
+        return None
+    times = np.array([entry[0] for entry in applied])
+    return np.abs(times - times[0] - np.arange(len(left)) * PERIOD)
+
+
+def burn(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+if __name__ == "__main__":
+    nb_setpoints = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    load = "--load" in sys.argv
+    logger = Logger(identifier="traj", print_log=False, file_log_level=LogLevels.FATAL)
+    left, right = profile(nb_setpoints)
+
+    for mode in ("loop", "stream"):
+        teensy = simulated_teensy(logger)
+        streamer = TrajectoryStreamer(
+            teensy.send_bytes, TRAJECTORY_SEGMENTS, TRAJECTORY_ABORT, logger=logger
+        )
+        teensy.add_callback(streamer.on_status, TRAJECTORY_STATUS)
+        port = teensy._teensy
+
+        stop = threading.Event()
+        if load:
+            threading.Thread(target=burn, args=(stop,), daemon=True).start()
+        cpu, start = time.process_time(), time.monotonic()
+        if mode == "loop":
+            run_loop(teensy, left, right)
+        else:
+            run_stream(teensy, streamer, left, right)
+        cpu_percent = (time.process_time() - cpu) / (time.monotonic() - start) * 100
+        stop.set()
+        time.sleep(0.1)
+
+        errors = timing_errors(port.pwm_log, left, right)
+        if errors is None:
+            raise AssertionError(f"{mode}: setpoints missing or out of order")
+        print(
+            f"{mode:>6} | error p50 {np.percentile(errors, 50) * 1e3:6.3f} ms"
+            f" p99 {np.percentile(errors, 99) * 1e3:6.3f} ms"
+            f" max {errors.max() * 1e3:6.3f} ms"
+            f" | {port.stats['bytes_to_teensy'] / nb_setpoints:5.2f} bytes/setpoint"
+            f" | CPU {cpu_percent:5.1f} %"
+            + (
+                f" | {streamer.stats()['frames_sent']} frames"
+                if mode == "stream"
+                else ""
+            )
+        )
+        if mode == "stream":
+            stats = streamer.stats()
+            if port.trajectory["overflows"] or stats["starvations"]:
+                raise AssertionError(f"Flow control failed: {stats}, {port.trajectory}")
+            if stats["played"] != nb_setpoints:
+                raise AssertionError(f"{stats['played']} setpoints played")
+            if stats["frames_sent"] > nb_setpoints / MAX_SEGMENTS_PER_FRAME * 1.5 + 2:
+                raise AssertionError(
+                    f"Segments not packed: {stats['frames_sent']} frames"
+                )
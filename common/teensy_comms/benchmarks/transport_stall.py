@@ -0,0 +1,125 @@
+"""
+Event loop stall per command: thread transport (blocking write + busy wait on out_waiting)
+against the asyncio transport.
+
+A pseudo terminal replaces the Teensy, the other end is drained by a peer thread.
+The port's out_waiting is modelled at the configured baudrate, as the USB buffer would be.
+
+Run from the common directory:
+    python -m teensy_comms.benchmarks.transport_stall [nb_commands] [baudrate]
+"""
+
+from logger import Logger, LogLevels
+from teensy_comms import Teensy
+
+import asyncio, os, select, statistics, struct, sys, threading, time
+
+
+class BaudModelledPort:
+    """
+    Proxy over a serial port whose out_waiting drains at baudrate (10 bits per byte).
+    """
+
+    def __init__(self, port, baudrate: int) -> None:
+        self._port = port
+        self._byte_time = 10 / baudrate
+        self._busy_until = 0.0
+
+    def write(self, data: bytes) -> int:
+        now = time.perf_counter()
+        self._busy_until = max(now, self._busy_until) + len(data) * self._byte_time
+        return self._port.write(data)
+
+    @property
+    def out_waiting(self) -> int:
+        remaining = self._busy_until - time.perf_counter()
+        return int(remaining / self._byte_time) if remaining > 0 else 0
+
+    def __getattr__(self, item):
+        return getattr(self._port, item)
+
+
+def drain_peer(master_fd: int, stop: threading.Event) -> None:
+    while not stop.is_set():
+        readable, _, _ = select.select([master_fd], [], [], 0.05)
+        if readable:
+            os.read(master_fd, 65536)
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run(teensy: Teensy, nb_commands: int) -> dict:
+    stalls = []
+    lags = []
+    running = True
+
+    async def heartbeat():
+        # Measure how late the loop wakes up a 1 ms sleeper
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - start - 0.001)
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.01)
+
+    for i in range(nb_commands):
+        msg = b"\x02" + struct.pack("<H", i % 256) + struct.pack("<?", True)
+        start = time.perf_counter()
+        future = teensy.send_bytes(msg)
+        stalls.append(time.perf_counter() - start)
+        if future is not None:
+            await future
+        await asyncio.sleep(0)
+
+    running = False
+    await heartbeat_task
+
+    return {
+        "stall_median_us": statistics.median(stalls) * 1e6,
+        "stall_p99_us": percentile(stalls, 0.99) * 1e6,
+        "stall_max_us": max(stalls) * 1e6,
+        "loop_lag_max_us": max(lags) * 1e6,
+    }
+
+
+def bench(transport: str, nb_commands: int, baudrate: int, logger: Logger) -> dict:
+    master_fd, slave_fd = os.openpty()
+    stop = threading.Event()
+    peer = threading.Thread(target=drain_peer, args=(master_fd, stop), daemon=True)
+    peer.start()
+
+    teensy = Teensy(
+        logger,
+        ser=0,
+        vid=0,
+        pid=0,
+        baudrate=baudrate,
+        device=os.ttyname(slave_fd),
+        transport=transport,
+    )
+    teensy._teensy = BaudModelledPort(teensy._teensy, baudrate)
+    try:
+        return asyncio.run(run(teensy, nb_commands))
+    finally:
+        stop.set()
+        peer.join()
+
+
+if __name__ == "__main__":
+    nb_commands = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    baudrate = int(sys.argv[2]) if len(sys.argv) > 2 else 115200
+    logger = Logger(identifier="bench", print_log=False, file_log_level=LogLevels.FATAL)
+
+    print(f"{nb_commands} l_motor commands, link modelled at {baudrate} bauds")
+    for transport in ("thread", "asyncio"):
+        result = bench(transport, nb_commands, baudrate, logger)
+        print(
+            f"{transport:>8} | stall median {result['stall_median_us']:8.1f} us"
+            f" | p99 {result['stall_p99_us']:8.1f} us"
+            f" | max {result['stall_max_us']:8.1f} us"
+            f" | loop lag max {result['loop_lag_max_us']:8.1f} us"
+        )
@@ -0,0 +1,184 @@
+"""
+Unplug and replug of a board, for each transport (thread, hub, asyncio).
+
+The board is a fake firmware on a pty, the Teensy opens it through a symbolic link (as
+a /dev/serial/by-id path). It answers the HELLO (protocol 2) and sends encoder telemetry.
+* unplug: the pty is closed, the CPU used by the process while the board is away
+must stay low (no hot loop on the dead port),
+* replug: a new pty behind the same link, the Teensy must reconnect, negotiate again
+and receive the telemetry.
+
+Run from the common directory:
+    python -m teensy_comms.benchmarks.unplug_cpu [away_duration]
+"""
+
+from teensy_comms import Teensy
+from teensy_comms.hub import TeensyHub
+from teensy_comms.codec import FrameCodec, crc8_digest
+from teensy_comms.frame_decoder import FrameDecoder
+from teensy_comms.connection import ConnectionState
+from teensy_comms.reliable_link import LinkMessage, ProtocolVersion, HELLO_STRUCT
+from logger import Logger, LogLevels
+
+import asyncio, os, select, struct, sys, tempfile, threading, time
+
+END_BYTES = b"\xba\xdd\x1c\xc5"
+ENCODERS = 131
+ENCODERS_RECORD = [("time_us", "<u4"), ("left_ticks", "<i4"), ("right_ticks", "<i4")]
+MAX_CPU_PERCENT = 5.0
+
+
+class FakeBoard:
+    """
+    Firmware on the master side of a pty: HELLO answers and 200 Hz telemetry
+    """
+
+    def __init__(self, link: str) -> None:
+        # The slave stays open here too: the master reads fail when no slave is open
+        self.master, self.slave = os.openpty()
+        tmp_link = link + ".tmp"
+        os.symlink(os.ttyname(self.slave), tmp_link)
+        os.replace(tmp_link, link)
+        self.codec = FrameCodec(END_BYTES)
+        self.decoder = FrameDecoder(END_BYTES, crc=True, crc_func=crc8_digest)
+        self.hellos = 0
+        self.plugged = True
+        self._threads = [
+            threading.Thread(target=self.__reader__, daemon=True),
+            threading.Thread(target=self.__telemetry__, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __reader__(self) -> None:
+        while self.plugged:
+            # A read in progress would keep the pty open after the close
+            if not select.select([self.master], [], [], 0.05)[0]:
+                continue
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                return
+            self.decoder.feed(data)
+            for msg_type, msg in self.decoder.decode():
+                if msg_type == LinkMessage.HELLO:
+                    self.hellos += 1
+                    self._send(
+                        bytes([LinkMessage.HELLO])
+                        + HELLO_STRUCT.pack(ProtocolVersion.SEQUENCED, 8)
+                    )
+
+    def __telemetry__(self) -> None:
+        tick = 0
+        while self.plugged:
+            self._send(bytes([ENCODERS]) + struct.pack("<Iii", tick, tick, -tick))
+            tick += 1
+            time.sleep(0.005)
+
+    def _send(self, data: bytes) -> None:
+        try:
+            os.write(self.master, self.codec.encode_bytes(data))
+        except OSError:
+            pass
+
+    def unplug(self) -> None:
+        self.plugged = False
+        for thread in self._threads:
+            thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timeout")
+        time.sleep(0.01)
+
+
+def scenario(
+    teensy: Teensy, board: FakeBoard, link: str, away: float, events: list
+) -> dict:
+    """
+    Blocking part, run on a thread with the asyncio transport
+    """
+    ring = teensy.telemetry[ENCODERS]
+    wait_for(lambda: ring.frames > 10)
+
+    board.unplug()
+    wait_for(lambda: teensy.state == ConnectionState.DISCONNECTED)
+    cpu, start = time.process_time(), time.monotonic()
+    time.sleep(away)
+    cpu_percent = (time.process_time() - cpu) / (time.monotonic() - start) * 100
+
+    replugged_at = time.monotonic()
+    board = FakeBoard(link)
+    wait_for(lambda: teensy.state == ConnectionState.CONNECTED)
+    reconnect = time.monotonic() - replugged_at
+    frames = ring.frames
+    wait_for(lambda: ring.frames > frames + 10)
+    result = {
+        "cpu_percent": cpu_percent,
+        "reconnect_s": reconnect,
+        "hellos": board.hellos,
+        "protocol": teensy.protocol,
+        "events": list(events),
+    }
+    # Gone for good: the pty number is reused by the next run
+    os.remove(link)
+    board.unplug()
+    return result
+
+
+def run(transport: str, away: float, logger: Logger) -> dict:
+    link = os.path.join(tempfile.mkdtemp(), "usb-Teensyduino_USB_Serial_0-if00")
+    board = FakeBoard(link)
+    hub = TeensyHub(logger, vid=0, pid=0) if transport == "hub" else None
+    teensy = Teensy(
+        logger,
+        ser=0,
+        vid=0,
+        pid=0,
+        device=link,
+        transport="asyncio" if transport == "asyncio" else "thread",
+        protocol=ProtocolVersion.SEQUENCED,
+        hub=hub,
+    )
+    events = []
+    teensy.add_connection_callback(events.append)
+    teensy.add_telemetry(ENCODERS, ENCODERS_RECORD)
+
+    if transport != "asyncio":
+        return scenario(teensy, board, link, away, events)
+
+    async def main():
+        await teensy.connect_async()
+        return await asyncio.to_thread(scenario, teensy, board, link, away, events)
+
+    return asyncio.run(main())
+
+
+if __name__ == "__main__":
+    away = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    logger = Logger(
+        identifier="unplug", print_log=False, file_log_level=LogLevels.FATAL
+    )
+    expected_events = [
+        ConnectionState.DISCONNECTED,
+        ConnectionState.RECONNECTING,
+        ConnectionState.CONNECTED,
+    ]
+    for transport in ("thread", "hub", "asyncio"):
+        result = run(transport, away, logger)
+        print(
+            f"{transport:>7} | CPU while unplugged {result['cpu_percent']:5.2f} %"
+            f" | reconnected {result['reconnect_s'] * 1e3:6.1f} ms after the replug"
+            f" | protocol {result['protocol']:d}"
+        )
+        if result["cpu_percent"] > MAX_CPU_PERCENT:
+            raise AssertionError(f"{transport}: CPU {result['cpu_percent']:.1f} %")
+        if result["events"] != expected_events:
+            raise AssertionError(f"{transport}: events {result['events']}")
+        if result["protocol"] != ProtocolVersion.SEQUENCED or result["hellos"] < 1:
+            raise AssertionError(f"{transport}: handshake not replayed")
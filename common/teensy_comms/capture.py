@@ -0,0 +1,135 @@
+"""
+Raw serial capture file:
+
+header : MAGIC | VERSION
+record : t (float64, s since the capture start, time.monotonic) | direction (uint8) | size (uint16) | data
+size : 8 | 1 | 2 | size
+
+Chunks are stored as read / written on the port (not as frames), so a replay goes
+through the whole receive path: decoder, link, dispatch.
+"""
+
+from typing import Iterator
+from enum import IntEnum
+from teensy_comms.dummy_serial import DummySerial
+import atexit, struct, threading, time
+
+CAPTURE_MAGIC = b"TCAP"
+CAPTURE_VERSION = 1
+RECORD_STRUCT = struct.Struct("<dBH")
+MAX_CHUNK = 0xFFFF
+
+
+class CaptureDirection(IntEnum):
+    IN = 0  # teensy -> rasp
+    OUT = 1  # rasp -> teensy
+
+
+class CaptureWriter:
+    """
+    Appends every raw chunk exchanged with the Teensy to a capture file (see Teensy capture).
+    Thread safe, the file is flushed when closed (at exit at the latest).
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(CAPTURE_MAGIC + bytes([CAPTURE_VERSION]))
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self.chunks = 0
+        self.bytes = 0
+        atexit.register(self.close)
+
+    def write(self, direction: CaptureDirection, data) -> None:
+        t = time.monotonic() - self._start
+        with self._lock:
+            if self._file.closed:
+                return
+            # Longer chunks are split, they keep the same time
+            for offset in range(0, len(data), MAX_CHUNK):
+                chunk = data[offset : offset + MAX_CHUNK]
+                self._file.write(RECORD_STRUCT.pack(t, direction, len(chunk)))
+                self._file.write(chunk)
+            self.chunks += 1
+            self.bytes += len(data)
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+        atexit.unregister(self.close)
+
+
+def read_capture(path: str) -> Iterator[tuple[float, CaptureDirection, bytes]]:
+    """
+    Read a capture file
+    :return: iterator of (t, direction, data), t in seconds since the capture start
+    """
+    with open(path, "rb") as file:
+        header = file.read(len(CAPTURE_MAGIC) + 1)
+        if header[:-1] != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a Teensy capture")
+        if header[-1] != CAPTURE_VERSION:
+            raise ValueError(f"Unknown capture version {header[-1]}")
+        while True:
+            record = file.read(RECORD_STRUCT.size)
+            if len(record) < RECORD_STRUCT.size:
+                # End of the file (or capture cut during a write)
+                return
+            t, direction, size = RECORD_STRUCT.unpack(record)
+            data = file.read(size)
+            if len(data) < size:
+                return
+            yield t, CaptureDirection(direction), data
+
+
+class ReplaySerial(DummySerial):
+    """
+    DummySerial whose input is a capture file: the received chunks are given back with
+    their original timing divided by speed (speed=0: as fast as possible).
+    The sent chunks of the capture are skipped, what the Teensy object writes is kept in
+    output_buffer as with DummySerial.
+    """
+
+    live = True
+
+    def __init__(self, path: str, speed: float = 1.0, baudrate=115200) -> None:
+        """
+        :param path: capture file (see CaptureWriter)
+        :param speed: replay speed, 1 for real time, N for N times faster, 0 for no waiting
+        """
+        super().__init__(baudrate)
+        self.path = path
+        self.speed = speed
+        self.done = threading.Event()
+        self.chunks = 0
+        self.bytes = 0
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self.__replay__, name="TeensyReplay", daemon=True
+            )
+            self._thread.start()
+
+    def __replay__(self) -> None:
+        start = time.monotonic()
+        for t, direction, data in read_capture(self.path):
+            if direction != CaptureDirection.IN:
+                continue
+            if self.speed > 0:
+                delay = start + t / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            self.dummy_add_input(data)
+            self.chunks += 1
+            self.bytes += len(data)
+        self.done.set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Wait for the end of the capture
+        """
+        return self.done.wait(timeout)
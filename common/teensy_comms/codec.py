@@ -0,0 +1,92 @@
+import struct
+
+
+def _build_crc8_table(polynomial: int = 0x07) -> tuple:
+    """
+    CRC8 lookup table (same polynomial as the crc8 package and the Teensy com library)
+    """
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ polynomial) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return tuple(table)
+
+
+CRC8_TABLE = _build_crc8_table()
+
+
+def crc8_digest(data) -> int:
+    """
+    CRC8 of any bytes-like object (bytes, bytearray, memoryview), without copy
+    """
+    table = CRC8_TABLE
+    crc = 0
+    for byte in data:
+        crc = table[crc ^ byte]
+    return crc
+
+
+class FrameCodec:
+    """
+    Encodes the frames sent to the Teensy:
+
+    msg_type | msg_data | msg_length | CRC8 | MSG_END_BYTES
+    size : 1 | msg_length | 1 | 1 | 4
+
+    Each command is registered once with its struct format, its frame is then preallocated
+    and only the values, the CRC8 are written at each encode (struct.pack_into).
+    * encode() returns the preallocated frame itself: it is overwritten by the next encode
+    of the same command, the transports copy it before returning.
+    """
+
+    def __init__(self, end_bytes: bytes, crc: bool = True) -> None:
+        self.end_bytes = bytes(end_bytes)
+        self.crc = crc
+        # Bytes after msg_type | msg_data
+        self.trailer_size = 1 + (1 if crc else 0) + len(self.end_bytes)
+        # msg_type -> (struct, preallocated frame, view on the CRC8 covered bytes, msg_type + msg_data size)
+        self._commands = {}
+
+    def register(self, msg_type: int, fmt: str = "") -> None:
+        """
+        Register a command and its msg_data layout
+        :param msg_type: id of the command
+        :param fmt: struct format of msg_data, without byte order (little endian is forced)
+        """
+        command_struct = struct.Struct("<B" + fmt)
+        size = command_struct.size
+        if size > 255:
+            raise ValueError(f"Command [{msg_type}] is too long ({size} bytes)")
+        frame = bytearray(size + self.trailer_size)
+        frame[size] = size
+        frame[-len(self.end_bytes) :] = self.end_bytes
+        self._commands[msg_type] = (
+            command_struct,
+            frame,
+            memoryview(frame)[: size + 1],
+            size,
+        )
+
+    def is_registered(self, msg_type: int) -> bool:
+        return msg_type in self._commands
+
+    def encode(self, msg_type: int, *values) -> bytearray:
+        """
+        Encode a registered command in its preallocated frame
+        """
+        command_struct, frame, crc_view, size = self._commands[msg_type]
+        command_struct.pack_into(frame, 0, msg_type, *values)
+        if self.crc:
+            frame[size + 1] = crc8_digest(crc_view)
+        return frame
+
+    def encode_bytes(self, data: bytes) -> bytes:
+        """
+        Encode an already packed msg_type | msg_data
+        """
+        msg = bytes(data) + bytes([len(data)])
+        if self.crc:
+            msg += bytes([crc8_digest(msg)])
+        return msg + self.end_bytes
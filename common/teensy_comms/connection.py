@@ -0,0 +1,48 @@
+from enum import Enum
+import random
+
+
+class ConnectionState(str, Enum):
+    """
+    CONNECTED -> DISCONNECTED (port lost) -> RECONNECTING (port opened again, protocol
+    negotiation) -> CONNECTED
+    """
+
+    CONNECTED = "connected"
+    DISCONNECTED = "disconnected"
+    RECONNECTING = "reconnecting"
+
+
+class Backoff:
+    """
+    Exponential delays between two reconnection attempts, with some jitter so that
+    several boards do not retry at the same time
+    """
+
+    def __init__(
+        self,
+        initial: float = 0.05,
+        maximum: float = 1.0,
+        factor: float = 2.0,
+        jitter: float = 0.1,
+    ) -> None:
+        """
+        :param initial: first delay, in seconds
+        :param maximum: the delays stop growing there
+        :param factor: ratio between two delays
+        :param jitter: random part of each delay (0.1 -> +/-10 %)
+        """
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.attempts = 0
+
+    def next(self) -> float:
+        # Bounded exponent: no float overflow however long the board stays unplugged
+        delay = min(self.maximum, self.initial * self.factor ** min(self.attempts, 64))
+        self.attempts += 1
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def reset(self) -> None:
+        self.attempts = 0
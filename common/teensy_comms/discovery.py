@@ -0,0 +1,140 @@
+import json, os, threading
+import serial.tools.list_ports
+
+BY_ID_DIR = "/dev/serial/by-id"
+
+
+def scan_ports(vid: int, pid: int, by_id_dir: str = BY_ID_DIR) -> dict[int, str]:
+    """
+    Walk the comports once
+    :return: serial number -> device path, the udev /dev/serial/by-id link when there is
+    one (stable across reboots and replugs), the /dev/tty* path otherwise
+    """
+    by_id = {}
+    if os.path.isdir(by_id_dir):
+        for name in os.listdir(by_id_dir):
+            link = os.path.join(by_id_dir, name)
+            by_id[os.path.realpath(link)] = link
+
+    ports = {}
+    for port in serial.tools.list_ports.comports():
+        if (
+            port.vid == vid
+            and port.pid == pid
+            and port.serial_number is not None
+            and port.serial_number.isdigit()
+        ):
+            device = os.path.realpath(port.device)
+            ports[int(port.serial_number)] = by_id.get(device, port.device)
+    return ports
+
+
+class DeviceCache:
+    """
+    Persistent serial number -> device path map, so the boot does not walk the comports
+    for every board:
+    * device gives the cached path if it still exists, without any scan,
+    * on a miss, one scan (scan_ports) refreshes every board and the file is rewritten.
+
+    Only the /dev/serial/by-id links are trusted without a scan: their name holds the
+    serial number, while a /dev/tty* path (no udev link) can be another board after a
+    replug. Those are kept for this process but never written in the file.
+
+    Exemple:
+    ```py
+    cache = DeviceCache("~/.cache/robot/teensy_devices.json", vid, pid)
+    device = cache.device(12675800)
+    ```
+    """
+
+    def __init__(
+        self, path: str, vid: int, pid: int, by_id_dir: str = BY_ID_DIR
+    ) -> None:
+        """
+        :param path: JSON file of the cache, created on the first scan
+        :param vid: USB vendor id of the boards
+        :param pid: USB product id of the boards
+        :param by_id_dir: directory of the udev stable links
+        """
+        self.path = os.path.expanduser(path)
+        self.vid = vid
+        self.pid = pid
+        self.by_id_dir = by_id_dir
+        self._lock = threading.RLock()
+        self.devices = self._load()
+        self.hits = 0
+        self.scans = 0
+
+    def _load(self) -> dict[int, str]:
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        # Written for other ids, e.g. after a config change
+        if data.get("vid") != self.vid or data.get("pid") != self.pid:
+            return {}
+        return {
+            int(ser): device
+            for ser, device in data["devices"].items()
+            if self._stable(device)
+        }
+
+    def _stable(self, device: str) -> bool:
+        # A udev link, bound to the serial number of its board
+        return os.path.dirname(device) == self.by_id_dir
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(
+                {
+                    "vid": self.vid,
+                    "pid": self.pid,
+                    "devices": {
+                        str(ser): dev
+                        for ser, dev in self.devices.items()
+                        if self._stable(dev)
+                    },
+                },
+                file,
+                indent=2,
+            )
+        # Never a half written cache, even if the robot is switched off now
+        os.replace(tmp_path, self.path)
+
+    def device(self, ser: int) -> str | None:
+        """
+        :return: device path of the board, None if it is not plugged
+        """
+        with self._lock:
+            device = self.devices.get(ser)
+            if device is not None and self._stable(device) and os.path.exists(device):
+                self.hits += 1
+                return device
+            self.rescan()
+            return self.devices.get(ser)
+
+    def rescan(self) -> dict[int, str]:
+        """
+        Walk the comports and rewrite the cache (on a miss, or a device which cannot be opened)
+        """
+        with self._lock:
+            self.scans += 1
+            devices = scan_ports(self.vid, self.pid, self.by_id_dir)
+            if devices != self.devices:
+                self.devices = devices
+                try:
+                    self._save()
+                except OSError:
+                    # Read only file system: the cache only lives in this process
+                    pass
+            return self.devices
+
+    def forget(self, ser: int) -> None:
+        """
+        Drop a cached path which could not be opened, the next find scans again
+        """
+        with self._lock:
+            self.devices.pop(ser, None)
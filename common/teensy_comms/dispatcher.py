@@ -0,0 +1,269 @@
+from typing import Callable
+from collections import deque
+from enum import Enum
+from logger import Logger, LogLevels
+import asyncio, threading, time
+
+
+class QueuePolicy(str, Enum):
+    DROP_OLDEST = (
+        "drop_oldest"  # The oldest waiting message is dropped (telemetry, prints)
+    )
+    BLOCK = "block"  # The reader waits for room in the queue (no message is lost)
+
+
+class _MessageQueue:
+    __slots__ = (
+        "items",
+        "size",
+        "policy",
+        "scheduled",
+        "max_depth",
+        "enqueued",
+        "handled",
+        "dropped",
+        "errors",
+        "handler_time",
+        "handler_max",
+        "wait_max",
+    )
+
+    def __init__(self, size: int, policy: QueuePolicy) -> None:
+        self.items = deque()  # (enqueue ts, msg_data)
+        self.size = size
+        self.policy = policy
+        self.scheduled = False  # In the ready queue or being handled
+        self.max_depth = 0
+        self.enqueued = 0
+        self.handled = 0
+        self.dropped = 0
+        self.errors = 0
+        self.handler_time = 0.0
+        self.handler_max = 0.0
+        self.wait_max = 0.0
+
+
+class Dispatcher:
+    """
+    Runs the Teensy message handlers out of the reader, so a slow or failing handler never
+    stops the serial reads.
+
+    Each message type has its own bounded queue, when it is full the policy of the type
+    decides: drop the oldest message or make the reader wait.
+    The queues are drained by a small pool of worker threads (thread transport), by the
+    event loop (asyncio transport, see attach_loop) or by a pool shared between boards
+    (TeensyHub, see attach_executor). The messages of one type are always
+    handled in order, by one worker at a time.
+    """
+
+    def __init__(
+        self,
+        resolve: Callable[[int], Callable[[bytes], None]],
+        logger: Logger,
+        workers: int = 1,
+        queue_size: int = 64,
+        policy: QueuePolicy = QueuePolicy.DROP_OLDEST,
+        batch_size: int = 8,
+    ) -> None:
+        """
+        :param resolve: returns the handler of a message type (read at each call, so the
+        handlers can be replaced at any time)
+        :param logger: logger used for the handler errors
+        :param workers: number of worker threads (see start)
+        :param queue_size: default size of the queue of each message type
+        :param policy: default policy of each message type
+        :param batch_size: messages of one type handled before giving the turn to the others
+        """
+        if workers < 1:
+            raise ValueError("At least one dispatch worker is needed")
+        self._resolve = resolve
+        self.logger = logger
+        self.workers = workers
+        self.queue_size = queue_size
+        self.policy = QueuePolicy(policy)
+        self.batch_size = batch_size
+
+        self._queues = {}  # msg_type -> _MessageQueue
+        self._ready = deque()  # msg_types with waiting messages, not being handled
+        self._cond = threading.Condition()
+        self._threads = []
+        # Schedules a call (fn, *args) out of the reader, None for the own workers
+        self._submit = None
+        # The reader also runs the handlers (event loop): BLOCK cannot wait
+        self._inline_block = False
+
+    def configure(
+        self,
+        msg_type: int,
+        queue_size: int | None = None,
+        policy: QueuePolicy | None = None,
+    ) -> None:
+        """
+        Set the queue size and the policy of a message type (defaults if None)
+        """
+        with self._cond:
+            queue = self._get_queue(msg_type)
+            if queue_size is not None:
+                queue.size = queue_size
+            if policy is not None:
+                queue.policy = QueuePolicy(policy)
+
+    def _get_queue(self, msg_type: int) -> _MessageQueue:
+        queue = self._queues.get(msg_type)
+        if queue is None:
+            queue = _MessageQueue(self.queue_size, self.policy)
+            self._queues[msg_type] = queue
+        return queue
+
+    #############
+    # Draining  #
+    #############
+    def start(self) -> None:
+        """
+        Start the worker threads (thread transport)
+        """
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self.__worker__, name=f"TeensyDispatch-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Drain the queues with the event loop (asyncio transport) instead of the workers
+        """
+        self._submit = loop.call_soon_threadsafe
+        self._inline_block = True
+
+    def attach_executor(self, submit: Callable[..., None]) -> None:
+        """
+        Drain the queues with an external pool instead of the workers
+        :param submit: schedules a call, submit(fn, *args), on a thread other than the reader
+        """
+        self._submit = submit
+        self._inline_block = False
+
+    def __worker__(self) -> None:
+        while True:
+            with self._cond:
+                while not self._ready:
+                    self._cond.wait()
+                msg_type = self._ready.popleft()
+            self._drain(msg_type, self.batch_size)
+
+    def _drain(self, msg_type: int, budget: int | None = None) -> None:
+        """
+        Handle up to budget waiting messages of a type (all of them if None), the type is
+        then scheduled again if messages are left, so the types are handled in turn
+        """
+        queue = self._queues[msg_type]
+        handled = 0
+        while budget is None or handled < budget:
+            with self._cond:
+                if not queue.items:
+                    queue.scheduled = False
+                    return
+                enqueued_at, msg = queue.items.popleft()
+                # Room for a blocked reader
+                self._cond.notify_all()
+            self._call(msg_type, queue, enqueued_at, msg)
+            handled += 1
+
+        with self._cond:
+            if not queue.items:
+                queue.scheduled = False
+                return
+            if self._submit is None:
+                self._ready.append(msg_type)
+                self._cond.notify_all()
+                return
+        self._submit(self._drain, msg_type, self.batch_size)
+
+    def _call(
+        self, msg_type: int, queue: _MessageQueue, enqueued_at: float, msg: bytes
+    ) -> None:
+        start = time.perf_counter()
+        try:
+            self._resolve(msg_type)(msg)
+        except Exception as e:
+            queue.errors += 1
+            self.logger.log(
+                f"Received message handling crashed [{msg_type}] :\n" + str(e),
+                LogLevels.ERROR,
+            )
+        end = time.perf_counter()
+        queue.handled += 1
+        queue.handler_time += end - start
+        queue.handler_max = max(queue.handler_max, end - start)
+        queue.wait_max = max(queue.wait_max, start - enqueued_at)
+
+    ###########
+    # Reader  #
+    ###########
+    def put(self, msg_type: int, msg: bytes) -> None:
+        """
+        Queue a message for its handler, called by the reader.
+        With the BLOCK policy it waits until the queue has room; on the event loop
+        (reader and handlers on the same thread) the waiting messages are handled first.
+        """
+        with self._cond:
+            queue = self._get_queue(msg_type)
+            if len(queue.items) >= queue.size:
+                if queue.policy == QueuePolicy.DROP_OLDEST:
+                    queue.items.popleft()
+                    queue.dropped += 1
+                elif not self._inline_block:
+                    while len(queue.items) >= queue.size:
+                        self._cond.wait()
+            if len(queue.items) >= queue.size:
+                run_inline = True
+            else:
+                run_inline = False
+                queue.items.append((time.perf_counter(), msg))
+                queue.enqueued += 1
+                queue.max_depth = max(queue.max_depth, len(queue.items))
+                if queue.scheduled:
+                    return
+                queue.scheduled = True
+                if self._submit is None:
+                    self._ready.append(msg_type)
+                    self._cond.notify_all()
+                    return
+
+        if run_inline:
+            # BLOCK policy on the event loop
+            self._drain(msg_type)
+            return self.put(msg_type, msg)
+        self._submit(self._drain, msg_type, self.batch_size)
+
+    ##############
+    # Statistics #
+    ##############
+    def stats(self) -> dict:
+        """
+        Queue depth and handler latency of each message type (times in ms)
+        """
+        with self._cond:
+            return {
+                msg_type: {
+                    "depth": len(queue.items),
+                    "max_depth": queue.max_depth,
+                    "size": queue.size,
+                    "policy": queue.policy.value,
+                    "enqueued": queue.enqueued,
+                    "handled": queue.handled,
+                    "dropped": queue.dropped,
+                    "errors": queue.errors,
+                    "handler_avg_ms": (
+                        queue.handler_time / queue.handled * 1e3
+                        if queue.handled
+                        else 0.0
+                    ),
+                    "handler_max_ms": queue.handler_max * 1e3,
+                    "wait_max_ms": queue.wait_max * 1e3,
+                }
+                for msg_type, queue in self._queues.items()
+            }
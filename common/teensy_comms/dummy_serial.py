@@ -1,24 +1,104 @@
+from typing import Callable
+import threading
+
+# Newest written bytes kept in output_buffer, the older ones are dropped
+OUTPUT_BUFFER_SIZE = 64 * 1024
+
+
 class DummySerial:
+    """
+    Serial port without device: the written bytes are kept in output_buffer (the newest
+    OUTPUT_BUFFER_SIZE ones) and the bytes given to dummy_add_input are read back with the
+    pyserial reading API (read, readinto, read_until, in_waiting), so the Teensy receiver
+    can run on it.
+    * The reads block until data is there (timeout=None), as a pyserial port.
+    * set_on_input is used by the asyncio transport (no file descriptor to watch).
+    """
+
+    # True for the subclasses which feed the input (the Teensy receiver is then started)
+    live = False
+
     def __init__(self, baudrate=115200):
-        self.output_buffer = b""
-        self.input_buffer = b""
+        self.output_buffer = bytearray()
+        self.input_buffer = bytearray()
         self.baudrate = baudrate
-        self.out_waiting = False
+        self.timeout = None
+        self._input_ready = threading.Condition()
+        self._on_input = None
+
+    @property
+    def out_waiting(self) -> int:
+        return 0
 
     def write(self, data):
-        self.out_waiting = True
         self.output_buffer += data
-        # time.sleep(len(data)/self.baudrate)
-        self.out_waiting = False
+        overflow = len(self.output_buffer) - OUTPUT_BUFFER_SIZE
+        if overflow > 0:
+            del self.output_buffer[:overflow]
+        return len(data)
 
     def reset_output_buffer(self):
-        self.output_buffer = b""
+        self.output_buffer.clear()
+
+    ###########
+    # Reading #
+    ###########
+    @property
+    def in_waiting(self) -> int:
+        return len(self.input_buffer)
+
+    def _wait_input(self) -> bool:
+        # Lock held by the caller
+        return self._input_ready.wait_for(lambda: self.input_buffer, self.timeout)
+
+    def read(self, size=1) -> bytes:
+        with self._input_ready:
+            if not self._wait_input():
+                return b""
+            data = bytes(self.input_buffer[:size])
+            del self.input_buffer[:size]
+            return data
+
+    def readinto(self, buffer) -> int:
+        with self._input_ready:
+            if not self._wait_input():
+                return 0
+            size = min(len(buffer), len(self.input_buffer))
+            buffer[:size] = self.input_buffer[:size]
+            del self.input_buffer[:size]
+            return size
 
     def read_until(self, signature):
-        return self.input_buffer.split(signature)[0]
+        with self._input_ready:
+            self._input_ready.wait_for(
+                lambda: signature in self.input_buffer, self.timeout
+            )
+            end = self.input_buffer.find(signature)
+            end = len(self.input_buffer) if end < 0 else end + len(signature)
+            data = bytes(self.input_buffer[:end])
+            del self.input_buffer[:end]
+            return data
 
     def dummy_add_input(self, data):
-        self.input_buffer += data
+        on_input = self._on_input
+        if on_input is not None:
+            on_input(bytes(data))
+            return
+        with self._input_ready:
+            self.input_buffer += data
+            self._input_ready.notify_all()
+
+    def set_on_input(self, on_input: Callable[[bytes], None] | None) -> None:
+        """
+        Give the next inputs to on_input instead of buffering them
+        """
+        with self._input_ready:
+            self._on_input = on_input
+            if on_input is not None and self.input_buffer:
+                data = bytes(self.input_buffer)
+                self.input_buffer.clear()
+                on_input(data)
 
     def reset_input_buffer(self):
-        self.input_buffer = b""
+        with self._input_ready:
+            self.input_buffer.clear()
@@ -0,0 +1,164 @@
+from typing import Callable, Iterator
+from enum import IntEnum
+
+
+class FrameError(IntEnum):
+    CRC = 0  # CRC8 does not match
+    LENGTH = 1  # Declared length does not fit in the received bytes
+    OVERFLOW = 2  # No end bytes found in a full buffer
+
+
+class FrameDecoder:
+    """
+    Streaming decoder of the Teensy frames:
+
+    msg_type | msg_data | msg_length | CRC8 | MSG_END_BYTES
+    size : 1 | msg_length | 1 | 1 | 4
+
+    * Bytes are read by big chunks in a preallocated bytearray (feed() or readinto()).
+    * decode() yields every complete frame as (msg_type, payload) where payload is a
+    memoryview on the internal buffer: no copy is made, but the view is only valid until the
+    next feed/readinto. Use bytes(payload) to keep it.
+    * The declared length locates the start of each frame from its end bytes, so garbage
+    received between two frames is skipped without losing the next valid frame.
+    """
+
+    def __init__(
+        self,
+        end_bytes: bytes,
+        crc: bool = True,
+        crc_func: Callable[[memoryview], int] | None = None,
+        on_error: Callable[[FrameError, memoryview], None] | None = None,
+        capacity: int = 65536,
+    ) -> None:
+        """
+        :param end_bytes: signature ending every frame
+        :param crc: are the frames protected by a CRC8 byte
+        :param crc_func: computes the CRC8 of msg_type | msg_data | msg_length
+        :param on_error: called with the error type and the rejected bytes
+        :param capacity: size of the buffer, must hold at least one full frame
+        """
+        if crc and crc_func is None:
+            raise ValueError("crc_func is required when crc is enabled")
+        self.end_bytes = bytes(end_bytes)
+        self.crc = crc
+        self._crc_func = crc_func
+        self._on_error = on_error
+        # Bytes after the payload: msg_length (+ CRC8)
+        self._trailer = 2 if crc else 1
+
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # First byte not decoded yet
+        self._end = 0  # First free byte
+
+        self.frames = 0
+        self.skipped_bytes = 0
+        self.errors = 0
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of bytes received but not yet part of a complete frame
+        """
+        return self._end - self._start
+
+    def reset(self) -> None:
+        self._start = 0
+        self._end = 0
+
+    def _make_room(self, size: int) -> None:
+        """
+        Move the undecoded bytes at the beginning of the buffer if less than size bytes are free
+        """
+        if len(self._buffer) - self._end >= size:
+            return
+        pending = self._end - self._start
+        if pending and self._start:
+            self._view[:pending] = self._view[self._start : self._end]
+        self._start = 0
+        self._end = pending
+        if len(self._buffer) - self._end < size:
+            # The buffer is full without any end bytes, drop what is left
+            self._error(FrameError.OVERFLOW, self._view[: self._end])
+            self._end = 0
+
+    def writable(self, size: int = 4096) -> memoryview:
+        """
+        Free part of the buffer (at least size bytes) to read into, call commit() after
+        """
+        self._make_room(size)
+        return self._view[self._end :]
+
+    def commit(self, nb_bytes: int) -> None:
+        self._end += nb_bytes
+
+    def feed(self, data: bytes) -> None:
+        """
+        Copy a received chunk into the buffer
+        """
+        size = len(data)
+        if size > len(self._buffer):
+            raise ValueError("Chunk bigger than the decoder buffer")
+        self._make_room(size)
+        self._view[self._end : self._end + size] = data
+        self._end += size
+
+    def readinto(self, port, size: int = 4096) -> int:
+        """
+        Read directly in the buffer from any object with a readinto method (pyserial, file, socket...)
+        """
+        nb_bytes = port.readinto(self.writable(size)[:size]) or 0
+        self._end += nb_bytes
+        return nb_bytes
+
+    def tail(self, nb_bytes: int) -> memoryview:
+        """
+        The nb_bytes last bytes fed or read, until the next decode
+        """
+        return self._view[self._end - nb_bytes : self._end]
+
+    def _error(self, error: FrameError, data: memoryview) -> None:
+        self.errors += 1
+        if self._on_error is not None:
+            self._on_error(error, data)
+
+    def decode(self) -> Iterator[tuple[int, memoryview]]:
+        """
+        Yield every complete frame of the buffer as (msg_type, payload)
+        """
+        buffer = self._buffer
+        view = self._view
+        end_bytes = self.end_bytes
+        trailer = self._trailer
+
+        while True:
+            position = buffer.find(end_bytes, self._start, self._end)
+            if position == -1:
+                return
+            segment_start = self._start
+            self._start = position + len(end_bytes)
+
+            length_index = position - trailer
+            if length_index <= segment_start:
+                self._error(FrameError.LENGTH, view[segment_start:position])
+                continue
+
+            length = buffer[length_index]
+            frame_start = length_index - length
+            if length == 0 or frame_start < segment_start:
+                self._error(FrameError.LENGTH, view[segment_start:position])
+                continue
+
+            if (
+                self.crc
+                and self._crc_func(view[frame_start : position - 1])
+                != buffer[position - 1]
+            ):
+                self._error(FrameError.CRC, view[frame_start:position])
+                continue
+
+            # Garbage before the frame (resynchronisation)
+            self.skipped_bytes += frame_start - segment_start
+            self.frames += 1
+            yield buffer[frame_start], view[frame_start + 1 : length_index]
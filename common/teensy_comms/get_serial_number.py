@@ -1,4 +1,6 @@
 import serial.tools.list_ports
+from teensy_comms.discovery import scan_ports, BY_ID_DIR
+import os, sys
 
 
 def find_usb_devices():
@@ -6,32 +8,49 @@ def find_usb_devices():
     usb_devices = []
     for device in devices:
         if "USB" in device.description:  # Filtrer les périphériques USB
-            usb_devices.append(device.device)
+            usb_devices.append(device)
     return usb_devices
 
 
 def get_serial_number(port):
-    try:
-        with serial.Serial(port) as ser:
-            ser.write(b"s")  # Envoyer une commande pour demander le numéro de série
-            return ser.readline().strip().decode()
-    except serial.SerialException as e:
-        print("Erreur lors de la communication avec le périphérique:", e)
-        return None
+    """
+    Numéro de série lu dans le descripteur USB (udev), sans ouvrir le périphérique
+    """
+    return port.serial_number
+
+
+def get_stable_path(port):
+    """
+    Lien /dev/serial/by-id du périphérique (ne change pas entre deux démarrages)
+    """
+    if os.path.isdir(BY_ID_DIR):
+        for name in os.listdir(BY_ID_DIR):
+            link = os.path.join(BY_ID_DIR, name)
+            if os.path.realpath(link) == os.path.realpath(port.device):
+                return link
+    return None
 
 
 if __name__ == "__main__":
+    # python -m teensy_comms.get_serial_number [vid pid] : n'affiche que ces cartes
+    if len(sys.argv) > 2:
+        for ser, device in scan_ports(int(sys.argv[1], 0), int(sys.argv[2], 0)).items():
+            print("Numéro de série:", ser, "->", device)
+        sys.exit()
+
     usb_devices = find_usb_devices()
     if usb_devices:
         print("Numéro de série des périphériques USB:")
         for device in usb_devices:
             serial_number = get_serial_number(device)
+            print("Port:", device.device)
             if serial_number:
-                print("Port:", device)
                 print("Numéro de série:", serial_number)
             else:
-                print("Port:", device)
                 print("Impossible de récupérer le numéro de série.")
+            stable_path = get_stable_path(device)
+            if stable_path:
+                print("Chemin stable:", stable_path)
             print()
     else:
         print("Aucun périphérique USB trouvé.")
@@ -0,0 +1,189 @@
+from typing import Callable
+from collections import deque
+from logger import Logger, LogLevels
+from teensy_comms.discovery import DeviceCache, scan_ports
+import os, selectors, threading, time
+
+
+class TeensyHub:
+    """
+    Serves every Teensy of the robot with a fixed number of threads:
+    * the USB ports are enumerated once, serial number -> device (see device), or not at
+    all when the discovery cache knows the boards (see DeviceCache),
+    * one reader thread multiplexes the file descriptors of all the boards (selectors,
+    epoll on Linux) and gives the received bytes to the right Teensy; it also drives the
+    retransmissions of the boards using the sequenced protocol (select timeout),
+    * a small pool of workers, shared by the boards, runs the message handlers.
+
+    Exemple:
+    ```py
+    hub = TeensyHub(logger, vid=CONFIG.TEENSY_VID, pid=CONFIG.TEENSY_PID)
+    pipou = Pipou(logger, hub=hub)
+    ```
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        vid: int,
+        pid: int,
+        dispatch_workers: int = 2,
+        discovery_cache: str | None = None,
+    ) -> None:
+        """
+        :param vid: USB vendor id of the boards
+        :param pid: USB product id of the boards
+        :param dispatch_workers: number of threads running the handlers of all the boards
+        :param discovery_cache: JSON file of the DeviceCache, None to always enumerate
+        """
+        self.logger = logger
+        self.vid = vid
+        self.pid = pid
+        self._cache = None
+        if discovery_cache is not None:
+            self._cache = DeviceCache(discovery_cache, vid, pid)
+            self.ports = self._cache.devices  # serial number -> device path
+        else:
+            self.enumerate()
+
+        self._selector = selectors.DefaultSelector()
+        self._boards = {}  # Teensy -> file descriptor
+        self._lock = threading.Lock()
+        # Wakes the reader up when a board is added or has a new retransmit deadline
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_read, False)
+        os.set_blocking(self._wakeup_write, False)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ, None)
+        self._reader = None
+
+        self._tasks = deque()
+        self._tasks_ready = threading.Condition()
+        self._workers = [
+            threading.Thread(
+                target=self.__worker__, name=f"TeensyHubDispatch-{i}", daemon=True
+            )
+            for i in range(dispatch_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        self.wakeups = 0  # Returns of select, whatever the number of boards
+
+    ###############
+    # Enumeration #
+    ###############
+    def enumerate(self) -> dict:
+        """
+        Scan the USB ports (once at creation, again only if asked)
+        :return: serial number -> device path
+        """
+        if self._cache is not None:
+            self.ports = self._cache.rescan()
+        else:
+            self.ports = scan_ports(self.vid, self.pid)
+        return self.ports
+
+    def device(self, ser: int) -> str | None:
+        if self._cache is not None:
+            device = self._cache.device(ser)
+            self.ports = self._cache.devices
+            return device
+        if ser not in self.ports:
+            # Plugged after the boot, or back on another port
+            self.enumerate()
+        return self.ports.get(ser)
+
+    def forget(self, ser: int) -> None:
+        """
+        The device of this board could not be opened, look for it again next time
+        """
+        if self._cache is not None:
+            self._cache.forget(ser)
+        self.ports.pop(ser, None)
+
+    ##########
+    # Boards #
+    ##########
+    def attach(self, teensy) -> None:
+        """
+        Read this Teensy with the hub thread (called by Teensy when created with hub=)
+        """
+        with self._lock:
+            fd = teensy._teensy.fileno()
+            self._selector.register(fd, selectors.EVENT_READ, teensy)
+            self._boards[teensy] = fd
+            if self._reader is None:
+                self._reader = threading.Thread(
+                    target=self.__reader__, name="TeensyHubReader", daemon=True
+                )
+                self._reader.start()
+        self.wakeup()
+
+    def detach(self, teensy) -> None:
+        with self._lock:
+            fd = self._boards.pop(teensy, None)
+            if fd is not None:
+                self._selector.unregister(fd)
+        self.wakeup()
+
+    def wakeup(self) -> None:
+        try:
+            os.write(self._wakeup_write, b"\x00")
+        except BlockingIOError:
+            # Already woken up
+            pass
+
+    def __reader__(self) -> None:
+        timeout = None
+        while True:
+            events = self._selector.select(timeout)
+            self.wakeups += 1
+            for key, _ in events:
+                teensy = key.data
+                if teensy is None:
+                    try:
+                        os.read(self._wakeup_read, 4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                try:
+                    if not teensy._read_available():
+                        raise OSError("no data on a readable port")
+                except Exception as e:
+                    # The Teensy detaches itself and comes back once reopened
+                    self.detach(teensy)
+                    teensy._on_port_lost(e)
+
+            # Retransmissions of the sequenced frames, the earliest deadline is the timeout
+            with self._lock:
+                boards = list(self._boards)
+            deadlines = [
+                deadline
+                for deadline in (teensy._link.poll() for teensy in boards)
+                if deadline is not None
+            ]
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+
+    ############
+    # Dispatch #
+    ############
+    def submit(self, function: Callable, *args) -> None:
+        """
+        Run function(*args) on a worker (Dispatcher executor of the boards)
+        """
+        with self._tasks_ready:
+            self._tasks.append((function, args))
+            # Wake a worker right away, even from the reader: a BLOCK queue makes the
+            # reader wait (Dispatcher.put) for a worker to drain it
+            self._tasks_ready.notify()
+
+    def __worker__(self) -> None:
+        while True:
+            with self._tasks_ready:
+                while not self._tasks:
+                    self._tasks_ready.wait()
+                function, args = self._tasks.popleft()
+            try:
+                function(*args)
+            except Exception as e:
+                self.logger.log(f"Teensy hub task crashed : {e}", LogLevels.ERROR)
@@ -0,0 +1,169 @@
+from teensy_comms.capture import CaptureDirection
+import bisect, threading, time
+
+# Upper bounds of the RTT histogram bins: 10 us to ~2.6 s, 4 bins per octave
+RTT_BOUNDS = [10e-6 * 2 ** (k / 4) for k in range(73)]
+
+
+class RttHistogram:
+    """
+    Fixed log-spaced bins, adding a sample is a bisect and an increment (no allocation),
+    the percentiles are read from the cumulative counts (resolution: 19 % of the value)
+    """
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(RTT_BOUNDS) + 1)  # Last bin: above the bounds
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, rtt: float) -> None:
+        self.counts[bisect.bisect_left(RTT_BOUNDS, rtt)] += 1
+        self.count += 1
+        self.total += rtt
+        if rtt > self.max:
+            self.max = rtt
+
+    def percentile(self, percent: float) -> float | None:
+        """
+        :return: upper bound of the bin holding this percentile (at most the maximum), in seconds
+        """
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        cumulated = 0
+        for index, count in enumerate(self.counts):
+            cumulated += count
+            if count and cumulated >= rank:
+                if index < len(RTT_BOUNDS):
+                    return min(RTT_BOUNDS[index], self.max)
+                return self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        to_ms = lambda value: None if value is None else value * 1e3
+        return {
+            "count": self.count,
+            "mean_ms": to_ms(self.total / self.count) if self.count else None,
+            "p50_ms": to_ms(self.percentile(50)),
+            "p90_ms": to_ms(self.percentile(90)),
+            "p99_ms": to_ms(self.percentile(99)),
+            "max_ms": to_ms(self.max) if self.count else None,
+            # [upper bound in ms (null: above the last bound), count], non empty bins
+            "bins": [
+                [
+                    to_ms(RTT_BOUNDS[index]) if index < len(RTT_BOUNDS) else None,
+                    count,
+                ]
+                for index, count in enumerate(self.counts)
+                if count
+            ],
+        }
+
+
+class LinkMetrics:
+    """
+    Counters of the serial link of a Teensy, updated inline by the send and receive paths
+    through the record_* methods, under a lock: the frames out are counted from the
+    callers, the retransmit thread and the dispatcher workers, the errors and RTTs from
+    the decoder callbacks.
+    * frames and bytes per message type, in each direction (CaptureDirection), the bytes
+    include the framing; a sequenced frame is counted with the type it carries,
+    * CRC and length errors, NACKs sent and received, legacy resends,
+    * command -> ACK round trip times (protocol 2, see ReliableLink), in a RttHistogram.
+    snapshot() gives all of it as a JSON serializable dict, with the rates since the
+    previous snapshot and the use of the line (bytes/s over baudrate / 10).
+    """
+
+    def __init__(self, baudrate: int = 115200) -> None:
+        """
+        :param baudrate: of the port, to compute the line usage
+        """
+        self.baudrate = baudrate
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def _reset(self) -> None:
+        # [direction][msg_type]
+        self.frames = [[0] * 256 for _ in CaptureDirection]
+        self.bytes = [[0] * 256 for _ in CaptureDirection]
+        self.crc_errors = 0
+        self.length_errors = 0
+        self.nacks_sent = 0
+        self.nacks_received = 0
+        self.resends = 0  # Legacy protocol: last message sent again after a NACK
+        self.rtt = RttHistogram()
+        self._last_snapshot = (time.monotonic(), 0, 0)
+
+    def record(self, direction: CaptureDirection, msg_type: int, size: int) -> None:
+        with self._lock:
+            self.frames[direction][msg_type] += 1
+            self.bytes[direction][msg_type] += size
+
+    def record_event(self, counter: str) -> None:
+        """
+        :param counter: crc_errors, length_errors, nacks_sent, nacks_received or resends
+        """
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_rtt(self, rtt: float) -> None:
+        with self._lock:
+            self.rtt.add(rtt)
+
+    def snapshot(self, link=None) -> dict:
+        """
+        :param link: ReliableLink of the Teensy, for its retransmission counters
+        """
+        with self._lock:
+            snapshot = self._snapshot()
+        if link is not None:
+            snapshot.update(
+                retransmits=link.retransmits,
+                given_up=link.given_up,
+                duplicates=link.duplicates,
+                in_flight=link.in_flight,
+                backlog=link.backlog,
+            )
+        return snapshot
+
+    def _snapshot(self) -> dict:
+        now = time.monotonic()
+        bytes_in = sum(self.bytes[CaptureDirection.IN])
+        bytes_out = sum(self.bytes[CaptureDirection.OUT])
+        last_time, last_in, last_out = self._last_snapshot
+        self._last_snapshot = (now, bytes_in, bytes_out)
+        elapsed = max(now - last_time, 1e-9)
+        # 8N1: 10 bits on the line per byte
+        capacity = self.baudrate / 10
+
+        types = {}
+        for direction in CaptureDirection:
+            name = direction.name.lower()
+            for msg_type, count in enumerate(self.frames[direction]):
+                if count:
+                    counters = types.setdefault(str(msg_type), {})
+                    counters[f"{name}_frames"] = count
+                    counters[f"{name}_bytes"] = self.bytes[direction][msg_type]
+
+        return {
+            "types": types,
+            "frames_in": sum(self.frames[CaptureDirection.IN]),
+            "frames_out": sum(self.frames[CaptureDirection.OUT]),
+            "bytes_in": bytes_in,
+            "bytes_out": bytes_out,
+            "bytes_in_per_s": (bytes_in - last_in) / elapsed,
+            "bytes_out_per_s": (bytes_out - last_out) / elapsed,
+            "line_usage_in": (bytes_in - last_in) / elapsed / capacity,
+            "line_usage_out": (bytes_out - last_out) / elapsed / capacity,
+            "crc_errors": self.crc_errors,
+            "length_errors": self.length_errors,
+            "nacks_sent": self.nacks_sent,
+            "nacks_received": self.nacks_received,
+            "resends": self.resends,
+            "rtt": self.rtt.snapshot(),
+        }
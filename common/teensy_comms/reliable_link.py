@@ -0,0 +1,297 @@
+from typing import Any, Callable
+from collections import deque
+from enum import IntEnum
+import struct, threading, time
+
+
+class ProtocolVersion(IntEnum):
+    LEGACY = 1  # One frame at a time, NACK resends the last message
+    SEQUENCED = 2  # Sequence numbers + sliding window (ReliableLink)
+
+
+class LinkMessage(IntEnum):
+    # Two ways messages, same ids as teensy_moteur/lib/actions/include/commands.h
+    HELLO = 123  # version | window
+    SEQUENCED = 124  # seq | msg_type | msg_data
+    ACK = 125  # next expected seq | bitmap of the following received seqs (uint32)
+    SNACK = 126  # seq missing
+    NACK = 127  # legacy, invalid CRC8
+
+
+SEQ_MODULO = 256
+MAX_WINDOW = 32  # ACK bitmap size, must stay < SEQ_MODULO / 2 (selective repeat)
+
+# msg_data of the ACK and HELLO messages
+ACK_STRUCT = struct.Struct("<BI")
+HELLO_STRUCT = struct.Struct("<BB")
+
+
+class ReliableLink:
+    """
+    Selective repeat sliding window over the Teensy frames (protocol version 2).
+
+    A sequenced frame wraps a legacy message: SEQUENCED | seq | msg_type | msg_data,
+    so both versions use the same framing (len, CRC8, end bytes) and decoder.
+    * Sender: up to `window` frames in flight, each one with its own retransmit deadline.
+    Frames sent when the window is full wait in a backlog (see send, on_sent). ACKs are cumulative with a bitmap
+    of the out of order frames received, SNACKs ask for one frame again.
+    * Receiver: frames are delivered in order, out of order ones are kept until the gap is
+    filled (the missing seqs are SNACKed), duplicates are dropped and ACKed again.
+
+    The class does not know the transport: send_frame sends a msg_type | msg_data and
+    poll() has to be called at the deadline it returns (see Teensy).
+    """
+
+    def __init__(
+        self,
+        send_frame: Callable[[bytes], Any],
+        deliver: Callable[[int, memoryview], None],
+        window: int = 8,
+        retransmit_timeout: float = 0.05,
+        max_retries: int = 5,
+        clock: Callable[[], float] = time.monotonic,
+        on_failure: Callable[[], None] | None = None,
+        on_rtt: Callable[[float], None] | None = None,
+    ) -> None:
+        """
+        :param send_frame: sends an unsequenced msg_type | msg_data
+        :param deliver: called in order with (msg_type, msg_data) of every received sequenced frame
+        :param window: maximum number of frames in flight
+        :param retransmit_timeout: seconds without ACK before a frame is sent again
+        :param max_retries: number of retransmissions before a frame is given up
+        :param on_failure: called (outside of poll's lock) when a frame has been given up,
+        both sides have to be reset (the receiver waits for it forever)
+        :param on_rtt: called with the round trip time of every frame acknowledged at its first sending
+        """
+        if not 0 < window <= MAX_WINDOW:
+            raise ValueError(f"Window must be between 1 and {MAX_WINDOW}")
+        self._send_frame = send_frame
+        self._deliver = deliver
+        self.window = window
+        self.retransmit_timeout = retransmit_timeout
+        self.max_retries = max_retries
+        self._clock = clock
+        self._on_failure = on_failure
+        self._on_rtt = on_rtt
+        self._lock = threading.RLock()
+
+        # Sender
+        self._next_seq = 0
+        self._in_flight = {}  # seq -> [frame, deadline, retries, first send ts]
+        self._backlog = deque()
+
+        # Receiver
+        self._expected_seq = 0
+        self._out_of_order = {}  # seq -> msg_type | msg_data
+        self._snacked = set()
+
+        self.sent = 0
+        self.retransmits = 0
+        self.given_up = 0
+        self.acked = 0
+        self.received = 0
+        self.duplicates = 0
+        self.last_rtt = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._next_seq = 0
+            self._in_flight.clear()
+            backlog = list(self._backlog)
+            self._backlog.clear()
+            self._expected_seq = 0
+            self._out_of_order.clear()
+            self._snacked.clear()
+        for _, on_sent in backlog:
+            if on_sent is not None:
+                on_sent(ConnectionResetError("Link reset, frame never sent"))
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    @property
+    def backlog(self) -> int:
+        return len(self._backlog)
+
+    ##########
+    # Sender #
+    ##########
+    def send(self, data: bytes, on_sent: Callable[[Any], None] | None = None):
+        """
+        Send a msg_type | msg_data, or keep it in the backlog if the window is full.
+        :param on_sent: called with what send_frame returned once the frame is sent (right
+        away, or out of the backlog later), or with a ConnectionResetError if the link is
+        reset before
+        :return: what send_frame returned, None if the frame is in the backlog
+        """
+        with self._lock:
+            if len(self._in_flight) >= self.window:
+                self._backlog.append((bytes(data), on_sent))
+                return None
+            frame = self._register(data)
+        result = self._send_frame(frame)
+        if on_sent is not None:
+            on_sent(result)
+        return result
+
+    def _send_filled(self, filled: list) -> None:
+        for frame, on_sent in filled:
+            result = self._send_frame(frame)
+            if on_sent is not None:
+                on_sent(result)
+
+    def _register(self, data: bytes) -> bytes:
+        seq = self._next_seq
+        self._next_seq = (seq + 1) % SEQ_MODULO
+        frame = bytes([LinkMessage.SEQUENCED, seq]) + data
+        now = self._clock()
+        self._in_flight[seq] = [frame, now + self.retransmit_timeout, 0, now]
+        self.sent += 1
+        return frame
+
+    def _fill_window(self) -> list:
+        """
+        :return: (frame, on_sent) of the backlogged frames entering the window
+        """
+        filled = []
+        while self._backlog and len(self._in_flight) < self.window:
+            data, on_sent = self._backlog.popleft()
+            filled.append((self._register(data), on_sent))
+        return filled
+
+    def _retransmit(self, seq: int, now: float) -> bytes:
+        entry = self._in_flight[seq]
+        entry[1] = now + self.retransmit_timeout
+        entry[2] += 1
+        self.retransmits += 1
+        return entry[0]
+
+    def _acknowledge(self, seq: int, now: float) -> None:
+        entry = self._in_flight.pop(seq, None)
+        if entry is not None:
+            self.acked += 1
+            # Karn's rule: no RTT from a retransmitted frame
+            if entry[2] == 0:
+                self.last_rtt = now - entry[3]
+                if self._on_rtt is not None:
+                    self._on_rtt(self.last_rtt)
+
+    def on_ack(self, msg: memoryview) -> None:
+        next_expected, bitmap = ACK_STRUCT.unpack_from(msg)
+        with self._lock:
+            now = self._clock()
+            for seq in list(self._in_flight):
+                # seq before next_expected (modulo) -> received
+                if (next_expected - 1 - seq) % SEQ_MODULO < SEQ_MODULO // 2:
+                    self._acknowledge(seq, now)
+                else:
+                    offset = (seq - next_expected - 1) % SEQ_MODULO
+                    if offset < MAX_WINDOW and bitmap >> offset & 1:
+                        self._acknowledge(seq, now)
+            filled = self._fill_window()
+        self._send_filled(filled)
+
+    def on_snack(self, msg: memoryview) -> None:
+        seq = msg[0]
+        with self._lock:
+            if seq not in self._in_flight:
+                return
+            frame = self._retransmit(seq, self._clock())
+        self._send_frame(frame)
+
+    def on_nack(self) -> None:
+        """
+        Legacy NACK (CRC8 error on the other side): the oldest frame in flight is sent again
+        """
+        with self._lock:
+            if not self._in_flight:
+                return
+            seq = min(
+                self._in_flight,
+                key=lambda s: (s - self._next_seq) % SEQ_MODULO,
+            )
+            frame = self._retransmit(seq, self._clock())
+        self._send_frame(frame)
+
+    def poll(self) -> float | None:
+        """
+        Retransmit the frames whose deadline is over.
+        :return: next deadline (clock time), None if nothing is in flight
+        """
+        frames = []
+        failed = False
+        with self._lock:
+            now = self._clock()
+            for seq, entry in list(self._in_flight.items()):
+                if entry[1] > now:
+                    continue
+                if entry[2] >= self.max_retries:
+                    del self._in_flight[seq]
+                    self.given_up += 1
+                    failed = True
+                else:
+                    frames.append(self._retransmit(seq, now))
+            filled = self._fill_window()
+            next_deadline = min(
+                (entry[1] for entry in self._in_flight.values()), default=None
+            )
+        for frame in frames:
+            self._send_frame(frame)
+        self._send_filled(filled)
+        if failed and self._on_failure is not None:
+            self._on_failure()
+        return next_deadline
+
+    ############
+    # Receiver #
+    ############
+    def on_sequenced(self, msg: memoryview) -> None:
+        """
+        Handle a received seq | msg_type | msg_data
+        """
+        seq = msg[0]
+        to_deliver = []
+        to_send = []
+        with self._lock:
+            offset = (seq - self._expected_seq) % SEQ_MODULO
+            if offset >= SEQ_MODULO // 2 or seq in self._out_of_order:
+                # Already received (our ACK was lost)
+                self.duplicates += 1
+            elif offset >= self.window:
+                # Out of the window, the sender will retransmit it
+                pass
+            elif offset == 0:
+                to_deliver.append(bytes(msg[1:]))
+                self._expected_seq = (seq + 1) % SEQ_MODULO
+                while self._expected_seq in self._out_of_order:
+                    to_deliver.append(self._out_of_order.pop(self._expected_seq))
+                    self._snacked.discard(self._expected_seq)
+                    self._expected_seq = (self._expected_seq + 1) % SEQ_MODULO
+                self._snacked.discard(seq)
+            else:
+                self._out_of_order[seq] = bytes(msg[1:])
+                # Ask once for each missing frame before this one
+                for missing_offset in range(offset):
+                    missing = (self._expected_seq + missing_offset) % SEQ_MODULO
+                    if (
+                        missing not in self._out_of_order
+                        and missing not in self._snacked
+                    ):
+                        self._snacked.add(missing)
+                        to_send.append(bytes([LinkMessage.SNACK, missing]))
+            self.received += len(to_deliver)
+            to_send.append(self._ack_frame())
+
+        for frame in to_send:
+            self._send_frame(frame)
+        for data in to_deliver:
+            self._deliver(data[0], memoryview(data)[1:])
+
+    def _ack_frame(self) -> bytes:
+        bitmap = 0
+        for seq in self._out_of_order:
+            offset = (seq - self._expected_seq - 1) % SEQ_MODULO
+            if offset < MAX_WINDOW:
+                bitmap |= 1 << offset
+        return bytes([LinkMessage.ACK]) + ACK_STRUCT.pack(self._expected_seq, bitmap)
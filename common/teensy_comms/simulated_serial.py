@@ -0,0 +1,445 @@
+from typing import Callable
+from teensy_comms.dummy_serial import DummySerial
+from teensy_comms.frame_decoder import FrameDecoder, FrameError
+from teensy_comms.codec import FrameCodec, crc8_digest
+from teensy_comms.reliable_link import LinkMessage, ACK_STRUCT, SEQ_MODULO
+from teensy_comms.trajectory import SEGMENT_DTYPE, STATUS_STRUCT, COUNTER_MODULO
+import collections, heapq, random, struct, threading, time
+import numpy as np
+
+# Ids of teensy_moteur/lib/actions/include/commands.h
+VROUM, ROTATE, L_MOTOR, R_MOTOR, STOP, LR_MOTORS = range(6)
+TRAJECTORY_SEGMENTS, TRAJECTORY_ABORT = 6, 7
+ENCODERS_TELEMETRY = 131
+MOTORS_TELEMETRY = 132
+TRAJECTORY_STATUS = 133
+UNKNOWN_MSG_TYPE = 255
+
+# Firmware constants (commands.h, trajectory.h)
+PROTOCOL_VERSION = 2
+SEQ_WINDOW = 8
+TRAJECTORY_CAPACITY = 128
+TRAJECTORY_REPORT = 0.02
+
+SPEED_STRUCT = struct.Struct("<H?")
+LR_STRUCT = struct.Struct("<H?H?")
+ENCODERS_STRUCT = struct.Struct("<Iii")
+MOTORS_STRUCT = struct.Struct("<IhhBB")
+
+
+class SimulatedSerial(DummySerial):
+    """
+    Serial port emulating the rolling basis firmware (teensy_moteur), for load tests
+    without Teensy.
+
+    * Firmware: same handling as commands.cpp, frames are parsed and CRC checked (NACK on
+    error), NACKs resend the last message, HELLO / SEQUENCED frames are acknowledged,
+    unknown ids answer UNKNOWN_MSG_TYPE. The motor commands set the PWM of the wheels,
+    the encoder ticks are integrated from them and sent as telemetry. The trajectory
+    segments are buffered and played like Trajectory_Player (at their exact end times
+    here, the firmware polls them every loop), with the same status reports.
+    * Link: each direction transmits at baudrate (10 bits per byte), out_waiting counts
+    the bytes not transmitted yet; every chunk then arrives after latency seconds (USB),
+    with its bits flipped at bit_error_rate.
+    """
+
+    live = True
+
+    def __init__(
+        self,
+        baudrate: int = 115200,
+        latency: float = 0.001,
+        bit_error_rate: float = 0.0,
+        telemetry_rate: float = 0.0,
+        ticks_per_pwm: float = 10.0,
+        crc: bool = True,
+        seed: int | None = None,
+    ) -> None:
+        """
+        :param baudrate: bauds of the link, in both directions
+        :param latency: seconds between the end of the transmission and the reception
+        :param bit_error_rate: probability for each transmitted bit to be flipped
+        :param telemetry_rate: encoders / motors telemetry frames per second, 0 to disable
+        :param ticks_per_pwm: encoder ticks per second for one PWM unit
+        :param seed: random seed of the bit errors
+        """
+        super().__init__(baudrate)
+        self.latency = latency
+        self.bit_error_rate = bit_error_rate
+        self.telemetry_rate = telemetry_rate
+        self.ticks_per_pwm = ticks_per_pwm
+        self.end_bytes = b"\xba\xdd\x1c\xc5"
+        self._random = random.Random(seed)
+        # Probability for a byte to have at least one flipped bit
+        self._byte_error_rate = 1 - (1 - bit_error_rate) ** 8
+
+        self._events = []  # heap of (time, order, function, args)
+        self._order = 0
+        self._cond = threading.Condition()
+        self._tx_free_at = 0.0  # rasp -> teensy line busy until
+        self._rx_free_at = 0.0  # teensy -> rasp line busy until
+
+        # Firmware state
+        self._codec = FrameCodec(self.end_bytes, crc=crc)
+        self._decoder = FrameDecoder(
+            self.end_bytes,
+            crc=crc,
+            crc_func=crc8_digest,
+            on_error=self._on_firmware_error,
+        )
+        self.functions: dict[int, Callable[[bytes], None]] = {
+            VROUM: self._vroum,
+            ROTATE: self._rotate,
+            L_MOTOR: self._l_motor,
+            R_MOTOR: self._r_motor,
+            STOP: self._stop,
+            LR_MOTORS: self._lr_motors,
+            TRAJECTORY_SEGMENTS: self._trajectory_segments,
+            TRAJECTORY_ABORT: self._trajectory_abort,
+        }
+        self.last_msg = b""
+        self.expected_seq = 0
+        self._stored = {}  # seq -> msg_type | msg_data received in advance
+        self.left_pwm = 0  # signed, -255 to 255
+        self.right_pwm = 0
+        self.left_ticks = 0.0
+        self.right_ticks = 0.0
+        self._start = time.monotonic()
+        self._last_odometry = self._start
+        self.event_time = self._start
+        # (event_time, left_pwm, right_pwm) at every PWM change, when set to a list
+        self.pwm_log: list | None = None
+
+        # Trajectory_Player
+        self._segments = collections.deque()
+        self._segment_end = 0.0
+        self._trajectory_update = (
+            0  # generation of the scheduled update, the others are stale
+        )
+        self._last_report = 0.0
+        self.trajectory = {
+            "received": 0,
+            "played": 0,
+            "underruns": 0,
+            "overflows": 0,
+            "playing": False,
+        }
+
+        self.stats = {
+            "frames_received": 0,  # valid frames received by the firmware
+            "commands": 0,  # commands executed
+            "crc_errors": 0,
+            "nacks_sent": 0,
+            "nacks_received": 0,
+            "acks_sent": 0,
+            "telemetry_sent": 0,
+            "bytes_to_teensy": 0,
+            "bytes_to_rasp": 0,
+            "corrupted_bytes": 0,
+        }
+
+        self._thread = threading.Thread(
+            target=self.__simulator__, name="TeensySimulator", daemon=True
+        )
+        self._thread.start()
+        if telemetry_rate > 0:
+            self._schedule(
+                self._start + 1 / telemetry_rate,
+                self._telemetry,
+                self._start + 1 / telemetry_rate,
+            )
+
+    ##############
+    # Event loop #
+    ##############
+    def _schedule(self, at: float, function: Callable, *args) -> None:
+        with self._cond:
+            self._order += 1
+            heapq.heappush(self._events, (at, self._order, function, args))
+            self._cond.notify()
+
+    def __simulator__(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._events and self._events[0][0] <= now:
+                        at, _, function, args = heapq.heappop(self._events)
+                        break
+                    self._cond.wait(self._events[0][0] - now if self._events else None)
+            # Planned time of the event: what the board would see, without the delay
+            # of this thread
+            self.event_time = at
+            function(*args)
+
+    ########
+    # Link #
+    ########
+    def _corrupt(self, data: bytes) -> bytes:
+        if self._byte_error_rate == 0:
+            return data
+        corrupted = None
+        for index in range(len(data)):
+            if self._random.random() < self._byte_error_rate:
+                if corrupted is None:
+                    corrupted = bytearray(data)
+                corrupted[index] ^= 1 << self._random.randrange(8)
+                self.stats["corrupted_bytes"] += 1
+        return data if corrupted is None else bytes(corrupted)
+
+    def _transmission_time(self, size: int) -> float:
+        return size * 10 / self.baudrate
+
+    @property
+    def out_waiting(self) -> int:
+        """
+        Bytes written and not transmitted yet (at baudrate)
+        """
+        remaining = self._tx_free_at - time.monotonic()
+        if remaining <= 0:
+            return 0
+        return int(remaining * self.baudrate / 10) + 1
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        with self._cond:
+            start = max(time.monotonic(), self._tx_free_at)
+            self._tx_free_at = start + self._transmission_time(len(data))
+            arrival = self._tx_free_at + self.latency
+        self.stats["bytes_to_teensy"] += len(data)
+        self._schedule(arrival, self._firmware_receive, self._corrupt(data))
+        return super().write(data)
+
+    def _send_to_rasp(self, frame: bytes) -> None:
+        with self._cond:
+            start = max(time.monotonic(), self._rx_free_at)
+            self._rx_free_at = start + self._transmission_time(len(frame))
+            arrival = self._rx_free_at + self.latency
+        self.stats["bytes_to_rasp"] += len(frame)
+        self._schedule(arrival, self.dummy_add_input, self._corrupt(frame))
+
+    ############
+    # Firmware #
+    ############
+    def _send_msg(self, msg: bytes) -> None:
+        # Com::send_msg, kept to be sent again on NACK
+        self.last_msg = msg
+        self._send_to_rasp(self._codec.encode_bytes(msg))
+
+    def _send_control(self, msg: bytes) -> None:
+        # Com::send_control, last_msg is kept
+        self._send_to_rasp(self._codec.encode_bytes(msg))
+
+    def _on_firmware_error(self, error: FrameError, data: memoryview) -> None:
+        if error == FrameError.CRC:
+            self.stats["crc_errors"] += 1
+            self.stats["nacks_sent"] += 1
+            # Com::handle sends the NACK with send_msg, it becomes the last message
+            self._send_msg(bytes([LinkMessage.NACK]))
+
+    def _firmware_receive(self, data: bytes) -> None:
+        self._decoder.feed(data)
+        for msg_type, msg in self._decoder.decode():
+            self.stats["frames_received"] += 1
+            self._handle_callback(bytes([msg_type]) + bytes(msg))
+
+    def _handle_callback(self, msg: bytes) -> None:
+        if msg[0] == LinkMessage.NACK:
+            self.stats["nacks_received"] += 1
+            if self.last_msg:
+                self._send_to_rasp(self._codec.encode_bytes(self.last_msg))
+        elif msg[0] == LinkMessage.SEQUENCED:
+            self._handle_sequenced(msg)
+        elif msg[0] == LinkMessage.HELLO:
+            self._handle_hello(msg)
+        else:
+            self._call_function(msg)
+
+    def _call_function(self, msg: bytes) -> None:
+        function = self.functions.get(msg[0])
+        if function is None:
+            self._send_msg(bytes([UNKNOWN_MSG_TYPE, msg[0]]))
+            return
+        self.stats["commands"] += 1
+        function(msg[1:])
+
+    def _handle_sequenced(self, msg: bytes) -> None:
+        seq = msg[1]
+        offset = (seq - self.expected_seq) % SEQ_MODULO
+        if offset < SEQ_WINDOW:
+            if offset == 0:
+                self._call_function(msg[2:])
+                self.expected_seq = (self.expected_seq + 1) % SEQ_MODULO
+                while self.expected_seq in self._stored:
+                    self._call_function(self._stored.pop(self.expected_seq))
+                    self.expected_seq = (self.expected_seq + 1) % SEQ_MODULO
+            elif seq not in self._stored:
+                self._stored[seq] = msg[2:]
+                missing = self.expected_seq
+                while missing != seq:
+                    if missing not in self._stored:
+                        self._send_control(bytes([LinkMessage.SNACK, missing]))
+                    missing = (missing + 1) % SEQ_MODULO
+        self._send_ack()
+
+    def _send_ack(self) -> None:
+        bitmap = 0
+        for offset in range(SEQ_WINDOW - 1):
+            if (self.expected_seq + 1 + offset) % SEQ_MODULO in self._stored:
+                bitmap |= 1 << offset
+        self.stats["acks_sent"] += 1
+        self._send_control(
+            bytes([LinkMessage.ACK]) + ACK_STRUCT.pack(self.expected_seq, bitmap)
+        )
+
+    def _handle_hello(self, msg: bytes) -> None:
+        self.expected_seq = 0
+        self._stored.clear()
+        self._send_control(
+            bytes(
+                [
+                    LinkMessage.HELLO,
+                    min(msg[1], PROTOCOL_VERSION),
+                    min(msg[2], SEQ_WINDOW),
+                ]
+            )
+        )
+
+    #################
+    # Rolling basis #
+    #################
+    def _update_odometry(self) -> None:
+        now = time.monotonic()
+        dt = now - self._last_odometry
+        self._last_odometry = now
+        self.left_ticks += self.left_pwm * self.ticks_per_pwm * dt
+        self.right_ticks += self.right_pwm * self.ticks_per_pwm * dt
+
+    @staticmethod
+    def _pwm(speed: int, direction: bool) -> int:
+        # Motor::vroum, no correction factor nor threshold
+        power = min(speed, 255)
+        return power if direction else -power
+
+    def _set_pwm(self, left: int, right: int) -> None:
+        self._update_odometry()
+        self.left_pwm = left
+        self.right_pwm = right
+        if self.pwm_log is not None:
+            self.pwm_log.append((self.event_time, left, right))
+
+    def _vroum(self, data: bytes) -> None:
+        pwm = self._pwm(*SPEED_STRUCT.unpack(data))
+        self._set_pwm(pwm, pwm)
+
+    def _rotate(self, data: bytes) -> None:
+        speed, direction = SPEED_STRUCT.unpack(data)
+        self._set_pwm(self._pwm(speed, not direction), self._pwm(speed, direction))
+
+    def _l_motor(self, data: bytes) -> None:
+        self._set_pwm(self._pwm(*SPEED_STRUCT.unpack(data)), self.right_pwm)
+
+    def _r_motor(self, data: bytes) -> None:
+        self._set_pwm(self.left_pwm, self._pwm(*SPEED_STRUCT.unpack(data)))
+
+    def _stop(self, data: bytes) -> None:
+        self._abort_trajectory()
+        self._send_trajectory_status()
+        self._set_pwm(0, 0)
+
+    def _lr_motors(self, data: bytes) -> None:
+        l_speed, l_direction, r_speed, r_direction = LR_STRUCT.unpack(data)
+        self._set_pwm(self._pwm(l_speed, l_direction), self._pwm(r_speed, r_direction))
+
+    ##############
+    # Trajectory #
+    ##############
+    def _trajectory_segments(self, data: bytes) -> None:
+        segments = np.frombuffer(
+            data, dtype=SEGMENT_DTYPE, count=len(data) // SEGMENT_DTYPE.itemsize
+        )
+        for segment in segments.tolist():
+            self.trajectory["received"] += 1
+            if len(self._segments) >= TRAJECTORY_CAPACITY:
+                self.trajectory["overflows"] += 1
+                self.trajectory["played"] += 1
+                continue
+            self._segments.append(segment)
+        if not self.trajectory["playing"]:
+            self._play_next(self.event_time)
+        self._send_trajectory_status()
+
+    def _trajectory_abort(self, data: bytes) -> None:
+        self._abort_trajectory()
+        self._send_trajectory_status()
+
+    def _abort_trajectory(self) -> None:
+        # Trajectory_Player::abort, the dropped segments count as played
+        self.trajectory["played"] += len(self._segments) + self.trajectory["playing"]
+        self._segments.clear()
+        self._trajectory_update += 1
+        if self.trajectory["playing"]:
+            self.trajectory["playing"] = False
+            self._set_pwm(0, 0)
+
+    def _play_next(self, start: float) -> None:
+        if not self._segments:
+            return
+        duration_ms, left, right = self._segments.popleft()
+        self.trajectory["playing"] = True
+        self._segment_end = start + duration_ms / 1e3
+        self._set_pwm(left, right)
+        self._trajectory_update += 1
+        self._schedule(self._segment_end, self._on_segment_end, self._trajectory_update)
+
+    def _on_segment_end(self, generation: int) -> None:
+        # Trajectory_Player::update
+        if generation != self._trajectory_update:
+            return
+        self.trajectory["played"] += 1
+        if self._segments:
+            # From the planned end, so the playback does not drift
+            self._play_next(self._segment_end)
+            if time.monotonic() - self._last_report >= TRAJECTORY_REPORT:
+                self._send_trajectory_status()
+        else:
+            self.trajectory["playing"] = False
+            self.trajectory["underruns"] += 1
+            self._set_pwm(0, 0)
+            self._send_trajectory_status()
+
+    def _send_trajectory_status(self) -> None:
+        self._last_report = time.monotonic()
+        self._send_control(
+            bytes([TRAJECTORY_STATUS])
+            + STATUS_STRUCT.pack(
+                self.trajectory["received"] % COUNTER_MODULO,
+                self.trajectory["played"] % COUNTER_MODULO,
+                self.trajectory["underruns"] % COUNTER_MODULO,
+                TRAJECTORY_CAPACITY,
+                self.trajectory["playing"],
+            )
+        )
+
+    def _telemetry(self, at: float) -> None:
+        self._update_odometry()
+        time_us = int((self._last_odometry - self._start) * 1e6) & 0xFFFFFFFF
+        self._send_control(
+            bytes([ENCODERS_TELEMETRY])
+            + ENCODERS_STRUCT.pack(time_us, int(self.left_ticks), int(self.right_ticks))
+        )
+        # Current proportional to the PWM (no current sensing on the real board)
+        self._send_control(
+            bytes([MOTORS_TELEMETRY])
+            + MOTORS_STRUCT.pack(
+                time_us,
+                self.left_pwm * 10,
+                self.right_pwm * 10,
+                abs(self.left_pwm),
+                abs(self.right_pwm),
+            )
+        )
+        self.stats["telemetry_sent"] += 2
+        # Next one from the planned time, so the rate does not drift
+        at += 1 / self.telemetry_rate
+        self._schedule(at, self._telemetry, at)
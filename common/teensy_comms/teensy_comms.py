@@ -1,7 +1,24 @@
 from typing import Any, Callable
-import serial, threading, time, crc8, serial.tools.list_ports
+import serial, threading, time, asyncio, serial.tools.list_ports
 from logger import Logger, LogLevels
 from teensy_comms.dummy_serial import DummySerial
+from teensy_comms.async_transport import AsyncSerialTransport
+from teensy_comms.frame_decoder import FrameDecoder, FrameError
+from teensy_comms.codec import FrameCodec, crc8_digest
+from teensy_comms.dispatcher import Dispatcher, QueuePolicy
+from teensy_comms.telemetry import TelemetryRing
+from teensy_comms.capture import CaptureWriter, CaptureDirection, ReplaySerial
+from teensy_comms.simulated_serial import SimulatedSerial
+from teensy_comms.hub import TeensyHub
+from teensy_comms.discovery import DeviceCache
+from teensy_comms.connection import ConnectionState, Backoff
+from teensy_comms.link_metrics import LinkMetrics
+from teensy_comms.reliable_link import (
+    ReliableLink,
+    ProtocolVersion,
+    LinkMessage,
+    HELLO_STRUCT,
+)
 
 
 class TeensyException(Exception):
@@ -19,6 +36,19 @@ class Teensy:
         baudrate: int = 115200,
         crc: bool = True,
         dummy: bool = False,
+        transport: str = "thread",
+        device: str | None = None,
+        protocol: int = ProtocolVersion.LEGACY,
+        window: int = 8,
+        dispatch_workers: int = 1,
+        capture: str | None = None,
+        replay: str | None = None,
+        replay_speed: float = 1.0,
+        simulation: dict | None = None,
+        hub: TeensyHub | None = None,
+        discovery_cache: str | None = None,
+        messagetype: dict[int, Callable[[bytes], None]] | None = None,
+        telemetry: dict[int, list] | None = None,
     ):
         """
         Crée un objet Serial Teensy, qui permet la communication entre le code et la carte
@@ -45,37 +75,486 @@ class Teensy:
         :type crc: bool, optional
         :param dummy: _description_, defaults to False
         :type dummy: bool, optional
+        :param transport: "thread" (blocking writes + TeensyReceiver thread) or "asyncio"
+        (non-blocking writes and frames handled as event loop callbacks), defaults to "thread"
+        :type transport: str, optional
+        :param device: open this device path directly instead of searching the comports, defaults to None
+        :type device: str, optional
+        :param protocol: highest protocol version to negotiate with the Teensy at connection,
+        2 enables the sequence numbers and the sliding window (see ReliableLink), defaults to 1
+        :type protocol: int, optional
+        :param window: maximum number of sequenced frames in flight (protocol 2), defaults to 8
+        :type window: int, optional
+        :param dispatch_workers: number of threads running the message handlers (thread transport),
+        the handlers never run on the receiver, see Dispatcher, defaults to 1
+        :type dispatch_workers: int, optional
+        :param capture: write every raw chunk read and written to this file, see CaptureWriter, defaults to None
+        :type capture: str, optional
+        :param replay: no device, the received bytes come from this capture file, see ReplaySerial, defaults to None
+        :type replay: str, optional
+        :param replay_speed: 1 for real time, N for N times faster, 0 as fast as possible, defaults to 1.0
+        :type replay_speed: float, optional
+        :param simulation: in dummy mode, emulate the rolling basis firmware with these
+        SimulatedSerial options (latency, bit_error_rate, telemetry_rate...), defaults to None
+        :type simulation: dict, optional
+        :param hub: shared reader thread and handler pool for several boards (thread transport),
+        the port is also found in its enumeration, see TeensyHub, defaults to None
+        :type hub: TeensyHub, optional
+        :param discovery_cache: JSON file keeping the device path of each serial number, the
+        comports are only walked when the cached path is gone, see DeviceCache, defaults to None
+        :type discovery_cache: str, optional
+        :param messagetype: handler of each message type, in place before the receiver starts
+        (add_callback for the later ones), defaults to None
+        :type messagetype: dict, optional
+        :param telemetry: record layout of each telemetry message type, their rings are
+        created before the receiver starts (see add_telemetry), defaults to None
+        :type telemetry: dict, optional
         :raises TeensyException: _description_
         """
         self.logger = logger
         self._teensy = None
         self.crc = crc
-        self._crc8 = crc8.crc8()
         self.last_message = None
-        self.end_bytes = b"\xBA\xDD\x1C\xC5"
+        self.end_bytes = b"\xba\xdd\x1c\xc5"
+        # Fixed layout commands are registered by the child classes (see send_command)
+        self.codec = FrameCodec(self.end_bytes, crc=crc)
 
-        for port in serial.tools.list_ports.comports():
-            if (
-                port.vid == vid
-                and port.pid == pid
-                and port.serial_number is not None
-                and int(port.serial_number) == ser
-            ):
-                self._teensy = serial.Serial(port.device, baudrate=baudrate)
-                break
+        if transport not in ("thread", "asyncio"):
+            raise TeensyException(f"Unknown transport [{transport}] !")
+        self.transport = transport
+        if hub is not None and transport != "thread":
+            raise TeensyException(
+                "A TeensyHub can only be used with the thread transport"
+            )
+        self._hub = None
+        self._async_transport = None
+        self._loop = None
+        # Serializes the writes, and send_command (its frame is packed in a buffer shared
+        # by all the calls of a command, see FrameCodec.encode)
+        self._write_lock = threading.RLock()
+        # Protocol version 2, used once negotiated (see negotiate)
+        self.protocol = ProtocolVersion.LEGACY
+        self._requested_protocol = ProtocolVersion(protocol)
+        # Link quality counters, see link_metrics
+        self.metrics = LinkMetrics(baudrate)
+        # msg_type + msg_length (+ CRC8) + end bytes around each msg_data
+        self._frame_overhead = (3 if crc else 2) + len(self.end_bytes)
+        self._link = ReliableLink(
+            self._send_raw,
+            self._dispatch,
+            window=window,
+            on_failure=self._on_link_failure,
+            on_rtt=self.metrics.record_rtt,
+        )
+        self._hello_event = threading.Event()
+        self._retransmit_wakeup = threading.Event()
+        self._retransmit_thread = None
+        self._retransmit_handle = None
+        self._decoder = FrameDecoder(
+            self.end_bytes,
+            crc=crc,
+            crc_func=crc8_digest,
+            on_error=self._on_frame_error,
+        )
+        self._dispatcher = Dispatcher(
+            lambda msg_type: self.messagetype[msg_type],
+            self.logger,
+            workers=dispatch_workers,
+        )
+
+        self._capture = CaptureWriter(capture) if capture is not None else None
+        self._replay = None
+        if replay is not None:
+            self._replay = ReplaySerial(replay, replay_speed, baudrate=baudrate)
+            self._teensy = self._replay
+        elif device is not None:
+            self._teensy = serial.Serial(device, baudrate=baudrate)
+        elif hub is not None or discovery_cache is not None:
+            self._teensy = self.__open_known_port(
+                ser, vid, pid, baudrate, hub, discovery_cache
+            )
+        else:
+            self._teensy = self.__find_port(ser, vid, pid, baudrate)
         if self._teensy is None:
-            if dummy:
+            if dummy and simulation is not None:
+                self.logger.log("Dummy mode, simulated firmware", LogLevels.INFO)
+                self._teensy = SimulatedSerial(baudrate=baudrate, crc=crc, **simulation)
+            elif dummy:
                 self.logger.log("Dummy mode", LogLevels.INFO)
                 self._teensy = DummySerial()
             else:
                 self.logger.log("No Teensy found !", LogLevels.CRITICAL)
                 raise TeensyException("No Device !")
-        self.messagetype = {}
-        if not dummy:
-            self._reciever = threading.Thread(
-                target=self.__receiver__, name="TeensyReceiver"
+        # Connection state machine, see _on_port_lost and __reconnect__
+        self.state = ConnectionState.CONNECTED
+        self._state_lock = threading.Lock()
+        self._connected = threading.Event()
+        self._connected.set()
+        self._connection_callbacks = []
+        self.disconnections = 0
+        self.dropped_writes = 0  # Frames sent while disconnected
+        # A DummySerial (dummy, replay, simulation) is never unplugged
+        self._reopen = None
+        if not isinstance(self._teensy, DummySerial):
+            self._reopen = lambda: self.__reopen_port(
+                ser, vid, pid, baudrate, device, hub, discovery_cache
+            )
+        # The handlers are in place before the first frame is read (the negotiation
+        # below already blocks with the receiver running)
+        self.messagetype = dict(messagetype or {})
+        self.telemetry = {}  # msg_type -> TelemetryRing, see add_telemetry
+        for msg_type, fields in (telemetry or {}).items():
+            self.add_telemetry(msg_type, fields)
+        # A DummySerial has no file descriptor for the hub, it keeps its own threads
+        if hub is not None and not isinstance(self._teensy, DummySerial):
+            self._hub = hub
+            self._dispatcher.attach_executor(hub.submit)
+        elif self.transport == "thread":
+            self._dispatcher.start()
+        # In asyncio mode, the reading is done by the event loop (see attach_loop)
+        # Nothing to read on a DummySerial, unless it is fed (replay, simulation)
+        if self.transport == "thread" and (
+            not isinstance(self._teensy, DummySerial) or self._teensy.live
+        ):
+            if self._hub is not None:
+                self._hub.attach(self)
+            else:
+                self._reciever = threading.Thread(
+                    target=self.__receiver__, name="TeensyReceiver", daemon=True
+                )
+                self._reciever.start()
+            if self._replay is not None:
+                # The HELLO answer, if any, is in the capture
+                self._replay.start()
+            elif self._requested_protocol > ProtocolVersion.LEGACY:
+                self.negotiate()
+
+    ###################
+    # Asyncio support #
+    ###################
+    def attach_loop(self, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        """
+        Bind the serial port to an event loop (asyncio transport only).
+        Writes become non-blocking and every received frame is handled as a loop callback.
+        It is called automatically by the first send_bytes done inside a running loop.
+        """
+        if self.transport != "asyncio":
+            raise TeensyException(
+                "attach_loop is only available with the asyncio transport"
+            )
+        if self._async_transport is not None:
+            return
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self._loop = loop
+        port = self._teensy
+        self._async_transport = AsyncSerialTransport(
+            port,
+            self._on_serial_data,
+            loop=loop,
+            on_error=lambda error: self._on_port_lost(error, port),
+        )
+        self._async_transport.start()
+        self._dispatcher.attach_loop(loop)
+        if self._replay is not None:
+            self._replay.start()
+        self.logger.log("Teensy attached to the event loop", LogLevels.DEBUG)
+
+    async def connect_async(self) -> None:
+        """
+        Coroutine version of attach_loop, can be given as background task to the server.
+        It also negotiates the protocol version.
+        """
+        self.attach_loop(asyncio.get_running_loop())
+        if self._requested_protocol > ProtocolVersion.LEGACY and self._replay is None:
+            await self.negotiate_async()
+
+    ####################
+    # Protocol version #
+    ####################
+    def _send_hello(self) -> None:
+        self._hello_event.clear()
+        self.protocol = ProtocolVersion.LEGACY
+        self._send_raw(
+            bytes([LinkMessage.HELLO])
+            + HELLO_STRUCT.pack(self._requested_protocol, self._link.window)
+        )
+
+    def _log_negotiation(self) -> ProtocolVersion:
+        if self._hello_event.is_set():
+            self.logger.log(
+                f"Teensy protocol version {self.protocol.value} "
+                f"(window {self._link.window})",
+                LogLevels.INFO,
+            )
+        else:
+            self.logger.log(
+                "Teensy did not answer the HELLO, legacy protocol used",
+                LogLevels.WARNING,
+            )
+        return self.protocol
+
+    def negotiate(self, timeout: float = 0.5) -> ProtocolVersion:
+        """
+        Ask the Teensy for the protocol version (thread transport), a firmware which does not
+        know the HELLO message keeps the legacy protocol
+        """
+        self._send_hello()
+        self._hello_event.wait(timeout)
+        return self._log_negotiation()
+
+    async def negotiate_async(self, timeout: float = 0.5) -> ProtocolVersion:
+        """
+        Same as negotiate, without blocking the event loop (asyncio transport)
+        """
+        self._send_hello()
+        deadline = time.monotonic() + timeout
+        while not self._hello_event.is_set() and time.monotonic() < deadline:
+            await asyncio.sleep(0.005)
+        return self._log_negotiation()
+
+    def _on_hello(self, msg: memoryview) -> None:
+        version, window = HELLO_STRUCT.unpack_from(msg)
+        self._link.reset()
+        self._link.window = max(1, min(window, self._link.window))
+        self.protocol = ProtocolVersion(min(version, self._requested_protocol))
+        self._hello_event.set()
+
+    def _on_link_failure(self) -> None:
+        self.logger.log(
+            "Teensy sequenced frame given up, negotiating again", LogLevels.ERROR
+        )
+        self._send_hello()
+
+    def _send_raw(self, data: bytes) -> asyncio.Future | None:
+        """
+        Frame and send a msg_type | msg_data as is (no sequence number, no last_message)
+        """
+        if self.state == ConnectionState.DISCONNECTED:
+            # Link traffic (ACK, retransmissions...), the link is reset at the reconnection
+            return None
+        return self._write(self.codec.encode_bytes(data))
+
+    def _send_sequenced(self, data: bytes) -> asyncio.Future | None:
+        """
+        Send through the window. With the asyncio transport the future is resolved once
+        the frame is written, also when it waits in the backlog of the window first.
+        """
+        if self.transport != "asyncio" or self._loop is None:
+            result = self._link.send(data)
+            self._arm_retransmit()
+            return result
+
+        future = self._loop.create_future()
+
+        def on_sent(result) -> None:
+            # Out of the backlog, the frame can be sent by another thread (dispatcher)
+            if self._on_loop():
+                self._chain_sent(future, result)
+            else:
+                self._loop.call_soon_threadsafe(self._chain_sent, future, result)
+
+        self._link.send(data, on_sent)
+        self._arm_retransmit()
+        return future
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    @staticmethod
+    def _chain_sent(future: asyncio.Future, result) -> None:
+        """
+        Resolve the future of a sequenced frame with what its write returned
+        """
+        if future.done():
+            return
+        if isinstance(result, BaseException):
+            future.set_exception(TeensyException(str(result)))
+        elif isinstance(result, asyncio.Future):
+
+            def written(write: asyncio.Future) -> None:
+                if future.done():
+                    return
+                if write.cancelled():
+                    future.cancel()
+                elif write.exception() is not None:
+                    future.set_exception(write.exception())
+                else:
+                    future.set_result(write.result())
+
+            result.add_done_callback(written)
+        else:
+            future.set_result(result)
+
+    def _arm_retransmit(self) -> None:
+        """
+        Make sure ReliableLink.poll is called at the next retransmit deadline:
+        by a thread with the thread transport (the hub one if any), by the event loop
+        with the asyncio one
+        """
+        if self._hub is not None:
+            self._hub.wakeup()
+            return
+        if self.transport == "asyncio":
+            if self._async_transport is None:
+                return
+            # Sequenced sends can come from other threads (dispatcher handlers)
+            if self._on_loop():
+                self._schedule_poll()
+            else:
+                self._loop.call_soon_threadsafe(self._schedule_poll)
+            return
+        if self._retransmit_thread is None:
+            self._retransmit_thread = threading.Thread(
+                target=self.__retransmitter__, name="TeensyRetransmit", daemon=True
+            )
+            self._retransmit_thread.start()
+        self._retransmit_wakeup.set()
+
+    def _schedule_poll(self) -> None:
+        if self._retransmit_handle is None:
+            self._retransmit_handle = self._loop.call_later(
+                self._link.retransmit_timeout, self._poll_link
+            )
+
+    def _poll_link(self) -> None:
+        self._retransmit_handle = None
+        deadline = self._link.poll()
+        if deadline is not None:
+            delay = max(0.0, deadline - time.monotonic())
+            self._retransmit_handle = self._loop.call_later(delay, self._poll_link)
+
+    def __retransmitter__(self) -> None:
+        while True:
+            deadline = self._link.poll()
+            timeout = (
+                None if deadline is None else max(0.0, deadline - time.monotonic())
+            )
+            self._retransmit_wakeup.wait(timeout)
+            self._retransmit_wakeup.clear()
+
+    def _on_serial_data(self, data: bytes) -> None:
+        """
+        Called by the asyncio transport with every chunk read from the port
+        """
+        if self._capture is not None:
+            self._capture.write(CaptureDirection.IN, data)
+        self._decoder.feed(data)
+        self._handle_frames()
+
+    def _write(self, frame: bytes) -> asyncio.Future | None:
+        """
+        Write a full frame on the port.
+        * thread transport: blocks until the output buffer is empty, returns None
+        * asyncio transport: returns immediately a future resolved once the frame is handed to the OS
+        While the Teensy is disconnected the frame is dropped (the future fails with TeensyException).
+        """
+        if self.state == ConnectionState.DISCONNECTED:
+            return self._drop_write()
+        if self._capture is not None:
+            self._capture.write(CaptureDirection.OUT, frame)
+        msg_type = frame[2] if frame[0] == LinkMessage.SEQUENCED else frame[0]
+        if self.transport == "asyncio":
+            self.metrics.record(CaptureDirection.OUT, msg_type, len(frame))
+            if self._async_transport is None:
+                try:
+                    self.attach_loop(asyncio.get_running_loop())
+                except RuntimeError:
+                    raise TeensyException(
+                        "asyncio transport used outside of a running loop, call attach_loop first"
+                    )
+            return self._async_transport.write(frame)
+
+        # Several threads can send (user code, receiver NACKs, retransmissions)
+        with self._write_lock:
+            self.metrics.record(CaptureDirection.OUT, msg_type, len(frame))
+            port = self._teensy
+            try:
+                port.reset_output_buffer()
+                port.write(frame)
+                while port.out_waiting:
+                    pass
+            except (serial.SerialException, OSError) as e:
+                self._on_port_lost(e, port)
+
+    def _drop_write(self) -> asyncio.Future | None:
+        self.dropped_writes += 1
+        if self.dropped_writes == 1:
+            self.logger.log(
+                "Teensy disconnected, the frames sent are dropped", LogLevels.WARNING
             )
-            self._reciever.start()
+        if self.transport == "asyncio" and self._loop is not None:
+            future = self._loop.create_future()
+            future.set_exception(TeensyException("Teensy disconnected"))
+            return future
+        return None
+
+    @staticmethod
+    def __find_port(ser: int, vid: int, pid: int, baudrate: int):
+        for port in serial.tools.list_ports.comports():
+            if (
+                port.vid == vid
+                and port.pid == pid
+                and port.serial_number is not None
+                and int(port.serial_number) == ser
+            ):
+                return serial.Serial(port.device, baudrate=baudrate)
+        return None
+
+    def __reopen_port(
+        self,
+        ser: int,
+        vid: int,
+        pid: int,
+        baudrate: int,
+        device: str | None,
+        hub: TeensyHub | None,
+        discovery_cache: str | None,
+    ):
+        """
+        Open the board again the way it was found: same device path if it was given,
+        by serial number otherwise (the board can come back on another port)
+        """
+        try:
+            if device is not None:
+                return serial.Serial(device, baudrate=baudrate)
+            if hub is not None or discovery_cache is not None:
+                return self.__open_known_port(
+                    ser, vid, pid, baudrate, hub, discovery_cache
+                )
+            return self.__find_port(ser, vid, pid, baudrate)
+        except (serial.SerialException, OSError, ValueError):
+            return None
+
+    def __open_known_port(
+        self,
+        ser: int,
+        vid: int,
+        pid: int,
+        baudrate: int,
+        hub: TeensyHub | None,
+        discovery_cache: str | None,
+    ):
+        """
+        Open the device given by the hub enumeration or by the discovery cache, a device
+        which cannot be opened is forgotten and looked for once again
+        """
+        finder = hub if hub is not None else DeviceCache(discovery_cache, vid, pid)
+        for _ in range(2):
+            device = finder.device(ser)
+            if device is None:
+                return None
+            try:
+                return serial.Serial(device, baudrate=baudrate)
+            except serial.SerialException as e:
+                self.logger.log(
+                    f"Cannot open the Teensy {ser} on {device} [{e}]", LogLevels.WARNING
+                )
+                finder.forget(ser)
+        return None
 
     def send_dummy(self, type):
         """
@@ -84,127 +563,306 @@ class Teensy:
         # TODO: utiliser if else au lieu de match car pas compatible avec python 3.9
         match (type):
             case "bad_crc":
-                self._teensy.reset_output_buffer()
-                msg = b"\xFF\xFF\xEE\x66"
+                msg = b"\xff\xff\xee\x66"
                 self.last_message = msg
-                self._teensy.write(msg + bytes([len(msg)]) + b"\x00" + self.end_bytes)
-                while self._teensy.out_waiting:
-                    pass
-                return
+                return self._write(msg + bytes([len(msg)]) + b"\x00" + self.end_bytes)
             case "bad_length":
-                self._teensy.reset_output_buffer()
-                msg = b"\xFF\xFF\xEE\x66"
-                self._teensy.write(
+                msg = b"\xff\xff\xee\x66"
+                return self._write(
                     msg + bytes([len(msg) + 1]) + b"\x00" + self.end_bytes
                 )
-                while self._teensy.out_waiting:
-                    pass
-                return
             case "bad_id":
-                self._teensy.reset_output_buffer()
-                msg = b"\x2F\xFF\xEE\x66"
+                msg = b"\x2f\xff\xee\x66"
                 msg += bytes([len(msg)])
-                self._crc8.reset()
-                self._crc8.update(msg)
-                msg += self._crc8.digest()
-                self._crc8.reset()
-                self._teensy.write(msg + self.end_bytes)
-                while self._teensy.out_waiting:
-                    pass
-                return
+                msg += bytes([crc8_digest(msg)])
+                return self._write(msg + self.end_bytes)
             case "send_nack":
-                self._teensy.reset_output_buffer()
-                msg = b"\x7F"
+                msg = b"\x7f"
                 msg += bytes([len(msg)])
-                self._crc8.reset()
-                self._crc8.update(msg)
-                msg += self._crc8.digest()
-                self._crc8.reset()
-                self._teensy.write(msg + self.end_bytes)
-                while self._teensy.out_waiting:
-                    pass
-                return
+                msg += bytes([crc8_digest(msg)])
+                return self._write(msg + self.end_bytes)
 
-    def send_bytes(self, data: bytes):
+    def send_bytes(self, data: bytes) -> asyncio.Future | None:
+        """
+        Frame and send data to the Teensy.
+        With the asyncio transport it returns a future which can be awaited, see _write.
+        """
+        if self.protocol == ProtocolVersion.SEQUENCED:
+            return self._send_sequenced(bytes(data))
         self.last_message = data
-        self._teensy.reset_output_buffer()
-        msg = data + bytes([len(data)])
-        if self.crc:
-            self._crc8.reset()
-            self._crc8.update(msg)
-            msg += self._crc8.digest()
-            self._crc8.reset()
-
-        self._teensy.write(msg + self.end_bytes)
-        while self._teensy.out_waiting:
-            pass
+        return self._write(self.codec.encode_bytes(data))
+
+    def send_command(self, msg_type: int, *values) -> asyncio.Future | None:
+        """
+        Send a command registered in self.codec, its frame is packed in place (no concatenation).
+        With the asyncio transport it returns a future which can be awaited, see _write.
+        """
+        with self._write_lock:
+            frame = self.codec.encode(msg_type, *values)
+            data = bytes(memoryview(frame)[: -self.codec.trailer_size])
+            if self.protocol != ProtocolVersion.SEQUENCED:
+                self.last_message = data
+                return self._write(frame)
+        return self._send_sequenced(data)
 
     def read_bytes(self) -> bytes:
         return self._teensy.read_until(self.end_bytes)
 
-    def add_callback(self, func: Callable[[bytes], None], id: int):
+    def add_callback(
+        self,
+        func: Callable[[bytes], None],
+        id: int,
+        queue_size: int | None = None,
+        policy: QueuePolicy | None = None,
+    ):
+        """
+        Set the handler of a message type, it is run out of the receiver (see Dispatcher)
+        :param queue_size: number of messages waiting for the handler, defaults to 64
+        :param policy: what to do when the queue is full, defaults to QueuePolicy.DROP_OLDEST
+        """
         self.messagetype[id] = func
+        self._dispatcher.configure(id, queue_size, policy)
 
-    def __receiver__(self) -> None:
-        """This is started as a thread, handles the data according to the decided format :
+    def add_telemetry(
+        self,
+        id: int,
+        fields: list,
+        capacity: int = 4096,
+        queue_size: int = 1024,
+    ) -> TelemetryRing:
+        """
+        Store the records of a telemetry message in a ring buffer (see TelemetryRing)
+        :param id: message type sent by the Teensy
+        :param fields: layout of a record, e.g. [("time_us", "<u4"), ("left", "<i4")]
+        :param capacity: number of records kept
+        :param queue_size: number of frames waiting to be stored (the oldest are dropped)
+        :return: the ring, also available in self.telemetry[id]
+        """
+        ring = TelemetryRing(fields, capacity)
+        self.telemetry[id] = ring
+        self.add_callback(ring.ingest, id, queue_size, QueuePolicy.DROP_OLDEST)
+        return ring
 
-        msg_type | msg_data | msg_length | CRC8 | MSG_END_BYTES
-        size : 1 | msg_length | 1 | 1 | 4
+    def link_metrics(self) -> dict:
+        """
+        Link quality: frames and bytes per message type, line usage, errors, NACKs,
+        retransmissions and round trip times (see LinkMetrics.snapshot), connection state.
+        The rates are computed since the previous call.
+        """
+        snapshot = self.metrics.snapshot(self._link)
+        snapshot.update(
+            state=self.state.value,
+            protocol=int(self.protocol),
+            disconnections=self.disconnections,
+            dropped_writes=self.dropped_writes,
+            skipped_bytes=self._decoder.skipped_bytes,
+        )
+        return snapshot
 
-        The size is in bytes.
-        It will call the corresponding function
+    def dispatch_stats(self) -> dict:
+        """
+        Queue depth and handler latency of each message type, see Dispatcher.stats
+        """
+        return self._dispatcher.stats()
+
+    def __receiver__(self) -> None:
+        """This is started as a thread (thread transport only), it reads everything
+        available on the port in one call and handles all the complete frames
         """
         while True:
+            # Nothing to read while the port is being opened again
+            self._connected.wait()
+            port = self._teensy
             try:
-                msg = self.read_bytes()
-
-                if self.crc:
-                    crc = msg[-5:-4]
-                    msg = msg[:-5]
-                    self._crc8.reset()
-                    self._crc8.update(msg)
-                    if self._crc8.digest() != crc:
-                        self.logger.log(
-                            f"Invalid CRC8, sending NACK ... [{crc}]", LogLevels.WARNING
-                        )
-                        self.send_bytes(b"\x7F")  # send NACK
-                        self._crc8.reset()
-                        continue
-                    self._crc8.reset()
+                # Block until at least one byte is there, then take all the waiting ones
+                self._read_available(max(1, port.in_waiting))
+            except Exception as e:
+                self._on_port_lost(e, port)
+                if self._reopen is None:
+                    return
 
-                else:
-                    msg = msg[:-4]
+    def _read_available(self, size: int | None = None) -> int:
+        """
+        Read size bytes (default: the waiting ones, without blocking) and handle the
+        complete frames, used by the receiver thread and by TeensyHub
+        :return: number of bytes read
+        """
+        if size is None:
+            size = self._teensy.in_waiting
+            if not size:
+                return 0
+        nb_bytes = self._decoder.readinto(self._teensy, min(size, 4096))
+        if self._capture is not None:
+            self._capture.write(CaptureDirection.IN, self._decoder.tail(nb_bytes))
+        self._handle_frames()
+        return nb_bytes
+
+    ##############
+    # Connection #
+    ##############
+    def add_connection_callback(self, func: Callable[[ConnectionState], None]) -> None:
+        """
+        Call func with the new state at every connection change (see ConnectionState).
+        It runs on the thread which saw the change, it has to be short.
+        """
+        self._connection_callbacks.append(func)
+
+    def _set_state(self, state: ConnectionState) -> None:
+        self.state = state
+        for callback in self._connection_callbacks:
+            try:
+                callback(state)
+            except Exception as e:
+                self.logger.log(
+                    f"Teensy connection callback crashed : {e}", LogLevels.ERROR
+                )
+
+    def _on_port_lost(self, error: Exception, port=None) -> None:
+        """
+        The port failed (board reset or unplugged, cable glitch): close it and open it
+        again in the background with a backoff, see __reconnect__
+        :param port: port which failed, nothing is done if it was already replaced
+        """
+        with self._state_lock:
+            if self.state == ConnectionState.DISCONNECTED or (
+                port is not None and port is not self._teensy
+            ):
+                return
+            self._connected.clear()
+            self.disconnections += 1
+            self.dropped_writes = 0
+            self._disconnected_at = time.monotonic()
+        self.logger.log(
+            f"Teensy connection lost, board reset or unplugged ? [{error}]",
+            LogLevels.CRITICAL,
+        )
+        if self._hub is not None:
+            self._hub.detach(self)
+        if self._async_transport is not None:
+            self._async_transport.close()
+            self._async_transport = None
+        try:
+            self._teensy.close()
+        except Exception:
+            pass
+        self._set_state(ConnectionState.DISCONNECTED)
+        if self._reopen is None:
+            self.logger.log("This port cannot be opened again", LogLevels.CRITICAL)
+            return
+        threading.Thread(
+            target=self.__reconnect__, name="TeensyReconnect", daemon=True
+        ).start()
+
+    def __reconnect__(self) -> None:
+        """This is started as a thread when the port is lost, it tries to open it again
+        with growing delays, then restores the reading and the protocol version
+        """
+        backoff = Backoff()
+        while True:
+            time.sleep(backoff.next())
+            port = self._reopen()
+            if port is not None:
+                break
+        self._decoder.reset()
+        self._link.reset()
+        self.protocol = ProtocolVersion.LEGACY
+        self._teensy = port
+        self._set_state(ConnectionState.RECONNECTING)
+        self.logger.log(
+            f"Teensy port open again after {backoff.attempts} attempts "
+            f"({time.monotonic() - self._disconnected_at:.2f} s)",
+            LogLevels.INFO,
+        )
+        if self.transport == "asyncio":
+            asyncio.run_coroutine_threadsafe(self._resume_async(), self._loop)
+            return
+        self._connected.set()
+        if self._hub is not None:
+            self._hub.attach(self)
+        if self._requested_protocol > ProtocolVersion.LEGACY:
+            self.negotiate()
+        self._set_state(ConnectionState.CONNECTED)
 
-                lenmsg = msg[-1]
+    async def _resume_async(self) -> None:
+        self.attach_loop(self._loop)
+        self._connected.set()
+        if self._requested_protocol > ProtocolVersion.LEGACY:
+            await self.negotiate_async()
+        self._set_state(ConnectionState.CONNECTED)
 
-                if lenmsg > len(msg):
+    def _on_frame_error(self, error: FrameError, data: memoryview) -> None:
+        if error == FrameError.CRC:
+            self.metrics.record_event("crc_errors")
+            self.logger.log(
+                f"Invalid CRC8, sending NACK ... [{data[-1:].hex()}]", LogLevels.WARNING
+            )
+            self.metrics.record_event("nacks_sent")
+            # Raw, outside of the window in protocol 2: the firmware resends its last
+            # frame on a bare NACK, a sequenced one would be taken as a command
+            self._send_raw(bytes([LinkMessage.NACK]))
+        else:
+            self.metrics.record_event("length_errors")
+            self.logger.log(
+                "Received Teensy message that does not match declared length "
+                + data.hex(sep=" "),
+                LogLevels.WARNING,
+            )
+
+    def _dispatch(self, msg_type: int, msg: memoryview) -> None:
+        match (msg_type):
+            case LinkMessage.NACK:
+                self.logger.log("Received a NACK")
+                self.metrics.record_event("nacks_received")
+                if self.protocol == ProtocolVersion.SEQUENCED:
+                    self._link.on_nack()
+                elif self.last_message != None:
+                    self.metrics.record_event("resends")
+                    self.send_bytes(self.last_message)
+                    self.logger.log(f"Sending back action : {self.last_message[0]}")
+                    self.last_message = None
+            case LinkMessage.SEQUENCED:
+                self._link.on_sequenced(msg)
+            case LinkMessage.ACK:
+                self._link.on_ack(msg)
+            case LinkMessage.SNACK:
+                self._link.on_snack(msg)
+            case LinkMessage.HELLO:
+                self._on_hello(msg)
+            case _:
+                if msg_type not in self.messagetype:
                     self.logger.log(
-                        "Received Teensy message that does not match declared length "
-                        + msg.hex(sep=" "),
+                        f"No handler for the Teensy message [{msg_type}]",
                         LogLevels.WARNING,
                     )
-                    continue
-                try:
-                    if msg[0] == 127:
-                        self.logger.log("Received a NACK")
-                        if self.last_message != None:
-                            self.send_bytes(self.last_message)
-                            self.logger.log(
-                                f"Sending back action : {self.last_message[0]}"
-                            )
-                            self.last_message = None
-                    else:
-                        self.messagetype[msg[0]](msg[1:-1])
-                except Exception as e:
-                    self.logger.log(
-                        "Received message handling crashed :\n" + str(e),
-                        LogLevels.ERROR,
-                    )
-                    time.sleep(0.5)
+                    return
+                # msg is only valid during this call, the handler gets a copy
+                self._dispatcher.put(msg_type, bytes(msg))
+
+    def _handle_frames(self) -> None:
+        """Handles the received frames according to the decided format :
+
+        msg_type | msg_data | msg_length | CRC8 | MSG_END_BYTES
+        size : 1 | msg_length | 1 | 1 | 4
 
+        The size is in bytes.
+        The link messages are handled here, the others are queued for their handler
+        with a copy of msg_data (see Dispatcher).
+        """
+        metrics = self.metrics
+        for msg_type, msg in self._decoder.decode():
+            metrics.record(
+                CaptureDirection.IN,
+                (
+                    msg[1]
+                    if msg_type == LinkMessage.SEQUENCED and len(msg) > 1
+                    else msg_type
+                ),
+                len(msg) + self._frame_overhead,
+            )
+            try:
+                self._dispatch(msg_type, msg)
             except Exception as e:
-                # self.logger.log(
-                #    f"Device connection seems to be closed, teensy crashed ? [{e}]",
-                #    LogLevels.CRITICAL,
-                # )
-                pass
+                self.logger.log(
+                    "Received message handling crashed :\n" + str(e),
+                    LogLevels.ERROR,
+                )
@@ -0,0 +1,141 @@
+import numpy as np
+import threading, time
+
+
+class TelemetryRing:
+    """
+    Preallocated ring buffer of timestamped telemetry records (NumPy structured array).
+
+    A telemetry frame carries one or more fixed layout records (msg_data length must be a
+    multiple of the record size): the whole payload is decoded at once with np.frombuffer
+    and copied in the ring with slice assignments, so nothing is allocated per sample.
+    * t: reception time of the frame (time.monotonic), shared by its records.
+    * latest() is O(1), since(t) is vectorized (binary search on the times).
+    The ring is written by a dispatch worker and read by the brains, a lock protects it.
+    """
+
+    def __init__(self, fields: list | np.dtype, capacity: int = 4096) -> None:
+        """
+        :param fields: layout of a record, NumPy dtype or list of (name, format),
+        little endian as sent by the Teensy, e.g. [("time_us", "<u4"), ("left", "<i4")]
+        :param capacity: number of records kept
+        """
+        self.dtype = np.dtype(fields)
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._records = np.zeros(capacity, dtype=self.dtype)
+        # Records written since the creation (next index = count % capacity)
+        self._count = 0
+        self._lock = threading.Lock()
+
+        self.frames = 0
+        self.invalid_frames = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    @property
+    def count(self) -> int:
+        """
+        Number of records received since the creation (dropped ones included)
+        """
+        return self._count
+
+    ###########
+    # Writing #
+    ###########
+    def ingest(self, msg: bytes, t: float | None = None) -> None:
+        """
+        Decode a telemetry msg_data and store its records, to be given to add_callback
+        """
+        if len(msg) % self.dtype.itemsize:
+            self.invalid_frames += 1
+            return
+        self.extend(np.frombuffer(msg, dtype=self.dtype), t)
+        self.frames += 1
+
+    def extend(self, records: np.ndarray, t: float | None = None) -> None:
+        """
+        Store already decoded records (same dtype), all with the time t (now if None)
+        """
+        if t is None:
+            t = time.monotonic()
+        size = len(records)
+        if size > self.capacity:
+            records = records[-self.capacity :]
+            skipped = size - self.capacity
+        else:
+            skipped = 0
+        size = len(records)
+
+        with self._lock:
+            start = (self._count + skipped) % self.capacity
+            first = min(size, self.capacity - start)
+            self._records[start : start + first] = records[:first]
+            self._times[start : start + first] = t
+            if first < size:
+                self._records[: size - first] = records[first:]
+                self._times[: size - first] = t
+            self._count += skipped + size
+
+    ###########
+    # Reading #
+    ###########
+    def latest(self) -> tuple[float, np.void] | None:
+        """
+        Newest record and its time, None if nothing was received
+        """
+        with self._lock:
+            if self._count == 0:
+                return None
+            index = (self._count - 1) % self.capacity
+            return float(self._times[index]), self._records[index].copy()
+
+    def _ordered(self) -> tuple[np.ndarray, np.ndarray]:
+        # Oldest to newest (lock held by the caller)
+        if self._count <= self.capacity:
+            return self._times[: self._count], self._records[: self._count]
+        start = self._count % self.capacity
+        return (
+            np.concatenate((self._times[start:], self._times[:start])),
+            np.concatenate((self._records[start:], self._records[:start])),
+        )
+
+    def since(self, t: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Records received at or after t, oldest first
+        :return: (times, records) copies, records[name] gives a column
+        """
+        with self._lock:
+            if self._count <= self.capacity:
+                times = self._times[: self._count]
+                index = np.searchsorted(times, t, side="left")
+                return times[index:].copy(), self._records[index : self._count].copy()
+
+            # Two segments: [start, capacity) then [0, start)
+            start = self._count % self.capacity
+            older, newer = self._times[start:], self._times[:start]
+            if len(newer) and newer[0] < t:
+                index = np.searchsorted(newer, t, side="left")
+                return newer[index:].copy(), self._records[index:start].copy()
+            index = np.searchsorted(older, t, side="left")
+            return (
+                np.concatenate((older[index:], newer)),
+                np.concatenate((self._records[start + index :], self._records[:start])),
+            )
+
+    def last(self, n: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The n newest records, oldest first
+        :return: (times, records) copies
+        """
+        with self._lock:
+            n = min(n, len(self))
+            end = self._count % self.capacity
+            if n <= end:
+                return (
+                    self._times[end - n : end].copy(),
+                    self._records[end - n : end].copy(),
+                )
+            times, records = self._ordered()
+            return times[len(times) - n :].copy(), records[len(records) - n :].copy()
@@ -0,0 +1,219 @@
+from typing import Callable
+from logger import Logger, LogLevels
+import numpy as np
+import struct, threading
+
+# Record of a segment frame (Trajectory_Segment, teensy_moteur/lib/trajectory)
+SEGMENT_DTYPE = np.dtype(
+    [("duration_ms", "<u2"), ("left_speed", "<i2"), ("right_speed", "<i2")]
+)
+# msg_Trajectory_Status (teensy_moteur/include/messages.h), without the msg_type
+STATUS_STRUCT = struct.Struct("<HHHBB")
+# 1 + 40 * 6 = 241 bytes, still below 255 once sequenced (SEQUENCED | seq)
+MAX_SEGMENTS_PER_FRAME = 40
+COUNTER_MODULO = 1 << 16
+
+
+class TrajectoryStreamer:
+    """
+    Upload of timed velocity setpoints to a buffer of the firmware, which plays them
+    on its own clock (a setpoint no longer depends on the timing of the rasp).
+
+    The segments are packed by MAX_SEGMENTS_PER_FRAME in a frame (6 bytes each, instead
+    of one LR_MOTORS frame per setpoint). The firmware reports its counters of received
+    and played segments (status message), the rasp never has more than capacity
+    segments in flight: credits = capacity - (sent - played). The rest waits here and is
+    sent as the statuses come back.
+
+    The counters of the firmware start at its boot: until a first status with an empty
+    buffer, nothing is sent, an abort is sent instead to get one (see reset).
+
+    The legacy protocol does not resend a lost segments frame (a NACK resends the last
+    message only), its segments would keep their credits forever. The firmware sends a
+    status for each segments frame: when it reports an empty idle buffer while nothing
+    was sent since the previous status, the segments it did not count are lost, sent is
+    set back to its received counter (and to a later received counter ahead of sent).
+    """
+
+    def __init__(
+        self,
+        send: Callable[[bytes], object],
+        segments_type: int,
+        abort_type: int,
+        capacity: int = 128,
+        logger: Logger | None = None,
+    ) -> None:
+        """
+        :param send: sends msg_type | msg_data to the firmware (Teensy.send_bytes)
+        :param segments_type: id of the segments message
+        :param abort_type: id of the abort message
+        :param capacity: segments of the firmware buffer (TRAJECTORY_CAPACITY)
+        """
+        self._send = send
+        self.segments_type = segments_type
+        self.abort_type = abort_type
+        self.capacity = capacity
+        self.logger = logger
+        self._cond = threading.Condition()
+        self._pending = np.empty(0, dtype=SEGMENT_DTYPE)
+        self.frames_sent = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget the state of the firmware (board rebooted), the pending segments are kept
+        """
+        with self._cond:
+            self._synced = False
+            self._sync_requested = False
+            self.sent = 0  # modulo COUNTER_MODULO, in the counting of the firmware
+            self._status_sent = 0  # sent after the handling of the previous status
+            self.lost = 0
+            self.received = 0
+            self.played = 0
+            self.underruns = 0
+            self.starvations = 0
+            self.playing = False
+
+    @property
+    def credits(self) -> int:
+        if not self._synced:
+            return 0
+        return self.capacity - (self.sent - self.played) % COUNTER_MODULO
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def upload(self, durations: np.ndarray, left: np.ndarray, right: np.ndarray) -> int:
+        """
+        Queue segments after the ones already uploaded, and send what the credits allow
+        :param durations: of each segment, in seconds (rounded to the ms, 1 ms to 65 s)
+        :param left: signed PWM of the left wheel for each segment (-255 to 255)
+        :param right: signed PWM of the right wheel for each segment
+        :return: number of segments queued
+        """
+        durations = np.atleast_1d(np.asarray(durations, dtype=np.float64))
+        segments = np.empty(len(durations), dtype=SEGMENT_DTYPE)
+        segments["duration_ms"] = np.clip(np.rint(durations * 1e3), 1, 0xFFFF)
+        segments["left_speed"] = np.clip(np.rint(left), -255, 255)
+        segments["right_speed"] = np.clip(np.rint(right), -255, 255)
+        with self._cond:
+            self._pending = np.concatenate((self._pending, segments))
+            self._pump()
+        return len(segments)
+
+    def clear(self) -> None:
+        """
+        Drop the segments not sent yet, the firmware plays the ones it has
+        """
+        with self._cond:
+            self._pending = self._pending[:0]
+            self._cond.notify_all()
+
+    def abort(self):
+        """
+        Drop the pending segments and stop the playback of the firmware
+        """
+        with self._cond:
+            self._pending = self._pending[:0]
+            return self._send(bytes([self.abort_type]))
+
+    def on_status(self, msg: bytes) -> None:
+        """
+        Handler of the status message of the firmware
+        """
+        received, played, underruns, capacity, playing = STATUS_STRUCT.unpack_from(msg)
+        with self._cond:
+            if not self._synced:
+                if received != played or playing:
+                    return
+                # Empty buffer: nothing in flight, the counting starts from there
+                self._synced = True
+                self.sent = received
+                self._status_sent = received
+                self.underruns = underruns
+            self._resync(received, played, playing)
+            # The buffer also empties at the end of a trajectory, it ran dry only if
+            # segments were still to come
+            if underruns != self.underruns and (
+                len(self._pending) or (self.sent - played) % COUNTER_MODULO
+            ):
+                self.starvations += 1
+                if self.logger is not None:
+                    self.logger.log(
+                        "Trajectory buffer ran dry, the robot stopped",
+                        LogLevels.WARNING,
+                    )
+            self.received = received
+            self.played = played
+            self.underruns = underruns
+            self.capacity = capacity
+            self.playing = bool(playing)
+            self._pump()
+            self._status_sent = self.sent
+            self._cond.notify_all()
+
+    def _resync(self, received: int, played: int, playing: bool) -> None:
+        # Called with the lock held
+        missing = (self.sent - received) % COUNTER_MODULO
+        if not missing:
+            return
+        if missing > COUNTER_MODULO // 2:
+            # Segments counted as lost, received after all
+            self.sent = received
+        elif received == played and not playing and self.sent == self._status_sent:
+            self.lost += missing
+            self.sent = received
+            if self.logger is not None:
+                self.logger.log(
+                    f"Trajectory: {missing} segments lost on the link",
+                    LogLevels.WARNING,
+                )
+
+    def _pump(self) -> None:
+        # Called with the lock held
+        if not self._synced:
+            if len(self._pending) and not self._sync_requested:
+                self._sync_requested = True
+                self._send(bytes([self.abort_type]))
+            return
+        credits = self.credits
+        count = min(credits, len(self._pending))
+        if count < len(self._pending) and self.capacity - credits >= self.capacity // 4:
+            # Full frames only while the firmware has enough to play
+            count -= count % MAX_SEGMENTS_PER_FRAME
+        for start in range(0, count, MAX_SEGMENTS_PER_FRAME):
+            chunk = self._pending[start : min(start + MAX_SEGMENTS_PER_FRAME, count)]
+            self._send(bytes([self.segments_type]) + chunk.tobytes())
+            self.frames_sent += 1
+        self._pending = self._pending[count:]
+        self.sent = (self.sent + count) % COUNTER_MODULO
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Wait until every segment is sent and played
+        :return: False on timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not len(self._pending)
+                and (self.sent - self.played) % COUNTER_MODULO == 0
+                and not self.playing,
+                timeout,
+            )
+
+    def stats(self) -> dict:
+        return {
+            "synced": self._synced,
+            "pending": len(self._pending),
+            "credits": self.credits,
+            "sent": self.sent,
+            "received": self.received,
+            "played": self.played,
+            "underruns": self.underruns,
+            "starvations": self.starvations,
+            "lost": self.lost,
+            "playing": self.playing,
+            "frames_sent": self.frames_sent,
+        }
@@ -1,10 +1,12 @@
-from brain import Brain
+from brain import Brain, OverrunPolicies
 from logger import Logger, LogLevels
 from WS_comms import WSclientRouteManager
 
-from controllers import Pipou
+from controllers import Pipou, SetpointCoalescer, ControlLoop
+from planning import GridPlanner
 
 import asyncio
+from collections import deque
 
 # Import from common
 from config_loader import CONFIG
@@ -14,17 +16,107 @@ from brain import Brain
 from WS_comms import WSmsg, WServerRouteManager
 from logger import Logger, LogLevels
 
+
 class MainBrain(Brain):
+    # shared_self in a shared memory block (see SharedState), no manager process. No
+    # process task reads the state of this brain yet: no field, declare them with the
+    # task which needs them
+    shared_schema = {}
+
     def __init__(
         self,
         logger: Logger,
-        robot: Pipou,
-        ws_cmd: WSclientRouteManager
+        robot: Pipou | SetpointCoalescer,
+        ws_cmd: WSclientRouteManager,
+        control_loop: ControlLoop | None = None,
+        planner: GridPlanner | None = None,
     ) -> None:
         super().__init__(logger, self)
         self.robot = robot
         self.ws_cmd = ws_cmd
-    
+        # Setpoints with self.control_loop.setpoints.put((v, omega)), None without loop
+        self.control_loop = control_loop
+        # Paths around the static obstacles: self.planner.plan((x, y), (x, y))
+        self.planner = planner
+        # Connection changes of the Teensy, given by its threads (see teensy_connection)
+        self.teensy_state = robot.state.value
+        self._teensy_events = deque()
+        robot.add_connection_callback(self._teensy_events.append)
+        # Newest pose published by the odometry (see robot_pose)
+        self._pose = None
+        robot.odometry.add_listener(self._on_pose)
+
+    def _on_pose(self, pose):
+        self._pose = pose
+
+    @Brain.task(process=False, run_on_start=True, refresh_rate=0.1)
+    async def teensy_connection(self):
+        """
+        Tells the clients when the Teensy is lost (reset, unplugged) and when it is back
+        """
+        while self._teensy_events:
+            self.teensy_state = self._teensy_events.popleft().value
+            self.logger.log(f"Teensy {self.teensy_state}", LogLevels.INFO)
+            await self.ws_cmd.sender.send(
+                WSmsg(msg="teensy_connection", data=self.teensy_state)
+            )
+
+    @Brain.task(
+        process=False, run_on_start=True, refresh_rate=CONFIG.TEENSY_METRICS_PERIOD
+    )
+    async def teensy_link_metrics(self):
+        """
+        Sends the quality of the serial link to the clients (counters, line usage, RTT),
+        see Teensy.link_metrics
+        """
+        await self.ws_cmd.sender.send(
+            WSmsg(msg="teensy_link_metrics", data=self.robot.link_metrics())
+        )
+
+    @Brain.task(
+        process=False, run_on_start=True, refresh_rate=CONFIG.TEENSY_METRICS_PERIOD
+    )
+    async def control_loop_stats(self):
+        """
+        Sends the timing of the control loop to the clients (lateness, tick duration,
+        overruns), see ControlLoop.stats
+        """
+        if self.control_loop is not None:
+            await self.ws_cmd.sender.send(
+                WSmsg(msg="control_loop_stats", data=self.control_loop.stats())
+            )
+
+    @Brain.task(
+        process=False,
+        run_on_start=True,
+        refresh_rate=CONFIG.TEENSY_METRICS_PERIOD,
+    )
+    async def routine_stats(self):
+        """
+        Sends the timing of the fixed rate routines to the clients (period, jitter,
+        missed deadlines), see Brain.routine_stats
+        """
+        await self.ws_cmd.sender.send(
+            WSmsg(msg="brain_routine_stats", data=self.routine_stats())
+        )
+
+    @Brain.task(
+        process=False,
+        run_on_start=True,
+        refresh_rate=1 / CONFIG.ROLLING_BASIS_ODOMETRY_RATE,
+        fixed_rate=True,
+        overrun=OverrunPolicies.SKIP,
+    )
+    async def robot_pose(self):
+        """
+        Sends the pose of the robot and its covariance to the clients, see PoseEstimator
+        * At the odometry rate, on fixed deadlines: a late send does not shift the next ones,
+        the missed ones are skipped (only the newest pose matters)
+        """
+        pose, self._pose = self._pose, None
+        if pose is not None:
+            await self.ws_cmd.sender.send(WSmsg(msg="robot_pose", data=pose.to_dict()))
+
     @Brain.task(process=False, run_on_start=True, refresh_rate=0.01)
     async def zombie_mode(self):
         """
@@ -53,12 +145,13 @@ class MainBrain(Brain):
                     else:
                         eval(instruction)
 
+            elif cmd.msg == "plan_path" and self.planner is not None:
+                # data: {"start": [x, y], "goal": [x, y]}, the waypoints are sent back
+                path = self.planner.plan(cmd.data["start"], cmd.data["goal"])
+                await self.ws_cmd.sender.send(WSmsg(msg="path", data=path))
+
             else:
                 self.logger.log(
                     f"Command not implemented: {cmd.msg} / {cmd.data}",
                     LogLevels.WARNING,
                 )
-
-                
-                
-        
\ No newline at end of file
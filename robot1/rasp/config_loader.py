@@ -43,6 +43,26 @@ class CONFIG:
     TEENSY_BAUDRATE = GENERAL_TEENSY_CONFIG["baudrate"]
     TEENSY_CRC = GENERAL_TEENSY_CONFIG["crc"]
     TEENSY_DUMMY = GENERAL_TEENSY_CONFIG["dummy"]
+    TEENSY_TRANSPORT = GENERAL_TEENSY_CONFIG["transport"]
+    TEENSY_PROTOCOL = int(GENERAL_TEENSY_CONFIG["protocol"])
+    TEENSY_WINDOW = int(GENERAL_TEENSY_CONFIG["window"])
+    TEENSY_DISPATCH_WORKERS = int(GENERAL_TEENSY_CONFIG["dispatch_workers"])
+    TEENSY_CAPTURE = GENERAL_TEENSY_CONFIG["capture"]  # Capture file path or null
+    # SimulatedSerial options used in dummy mode, or null
+    TEENSY_SIMULATION = GENERAL_TEENSY_CONFIG["simulation"]
+    # Serial number -> device path file, null to walk the comports at each boot
+    TEENSY_DISCOVERY_CACHE = GENERAL_TEENSY_CONFIG["discovery_cache"]
+    # Seconds between two link metrics messages sent to the clients
+    TEENSY_METRICS_PERIOD = float(GENERAL_TEENSY_CONFIG["metrics_period"])
+
+    # Game table: size and resolution of the planning grid in m, static obstacles
+    # ({"type": "rectangle", "x0", "y0", "x1", "y1"} or {"type": "circle", "x", "y",
+    # "radius"}, see GridPlanner)
+    GENERAL_TABLE_CONFIG = GENERAL_CONFIG["table"]
+    TABLE_WIDTH = float(GENERAL_TABLE_CONFIG["width"])
+    TABLE_HEIGHT = float(GENERAL_TABLE_CONFIG["height"])
+    TABLE_RESOLUTION = float(GENERAL_TABLE_CONFIG["resolution"])
+    TABLE_OBSTACLES = GENERAL_TABLE_CONFIG["obstacles"]
 
     # Specific config
     SPECIFIC_CONFIG = CONFIG_STORE[SPECIFIC_CONFIG_KEY]
@@ -64,3 +84,38 @@ class CONFIG:
     # Rolling Basis
     ROLLING_BASIS_CONFIG = SPECIFIC_CONFIG["rolling_basis"]
     ROLLING_BASIS_TEENSY_SER = ROLLING_BASIS_CONFIG["rolling_basis_teensy_ser"]
+    ROLLING_BASIS_SETPOINT_COALESCING = ROLLING_BASIS_CONFIG["setpoint_coalescing"]
+    ROLLING_BASIS_SETPOINT_LINK_RATE = float(ROLLING_BASIS_CONFIG["setpoint_link_rate"])
+    # Kinematics of Pipou.drive: m, m/s at full PWM, m/s², m/s³ (0: no limit)
+    ROLLING_BASIS_WHEEL_BASE = float(ROLLING_BASIS_CONFIG["wheel_base"])
+    ROLLING_BASIS_MAX_WHEEL_SPEED = float(ROLLING_BASIS_CONFIG["max_wheel_speed"])
+    ROLLING_BASIS_MAX_ACCELERATION = float(ROLLING_BASIS_CONFIG["max_acceleration"])
+    ROLLING_BASIS_MAX_JERK = float(ROLLING_BASIS_CONFIG["max_jerk"])
+    # Odometry: encoder ticks per meter of wheel, wheel std after 1 m (m), poses per second
+    ROLLING_BASIS_TICKS_PER_METER = float(ROLLING_BASIS_CONFIG["ticks_per_meter"])
+    ROLLING_BASIS_WHEEL_NOISE = float(ROLLING_BASIS_CONFIG["wheel_noise"])
+    ROLLING_BASIS_ODOMETRY_RATE = float(ROLLING_BASIS_CONFIG["odometry_rate"])
+    # ControlLoop: ticks per second (0: no loop), SCHED_FIFO priority or null
+    ROLLING_BASIS_CONTROL_RATE = float(ROLLING_BASIS_CONFIG["control_rate"])
+    ROLLING_BASIS_CONTROL_PRIORITY = ROLLING_BASIS_CONFIG["control_priority"]
+
+    # Brain: routines of the main process from one RoutineScheduler task, its tick (s)
+    BRAIN_CONFIG = SPECIFIC_CONFIG["brain"]
+    BRAIN_CENTRAL_SCHEDULER = BRAIN_CONFIG["central_scheduler"]
+    BRAIN_SCHEDULER_TICK = float(BRAIN_CONFIG["scheduler_tick"])
+    # Warm processes of the one-shot process tasks (0: a process per run), runs and
+    # peak memory (MB, 0: no limit) of a worker before its replacement
+    BRAIN_WORKER_POOL_CONFIG = BRAIN_CONFIG["worker_pool"]
+    BRAIN_WORKER_POOL_SIZE = int(BRAIN_WORKER_POOL_CONFIG["size"])
+    BRAIN_WORKER_POOL_MAX_TASKS = int(BRAIN_WORKER_POOL_CONFIG["max_tasks"])
+    BRAIN_WORKER_POOL_MAX_MEMORY = float(BRAIN_WORKER_POOL_CONFIG["max_memory"])
+
+    # Path planner: robot radius and cost inflation margin (m), extra cost at the
+    # obstacles, fine cells per A* cell, ALT landmarks, paths cached
+    PLANNER_CONFIG = SPECIFIC_CONFIG["planner"]
+    PLANNER_ROBOT_RADIUS = float(PLANNER_CONFIG["robot_radius"])
+    PLANNER_INFLATION = float(PLANNER_CONFIG["inflation"])
+    PLANNER_INFLATION_COST = float(PLANNER_CONFIG["inflation_cost"])
+    PLANNER_COARSE = int(PLANNER_CONFIG["coarse"])
+    PLANNER_LANDMARKS = int(PLANNER_CONFIG["landmarks"])
+    PLANNER_CACHE_SIZE = int(PLANNER_CONFIG["cache_size"])
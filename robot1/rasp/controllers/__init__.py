@@ -1 +1,3 @@
 from controllers.rolling_basis import Pipou
+from controllers.setpoint_coalescer import SetpointCoalescer
+from controllers.control_loop import ControlLoop, Mailbox
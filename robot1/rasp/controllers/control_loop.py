@@ -0,0 +1,180 @@
+from controllers.rolling_basis import Pipou
+
+# Import from common
+from teensy_comms.link_metrics import RttHistogram
+from teensy_comms.teensy_comms import TeensyException
+from logger import LogLevels
+
+import os
+import threading
+import time
+
+
+class Mailbox:
+    """
+    Single slot between two threads: put() replaces the value, the readers always get
+    the newest one. A write is one reference assignment of a (version, value) tuple,
+    atomic in CPython: no lock, a slow reader never blocks the writer.
+    """
+
+    def __init__(self, value=None) -> None:
+        self._slot = (0, value)
+
+    def put(self, value) -> None:
+        version, _ = self._slot
+        self._slot = (version + 1, value)
+
+    def get(self):
+        return self._slot[1]
+
+    def read(self) -> tuple[int, object]:
+        """
+        :return: (version, value), the version changes at every put
+        """
+        return self._slot
+
+
+class ControlLoop:
+    """
+    Fixed rate loop driving Pipou from its own thread, out of the asyncio loop (WS
+    traffic, brain tasks) so that their delays do not reach the motors.
+
+    * Absolute deadlines (start + k * period): a late tick does not shift the next ones.
+    Each wait sleeps until spin seconds before the deadline, then spins on the clock
+    (time.sleep alone wakes up 50-100 us late, more under load). When a tick ends
+    after the next deadline, that deadline is skipped and counted as an overrun.
+    * Optionally SCHED_FIFO (root or CAP_SYS_NICE): the thread preempts the others.
+    * The brain gives (v, omega) in the setpoints mailbox (Pipou.drive does it while the
+    loop runs, Pipou.stop puts None), each tick ramps it (Pipou.drive_setpoint) and
+    sends a LR_MOTORS frame when the wheels change, under Pipou._drive_lock (a stop
+    cannot be overtaken by a tick). Each tick puts the pose and the wheel setpoints in
+    the state mailbox.
+    * lateness (wake up - deadline) and step (tick duration) are histograms
+    (see RttHistogram), given by stats().
+    """
+
+    def __init__(
+        self,
+        robot: Pipou,
+        rate: float = 200,
+        priority: int | None = None,
+        spin: float = 0.0003,
+    ) -> None:
+        """
+        :param robot: the rolling basis driven
+        :param rate: ticks per second
+        :param priority: SCHED_FIFO priority (1 to 99), None for the normal scheduler
+        :param spin: seconds spent spinning before each deadline
+        """
+        # The asyncio transport writes from its event loop only
+        if robot.transport != "thread":
+            raise TeensyException("The control loop needs the thread transport")
+        self.robot = robot
+        self.logger = robot.logger
+        self.period = 1 / rate
+        self.priority = priority
+        self.spin = spin
+
+        self.setpoints = Mailbox()  # (v, omega) from the brain
+        self.state = Mailbox()  # dict for the brain, see _tick
+
+        self.lateness = RttHistogram()
+        self.step = RttHistogram()
+        self.ticks = 0
+        self.overruns = 0
+        self.frames_sent = 0
+
+        self._last_wheels = None
+        self._running = False
+        self._thread = None
+
+    def start(self) -> None:
+        self._running = True
+        # Pipou.drive goes through the setpoints mailbox from now on
+        self.robot.control_loop = self
+        self._thread = threading.Thread(
+            target=self.__loop__, name="ControlLoop", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        self.robot.control_loop = None
+
+    def stats(self) -> dict:
+        return {
+            "rate": 1 / self.period,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "frames_sent": self.frames_sent,
+            "lateness": self.lateness.snapshot(),
+            "step": self.step.snapshot(),
+        }
+
+    def _set_priority(self) -> None:
+        if self.priority is None:
+            return
+        try:
+            # pid 0: the calling thread
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self.priority))
+        except (AttributeError, PermissionError) as e:
+            self.logger.log(
+                f"Control loop: SCHED_FIFO unavailable ({e}), normal scheduling",
+                LogLevels.WARNING,
+            )
+
+    def _wait(self, deadline: float) -> float:
+        """
+        Hybrid sleep until deadline (time.monotonic)
+        :return: the time of the wake up
+        """
+        remaining = deadline - time.monotonic() - self.spin
+        if remaining > 0:
+            time.sleep(remaining)
+        now = time.monotonic()
+        while now < deadline:
+            now = time.monotonic()
+        return now
+
+    def __loop__(self) -> None:
+        self._set_priority()
+        self.logger.log(
+            f"Control loop started, rate: {1 / self.period:.0f} Hz", LogLevels.INFO
+        )
+        deadline = time.monotonic()
+        while self._running:
+            now = self._wait(deadline)
+            self.lateness.add(now - deadline)
+            try:
+                self._tick(now)
+            except Exception as e:
+                self.logger.log(f"Control loop tick error: {e}", LogLevels.ERROR)
+            end = time.monotonic()
+            self.step.add(end - now)
+            self.ticks += 1
+
+            deadline += self.period
+            if end > deadline:
+                # The missed deadlines are skipped, the next ones stay on the grid
+                missed = int((end - deadline) / self.period) + 1
+                self.overruns += missed
+                deadline += missed * self.period
+
+    def _tick(self, now: float) -> None:
+        wheels = None
+        # Pipou.stop takes the same lock: a setpoint read before a stop is sent before
+        # its STOP, never after
+        with self.robot._drive_lock:
+            setpoint = self.setpoints.get()
+            if setpoint is None:
+                # Stopped (Pipou.stop): the next setpoint is sent whatever its value
+                self._last_wheels = None
+            else:
+                wheels = self.robot.drive_setpoint(*setpoint)
+                if wheels != self._last_wheels:
+                    self.robot.lr_motors(*wheels)
+                    self._last_wheels = wheels
+                    self.frames_sent += 1
+        self.state.put({"t": now, "pose": self.robot.odometry.pose, "wheels": wheels})
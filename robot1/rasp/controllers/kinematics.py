@@ -0,0 +1,114 @@
+import numpy as np
+import math
+
+
+class DiffDrive:
+    """
+    Kinematics of the rolling basis: (v, omega) of the robot <-> speed of each wheel.
+    * v in m/s (forward > 0), omega in rad/s (counterclockwise > 0).
+    * The motors are driven in open loop: the PWM is proportional to the wheel speed,
+    255 at max_wheel_speed.
+    * Too fast setpoints are scaled down on both wheels, so the curvature (omega / v)
+    is kept.
+    The conversions take scalars or numpy arrays (a whole planned trajectory at once).
+    """
+
+    def __init__(self, wheel_base: float, max_wheel_speed: float) -> None:
+        """
+        :param wheel_base: distance between the two wheels, in m
+        :param max_wheel_speed: speed of a wheel at full PWM, in m/s
+        """
+        self.wheel_base = wheel_base
+        self.max_wheel_speed = max_wheel_speed
+
+    def wheel_speeds(self, v, omega):
+        """
+        :return: (left, right) wheel speeds in m/s, clamped to max_wheel_speed
+        """
+        v = np.asarray(v, dtype=np.float64)
+        omega = np.asarray(omega, dtype=np.float64)
+        half_turn = omega * self.wheel_base / 2
+        left = v - half_turn
+        right = v + half_turn
+        # Same ratio on both wheels: the robot slows down on its path
+        scale = np.maximum(
+            np.maximum(np.abs(left), np.abs(right)) / self.max_wheel_speed, 1.0
+        )
+        return left / scale, right / scale
+
+    def robot_speed(self, left, right):
+        """
+        :return: (v, omega) of the robot from the wheel speeds
+        """
+        left = np.asarray(left, dtype=np.float64)
+        right = np.asarray(right, dtype=np.float64)
+        return (left + right) / 2, (right - left) / self.wheel_base
+
+    def to_pwm(self, wheel_speed):
+        """
+        :return: signed PWM (-255 to 255, int16) of wheel speeds in m/s
+        """
+        pwm = np.rint(np.asarray(wheel_speed) / self.max_wheel_speed * 255)
+        return np.clip(pwm, -255, 255).astype(np.int16)
+
+    def pwm(self, v, omega):
+        """
+        Batch conversion for the planners (see Pipou.drive_trajectory)
+        :return: (left, right) signed PWM arrays
+        """
+        left, right = self.wheel_speeds(v, omega)
+        return self.to_pwm(left), self.to_pwm(right)
+
+
+class JerkLimiter:
+    """
+    Rate limiter of a wheel speed: the acceleration is bounded by max_acceleration and
+    changes by at most max_jerk per second. Near the target the acceleration is brought
+    down to sqrt(2 * max_jerk * error), so the speed converges without overshoot.
+    """
+
+    def __init__(self, max_acceleration: float, max_jerk: float) -> None:
+        """
+        :param max_acceleration: in m/s², 0 to disable the limiter
+        :param max_jerk: in m/s³, 0 for an acceleration only limit
+        """
+        self.max_acceleration = max_acceleration
+        self.max_jerk = max_jerk
+        self.speed = 0.0
+        self.acceleration = 0.0
+
+    def reset(self, speed: float = 0.0) -> None:
+        self.speed = speed
+        self.acceleration = 0.0
+
+    def step(self, target: float, dt: float) -> float:
+        """
+        Move the speed towards target during dt seconds
+        :return: the new speed
+        """
+        if self.max_acceleration <= 0:
+            self.speed = target
+            return target
+        if dt <= 0:
+            return self.speed
+
+        error = target - self.speed
+        wanted = min(self.max_acceleration, abs(error) / dt)
+        if self.max_jerk > 0:
+            wanted = min(wanted, math.sqrt(2 * self.max_jerk * abs(error)))
+            wanted = math.copysign(wanted, error)
+            change = self.max_jerk * dt
+            wanted = min(
+                max(wanted, self.acceleration - change), self.acceleration + change
+            )
+        else:
+            wanted = math.copysign(wanted, error)
+        self.acceleration = wanted
+
+        speed = self.speed + self.acceleration * dt
+        # Never beyond the target
+        if (speed - target) * (self.speed - target) < 0:
+            speed = target
+            self.acceleration = 0.0
+        self.speed = speed
+        return speed
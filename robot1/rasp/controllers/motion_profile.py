@@ -0,0 +1,210 @@
+from functools import lru_cache
+import math
+
+import numpy as np
+
+# Quantization of the cache keys: 1 mm (or mrad) and 1e-3 of the limits units
+QUANTUM = 1e-3
+# Step of the sampled profiles, the trajectory segments are in ms
+SAMPLE_PERIOD = 0.01
+# Shortest sampled step (s): the Teensy clock is in ms, a shorter last step is merged
+# in the previous one (its mean velocity would be 0 / 0 at worst)
+MIN_STEP = 1e-3
+
+
+class MotionProfile:
+    """
+    Velocity profile of a move from rest to rest, as phases of constant jerk.
+    * Trapezoidal: acceleration, cruise, deceleration (the acceleration jumps).
+    * S-curve: the acceleration ramps at the jerk limit, 7 phases.
+    When the distance is too short to reach the limits, the peak velocity (and the peak
+    acceleration for an S-curve) is lowered so the move still ends at rest.
+    The position and the velocity are computed in closed form on arrays of times.
+    Instances are shared by the cache (see profile): they must not be modified.
+    """
+
+    def __init__(self, distance: float, phases: list[tuple[float, float, float]]):
+        """
+        :param distance: signed length of the move (m or rad)
+        :param phases: (duration, start acceleration, jerk) of each phase, for a positive
+        move, the sign of distance is applied to the results
+        """
+        self.distance = distance
+        self._sign = -1.0 if distance < 0 else 1.0
+        # A null move keeps one empty phase
+        phases = [phase for phase in phases if phase[0] > 0] or [(0.0, 0.0, 0.0)]
+        durations = np.array([phase[0] for phase in phases])
+        self._accelerations = np.array([phase[1] for phase in phases])
+        self._jerks = np.array([phase[2] for phase in phases])
+        self._starts = np.concatenate(([0.0], np.cumsum(durations)))
+        self.duration = float(self._starts[-1])
+
+        # Position and velocity at the start of each phase
+        self._positions = np.zeros(len(phases) + 1)
+        self._velocities = np.zeros(len(phases) + 1)
+        for k, (duration, acceleration, jerk) in enumerate(phases):
+            self._positions[k + 1] = _position(
+                self._positions[k], self._velocities[k], acceleration, jerk, duration
+            )
+            self._velocities[k + 1] = (
+                self._velocities[k] + acceleration * duration + jerk * duration**2 / 2
+            )
+        self.peak_velocity = float(self._sign * self._velocities.max())
+        self._samples = {}
+
+    def _phase(self, t: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        t = np.clip(t, 0.0, self.duration)
+        index = np.clip(
+            np.searchsorted(self._starts, t, side="right") - 1,
+            0,
+            len(self._starts) - 2,
+        )
+        return index, t - self._starts[index]
+
+    def position(self, t) -> np.ndarray:
+        """
+        :param t: seconds since the start, scalar or array (clamped to the move)
+        """
+        index, tau = self._phase(np.asarray(t, dtype=np.float64))
+        return self._sign * _position(
+            self._positions[index],
+            self._velocities[index],
+            self._accelerations[index],
+            self._jerks[index],
+            tau,
+        )
+
+    def velocity(self, t) -> np.ndarray:
+        index, tau = self._phase(np.asarray(t, dtype=np.float64))
+        return self._sign * (
+            self._velocities[index]
+            + self._accelerations[index] * tau
+            + self._jerks[index] * tau**2 / 2
+        )
+
+    def sample(self, period: float = SAMPLE_PERIOD) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Setpoints of the profile, e.g. for Pipou.drive_trajectory
+        :return: (durations, velocities): the velocity of each step is its mean one, so
+        the setpoints travel the exact distance; the last step may be shorter, or longer
+        by less than MIN_STEP. The arrays are shared (cached), read only.
+        """
+        if period not in self._samples:
+            times = np.append(np.arange(0.0, self.duration, period), self.duration)
+            if len(times) > 2 and times[-1] - times[-2] < MIN_STEP:
+                times = np.delete(times, -2)
+            durations = np.diff(times)
+            velocities = np.diff(self.position(times)) / durations
+            durations.flags.writeable = False
+            velocities.flags.writeable = False
+            self._samples[period] = (durations, velocities)
+        return self._samples[period]
+
+
+def _position(s0, v0, a0, jerk, tau):
+    return s0 + v0 * tau + a0 * tau**2 / 2 + jerk * tau**3 / 6
+
+
+##############
+# Generators #
+##############
+def trapezoidal(distance: float, v_max: float, a_max: float) -> MotionProfile:
+    """
+    :param distance: signed (m or rad)
+    :param v_max: cruise velocity limit, > 0
+    :param a_max: acceleration limit, > 0
+    """
+    if a_max <= 0:
+        raise ValueError(f"The acceleration limit must be > 0, not {a_max}")
+    length = abs(distance)
+    v_peak = min(v_max, math.sqrt(length * a_max))
+    t_acc = v_peak / a_max
+    t_cruise = (length - v_peak * t_acc) / v_peak if v_peak > 0 else 0.0
+    return MotionProfile(
+        distance,
+        [(t_acc, a_max, 0.0), (t_cruise, 0.0, 0.0), (t_acc, -a_max, 0.0)],
+    )
+
+
+def s_curve(distance: float, v_max: float, a_max: float, j_max: float) -> MotionProfile:
+    """
+    Jerk limited profile
+    :param j_max: jerk limit, > 0
+    """
+    if a_max <= 0 or j_max <= 0:
+        raise ValueError(
+            f"The acceleration and jerk limits must be > 0, not {a_max} and {j_max}"
+        )
+    length = abs(distance)
+    # Peak velocity: the ramps up and down must fit in the distance
+    v_peak = v_max
+    if _ramp_distance(v_peak, a_max, j_max) * 2 > length:
+        # a_max reached: v² / a + v a / j = length
+        ratio = a_max / j_max
+        v_peak = a_max / 2 * (-ratio + math.sqrt(ratio**2 + 4 * length / a_max))
+        if v_peak < a_max**2 / j_max:
+            # a_max not reached: 2 v sqrt(v / j) = length
+            v_peak = (length * math.sqrt(j_max) / 2) ** (2 / 3)
+
+    a_peak = min(a_max, math.sqrt(v_peak * j_max))
+    t_jerk = a_peak / j_max
+    t_acc = v_peak / a_peak - t_jerk if a_peak > 0 else 0.0
+    ramp = _ramp_distance(v_peak, a_max, j_max)
+    t_cruise = (length - 2 * ramp) / v_peak if v_peak > 0 else 0.0
+    return MotionProfile(
+        distance,
+        [
+            (t_jerk, 0.0, j_max),
+            (t_acc, a_peak, 0.0),
+            (t_jerk, a_peak, -j_max),
+            (max(t_cruise, 0.0), 0.0, 0.0),
+            (t_jerk, 0.0, -j_max),
+            (t_acc, -a_peak, 0.0),
+            (t_jerk, -a_peak, j_max),
+        ],
+    )
+
+
+def _ramp_distance(v_peak: float, a_max: float, j_max: float) -> float:
+    # Distance from rest to v_peak (symmetric ramp: mean velocity v_peak / 2)
+    if v_peak <= 0:
+        return 0.0
+    a_peak = min(a_max, math.sqrt(v_peak * j_max))
+    return v_peak / 2 * (v_peak / a_peak + a_peak / j_max)
+
+
+#########
+# Cache #
+#########
+def _quantize(value: float) -> int:
+    return round(value / QUANTUM)
+
+
+@lru_cache(maxsize=256)
+def _cached(distance: int, v_max: int, a_max: int, j_max: int) -> MotionProfile:
+    if j_max <= 0:
+        return trapezoidal(distance * QUANTUM, v_max * QUANTUM, a_max * QUANTUM)
+    return s_curve(
+        distance * QUANTUM, v_max * QUANTUM, a_max * QUANTUM, j_max * QUANTUM
+    )
+
+
+def profile(
+    distance: float, v_max: float, a_max: float, j_max: float = 0.0
+) -> MotionProfile:
+    """
+    Profile of a move, from a LRU cache keyed by the quantized parameters (QUANTUM):
+    the same move asked again costs a dict lookup, its samples are kept with it.
+    :param distance: signed, in m for a straight move, in rad for a rotation
+    :param j_max: jerk limit, 0 for a trapezoidal profile
+    """
+    return _cached(
+        _quantize(distance), _quantize(v_max), _quantize(a_max), _quantize(j_max)
+    )
+
+
+def cache_info():
+    """
+    Hits, misses and size of the profile cache (functools.lru_cache)
+    """
+    return _cached.cache_info()
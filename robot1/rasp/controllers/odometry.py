@@ -0,0 +1,304 @@
+from teensy_comms.telemetry import TelemetryRing
+
+# Import from common
+from logger import Logger, LogLevels
+
+from dataclasses import dataclass, field
+from typing import Callable
+import asyncio
+import math
+import threading
+import time
+
+import numpy as np
+
+TIME_MODULO = 1 << 32  # time_us of the Teensy, uint32
+TICKS_MODULO = 1 << 32  # encoder ticks, int32
+# The clocks of the Teensy and of the rasp drift apart (crystals), the offset between
+# them may grow by this much per second
+CLOCK_DRIFT = 1e-4
+
+
+@dataclass
+class Pose:
+    t: float  # time.monotonic of the rasp
+    x: float  # m
+    y: float  # m
+    theta: float  # rad, in [-pi, pi]
+    # Of (x, y, theta), grows with the distance travelled
+    covariance: np.ndarray = field(default_factory=lambda: np.zeros((3, 3)))
+
+    def to_dict(self) -> dict:
+        return {
+            "t": self.t,
+            "x": self.x,
+            "y": self.y,
+            "theta": self.theta,
+            "covariance": self.covariance.tolist(),
+        }
+
+
+class PoseEstimator:
+    """
+    Dead reckoning of the rolling basis from the encoder telemetry (Pipou.encoders).
+
+    * update() integrates the records received since the previous call at once: the
+    tick increments of the whole batch go through the differential drive model with
+    NumPy (cumulative sums, heading at the middle of each step).
+    * The covariance follows the usual model of wheel slip, a variance proportional to
+    the distance of each wheel (wheel_noise² per m), propagated exactly through the
+    batch (the step jacobians only move the heading column, their products are sums).
+    * The poses are also resampled on a regular grid (history_period), pose_at(t) is an
+    index computation and a linear interpolation, whatever the history length.
+    * The records are timestamped by the Teensy clock, mapped on time.monotonic with
+    the smallest transmission delay seen.
+    routine() runs update() at a fixed rate and gives each pose to the listeners.
+    """
+
+    def __init__(
+        self,
+        encoders: TelemetryRing,
+        wheel_base: float,
+        ticks_per_meter: float,
+        wheel_noise: float = 0.01,
+        rate: float = 50,
+        history_period: float = 0.005,
+        history_duration: float = 5.0,
+        logger: Logger | None = None,
+    ) -> None:
+        """
+        :param encoders: ring of the encoder telemetry (time_us, left_ticks, right_ticks)
+        :param wheel_base: distance between the two wheels, in m
+        :param ticks_per_meter: encoder ticks for one meter of a wheel
+        :param wheel_noise: standard deviation of a wheel after one meter, in m
+        :param rate: poses published per second by routine
+        :param history_period: step of the pose history, in s
+        :param history_duration: seconds of history kept for pose_at
+        """
+        self.encoders = encoders
+        self.wheel_base = wheel_base
+        self.ticks_per_meter = ticks_per_meter
+        self.wheel_noise = wheel_noise
+        self.rate = rate
+        self.history_period = history_period
+        self.logger = logger
+
+        self._lock = threading.Lock()
+        self._history_size = max(2, int(history_duration / history_period))
+        # x, y, unwrapped theta on the grid, index = absolute grid index % size
+        self._history = np.zeros((self._history_size, 3))
+        self._listeners: list[Callable[[Pose], None]] = []
+
+        self.lost_records = 0  # Overwritten in the ring before being integrated
+        self.reset()
+
+    def reset(self, x: float = 0.0, y: float = 0.0, theta: float = 0.0) -> None:
+        """
+        Set the pose (start of a match), the covariance and the history are cleared
+        """
+        with self._lock:
+            self._cursor = self.encoders.count
+            self._last = None  # (time_us unwrapped, left_ticks, right_ticks)
+            self._time_offset = None  # rasp time - Teensy time, in s
+            self._state = np.array([x, y, theta])  # theta unwrapped
+            self._covariance = np.zeros((3, 3))
+            self._last_t = None
+            self._grid_start = None  # time of the grid index 0
+            self._grid_count = 0  # grid points written
+            self.pose = Pose(time.monotonic(), x, y, _wrap(theta))
+
+    def add_listener(self, func: Callable[[Pose], None]) -> None:
+        """
+        Call func with each pose published by routine
+        """
+        self._listeners.append(func)
+
+    ###############
+    # Integration #
+    ###############
+    def update(self) -> Pose:
+        """
+        Integrate the encoder records received since the previous call
+        :return: the newest pose
+        """
+        count = self.encoders.count
+        new = count - self._cursor
+        if new <= 0:
+            return self.pose
+        if new > len(self.encoders):
+            self.lost_records += new - len(self.encoders)
+            new = len(self.encoders)
+        rx_times, records = self.encoders.last(new)
+        self._cursor = count
+
+        with self._lock:
+            self._integrate(rx_times, records)
+            return self.pose
+
+    def _integrate(self, rx_times: np.ndarray, records: np.ndarray) -> None:
+        # Teensy time unwrapped (uint32 us), rebased on the previous record
+        time_us = records["time_us"].astype(np.int64)
+        ticks = np.stack(
+            (records["left_ticks"], records["right_ticks"]), axis=1
+        ).astype(np.int64)
+        if self._last is None:
+            self._last = (int(time_us[0]), ticks[0].copy())
+            self._last_t = None
+        last_time, last_ticks = self._last
+        times = last_time + np.cumsum(
+            np.diff(time_us, prepend=last_time % TIME_MODULO) % TIME_MODULO
+        )
+        steps = np.diff(ticks, axis=0, prepend=last_ticks[None, :])
+        steps = (steps + TICKS_MODULO // 2) % TICKS_MODULO - TICKS_MODULO // 2
+        self._last = (int(times[-1]), ticks[-1].copy())
+
+        # Teensy clock -> rasp clock: the fastest frame gives the offset
+        teensy_s = times * 1e-6
+        offset = float(np.min(rx_times - teensy_s))
+        if self._time_offset is None:
+            self._time_offset = offset
+        else:
+            elapsed = teensy_s[-1] - (self._last_t - self._time_offset)
+            self._time_offset = min(
+                self._time_offset + CLOCK_DRIFT * max(elapsed, 0.0), offset
+            )
+        t = teensy_s + self._time_offset
+        if self._last_t is not None:
+            # The offset may have decreased: the times stay ordered
+            t = np.maximum(t, self._last_t)
+
+        # Differential drive model
+        d_left = steps[:, 0] / self.ticks_per_meter
+        d_right = steps[:, 1] / self.ticks_per_meter
+        distance = (d_left + d_right) / 2
+        d_theta = (d_right - d_left) / self.wheel_base
+        x0, y0, theta0 = self._state
+        theta = theta0 + np.cumsum(d_theta)
+        middle = theta - d_theta / 2
+        cos, sin = np.cos(middle), np.sin(middle)
+        x = x0 + np.cumsum(distance * cos)
+        y = y0 + np.cumsum(distance * sin)
+
+        self._propagate_covariance(d_left, d_right, distance, cos, sin, x, y)
+        previous_t = self._last_t
+        previous_state = self._state
+        self._state = np.array([x[-1], y[-1], theta[-1]])
+        self._last_t = float(t[-1])
+        self._record_history(
+            previous_t, previous_state, t, np.stack((x, y, theta), axis=1)
+        )
+        self.pose = Pose(
+            self._last_t,
+            float(x[-1]),
+            float(y[-1]),
+            _wrap(float(theta[-1])),
+            self._covariance.copy(),
+        )
+
+    def _propagate_covariance(self, d_left, d_right, distance, cos, sin, x, y):
+        """
+        P <- F P F^T + sum_k A_k G_k Q_k G_k^T A_k^T, with F the product of the step
+        jacobians I + c_k e3^T and A_k the product of the ones after step k
+        """
+        x0, y0, _ = self._state
+        # Translation of the whole batch, and the one left after each step
+        total = np.array([-(y[-1] - y0), x[-1] - x0])
+        after = np.stack((-(y[-1] - y), x[-1] - x), axis=1)
+
+        F = np.eye(3)
+        F[:2, 2] = total
+        covariance = F @ self._covariance @ F.T
+
+        # Jacobian of a step with respect to (d_left, d_right)
+        half = distance / (2 * self.wheel_base)
+        G = np.empty((len(distance), 3, 2))
+        G[:, 0, 0] = 0.5 * cos + half * sin
+        G[:, 0, 1] = 0.5 * cos - half * sin
+        G[:, 1, 0] = 0.5 * sin - half * cos
+        G[:, 1, 1] = 0.5 * sin + half * cos
+        G[:, 2, 0] = -1 / self.wheel_base
+        G[:, 2, 1] = 1 / self.wheel_base
+        # A_k G_k: the heading row moves the position by the translation left
+        G[:, :2, :] += after[:, :, None] * G[:, 2:3, :]
+        variances = self.wheel_noise**2 * np.stack(
+            (np.abs(d_left), np.abs(d_right)), axis=1
+        )
+        covariance += np.einsum("kij,kj,klj->il", G, variances, G)
+        self._covariance = covariance
+
+    ###########
+    # History #
+    ###########
+    def _record_history(self, previous_t, previous_state, t, states) -> None:
+        if self._grid_start is None:
+            self._grid_start = float(t[0])
+        if previous_t is not None:
+            t = np.concatenate(([previous_t], t))
+            states = np.concatenate((previous_state[None, :], states))
+        end = int((t[-1] - self._grid_start) // self.history_period) + 1
+        if end <= self._grid_count:
+            return
+        start = max(self._grid_count, end - self._history_size)
+        grid = self._grid_start + np.arange(start, end) * self.history_period
+        indices = np.arange(start, end) % self._history_size
+        for column in range(3):
+            self._history[indices, column] = np.interp(grid, t, states[:, column])
+        self._grid_count = end
+
+    def pose_at(self, t: float) -> tuple[float, float, float] | None:
+        """
+        Pose of the robot at the time t (time.monotonic), interpolated in O(1)
+        :return: (x, y, theta), None if t is out of the history
+        """
+        with self._lock:
+            if self._grid_start is None or not self._grid_start <= t <= self._last_t:
+                return None
+            position = (t - self._grid_start) / self.history_period
+            index = int(position)
+            oldest = max(self._grid_count - self._history_size, 0)
+            if index < oldest:
+                return None
+            if index + 1 < self._grid_count:
+                before = self._history[index % self._history_size]
+                after = self._history[(index + 1) % self._history_size]
+                ratio = position - index
+            else:
+                # Between the last grid point and the newest pose
+                before = self._history[(self._grid_count - 1) % self._history_size]
+                after = self._state
+                last_grid = self._grid_start + (self._grid_count - 1) * (
+                    self.history_period
+                )
+                span = self._last_t - last_grid
+                ratio = (t - last_grid) / span if span > 0 else 1.0
+            x, y, theta = before + (after - before) * ratio
+            return float(x), float(y), _wrap(float(theta))
+
+    ##############
+    # Publishing #
+    ##############
+    async def routine(self) -> None:
+        """
+        Integrate and publish the pose at the rate, to be added as a background task.
+        """
+        if self.logger is not None:
+            self.logger.log(
+                f"Pose estimator started, rate: {self.rate} Hz", LogLevels.INFO
+            )
+        period = 1 / self.rate
+        next_time = time.monotonic()
+        while True:
+            try:
+                pose = self.update()
+                for listener in self._listeners:
+                    listener(pose)
+            except Exception as error:
+                if self.logger is not None:
+                    self.logger.log(f"Pose estimator error: {error}", LogLevels.ERROR)
+            # From the planned time, so the rate does not drift
+            next_time += period
+            await asyncio.sleep(max(next_time - time.monotonic(), 0))
+
+
+def _wrap(angle: float) -> float:
+    return math.atan2(math.sin(angle), math.cos(angle))
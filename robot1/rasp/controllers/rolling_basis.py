@@ -2,14 +2,22 @@ from config_loader import CONFIG
 
 # Import from common
 from teensy_comms import Teensy
+from teensy_comms.hub import TeensyHub
+from teensy_comms.trajectory import TrajectoryStreamer
+from teensy_comms.connection import ConnectionState
+from controllers.kinematics import DiffDrive, JerkLimiter
+from controllers.odometry import PoseEstimator
+from controllers import motion_profile
 from logger import Logger, LogLevels
 from utils import Utils
 
 import struct
 import math
+import numpy as np
 import asyncio
-from enum import Enum
+from enum import Enum, IntEnum
 from dataclasses import dataclass
+import threading
 import time
 
 
@@ -19,7 +27,43 @@ class Command(Enum):
     L_MOTOR = b"\x03"
     R_MOTOR = b"\x04"
     STOP = b"\x05"
-    INVALID = b"\xFF"
+    INVALID = b"\xff"
+
+
+class CommandId(IntEnum):
+    # rasp -> teensy, same ids as teensy_moteur/lib/actions/include/commands.h
+    VROUM = 0
+    ROTATE = 1
+    L_MOTOR = 2
+    R_MOTOR = 3
+    STOP = 4
+    LR_MOTORS = 5
+    TRAJECTORY_SEGMENTS = 6
+    TRAJECTORY_ABORT = 7
+
+
+class TelemetryId(IntEnum):
+    # teensy -> rasp, same ids as teensy_moteur/lib/actions/include/commands.h
+    ENCODERS = 131
+    MOTORS = 132
+    TRAJECTORY_STATUS = 133
+
+
+# Longest time step of the drive limiters: after a pause, the first setpoint ramps from
+# the previous speed instead of jumping to the target
+DRIVE_MAX_DT = 0.1
+
+
+# Record layouts of the telemetry messages (see teensy_moteur/include/messages.h),
+# a frame can carry several records
+ENCODERS_RECORD = [("time_us", "<u4"), ("left_ticks", "<i4"), ("right_ticks", "<i4")]
+MOTORS_RECORD = [
+    ("time_us", "<u4"),
+    ("left_current", "<i2"),  # mA
+    ("right_current", "<i2"),  # mA
+    ("left_pwm", "u1"),
+    ("right_pwm", "u1"),
+]
 
 
 @dataclass
@@ -31,8 +75,6 @@ class Instruction:
         return f"cmd:{self.cmd}, msg:{self.msg}"
 
 
-
-
 class Pipou(Teensy):
     ######################
     # Rolling basis init #
@@ -46,82 +88,270 @@ class Pipou(Teensy):
         pid: int = CONFIG.TEENSY_PID,
         baudrate: int = CONFIG.TEENSY_BAUDRATE,
         dummy: bool = CONFIG.TEENSY_DUMMY,
+        transport: str = CONFIG.TEENSY_TRANSPORT,
+        protocol: int = CONFIG.TEENSY_PROTOCOL,
+        window: int = CONFIG.TEENSY_WINDOW,
+        dispatch_workers: int = CONFIG.TEENSY_DISPATCH_WORKERS,
+        capture: str | None = CONFIG.TEENSY_CAPTURE,
+        replay: str | None = None,
+        replay_speed: float = 1.0,
+        simulation: dict | None = CONFIG.TEENSY_SIMULATION,
+        hub: TeensyHub | None = None,
+        discovery_cache: str | None = CONFIG.TEENSY_DISCOVERY_CACHE,
+        wheel_base: float = CONFIG.ROLLING_BASIS_WHEEL_BASE,
+        max_wheel_speed: float = CONFIG.ROLLING_BASIS_MAX_WHEEL_SPEED,
+        max_acceleration: float = CONFIG.ROLLING_BASIS_MAX_ACCELERATION,
+        max_jerk: float = CONFIG.ROLLING_BASIS_MAX_JERK,
+        ticks_per_meter: float = CONFIG.ROLLING_BASIS_TICKS_PER_METER,
+        wheel_noise: float = CONFIG.ROLLING_BASIS_WHEEL_NOISE,
+        odometry_rate: float = CONFIG.ROLLING_BASIS_ODOMETRY_RATE,
     ):
+        """
+        Trajectories played by the Teensy from its buffer, see upload_trajectory.
+        """
+        self.trajectory = TrajectoryStreamer(
+            self.send_bytes,
+            CommandId.TRAJECTORY_SEGMENTS,
+            CommandId.TRAJECTORY_ABORT,
+            logger=logger,
+        )
         super().__init__(
-            logger, ser=ser, vid=vid, pid=pid, baudrate=baudrate, crc=crc, dummy=dummy
+            logger,
+            ser=ser,
+            vid=vid,
+            pid=pid,
+            baudrate=baudrate,
+            crc=crc,
+            dummy=dummy,
+            transport=transport,
+            protocol=protocol,
+            window=window,
+            dispatch_workers=dispatch_workers,
+            capture=capture,
+            replay=replay,
+            replay_speed=replay_speed,
+            simulation=simulation,
+            hub=hub,
+            discovery_cache=discovery_cache,
+            # This is used to match a handling function to a message type, in place
+            # before the receiver starts. add_callback can also be used.
+            messagetype={
+                130: self.rcv_print,  # \x82
+                255: self.rcv_unknown_msg,
+                TelemetryId.TRAJECTORY_STATUS: self.trajectory.on_status,
+            },
+            telemetry={
+                TelemetryId.ENCODERS: ENCODERS_RECORD,
+                TelemetryId.MOTORS: MOTORS_RECORD,
+            },
+        )
+        self.add_connection_callback(self.on_connection)
+        """
+        Kinematics of drive(v, omega), with a jerk limited ramp on each wheel.
+        """
+        self.kinematics = DiffDrive(wheel_base, max_wheel_speed)
+        self._left_limiter = JerkLimiter(max_acceleration, max_jerk)
+        self._right_limiter = JerkLimiter(max_acceleration, max_jerk)
+        self._last_drive = 0.0
+        # The limiters and _last_drive are shared by the callers of drive_setpoint, a
+        # ControlLoop tick holds it from the read of its setpoint to the sent frame
+        self._drive_lock = threading.RLock()
+        # ControlLoop driving the motors while it runs, see drive
+        self.control_loop = None
+        """
+        Telemetry, decoded in ring buffers: self.encoders.latest(), self.motors.since(t)...
+        """
+        self.encoders = self.telemetry[TelemetryId.ENCODERS]
+        self.motors = self.telemetry[TelemetryId.MOTORS]
+        """
+        Pose of the robot from the encoders: self.odometry.pose, self.odometry.pose_at(t),
+        its routine has to be added as a background task.
+        """
+        self.odometry = PoseEstimator(
+            self.encoders,
+            wheel_base,
+            ticks_per_meter,
+            wheel_noise=wheel_noise,
+            rate=odometry_rate,
+            logger=self.logger,
         )
         """
-        This is used to match a handling function to a message type.
-        add_callback can also be used.
+        Layout of the msg_data of each command (struct format, see messages.h).
         """
-        self.messagetype = {
-            130: self.rcv_print,  # \x82
-            255: self.rcv_unknown_msg,
-        }
+        self.codec.register(CommandId.VROUM, "H?")
+        self.codec.register(CommandId.ROTATE, "H?")
+        self.codec.register(CommandId.L_MOTOR, "H?")
+        self.codec.register(CommandId.R_MOTOR, "H?")
+        self.codec.register(CommandId.STOP)
+        self.codec.register(CommandId.LR_MOTORS, "H?H?")
 
     #############################
     # Received message handling #
     #############################
     def rcv_print(self, msg: bytes):
         self.logger.log(
-            "Teensy says : " + msg.decode("ascii", errors="ignore"), LogLevels.INFO
+            "Teensy says : " + str(msg, "ascii", errors="ignore"), LogLevels.INFO
         )
 
+    def on_connection(self, state: ConnectionState):
+        # The board may have rebooted, the trajectory counters start again
+        if state == ConnectionState.CONNECTED:
+            self.trajectory.reset()
+
     def rcv_unknown_msg(self, msg: bytes):
         self.logger.log(
             f"Teensy does not know the command {msg.hex()}", LogLevels.WARNING
         )
 
-   ##################
-   # Messaging part #
-   ##################
+    ##################
+    # Messaging part #
+    ##################
+    # With the asyncio transport, every command returns a future which can be awaited
+    # (await pipou.l_motor(...)), with the thread transport they return None.
     def vromm(self, speed: int, direction: bool):
         """
         Send a vromm command to the Teensy.
         """
-        msg = (
-            b"\x00"
-            + struct.pack("<H", speed)
-            + struct.pack("<?", direction)            
-        )
-        self.send_bytes(msg)
-        
+        return self.send_command(CommandId.VROUM, speed, direction)
+
     def rotate(self, speed: int, direction: bool):
         """
         Send a rotate command to the Teensy.
         """
-        msg = (
-            b"\x01"
-            + struct.pack("<H", speed)
-            + struct.pack("<?", direction)            
-        )
-        self.send_bytes(msg)
-        
+        return self.send_command(CommandId.ROTATE, speed, direction)
+
     def l_motor(self, speed: int, direction: bool):
         """
         Control the left motor of the robot.
         """
-        msg = (
-            b"\x02"
-            + struct.pack("<H", speed)
-            + struct.pack("<?", direction)            
-        )
-        self.send_bytes(msg)
-        
+        return self.send_command(CommandId.L_MOTOR, speed, direction)
+
     def r_motor(self, speed: int, direction: bool):
         """
         Control the right motor of the robot.
         """
-        msg = (
-            b"\x03"
-            + struct.pack("<H", speed)
-            + struct.pack("<?", direction)            
+        return self.send_command(CommandId.R_MOTOR, speed, direction)
+
+    def lr_motors(
+        self, l_speed: int, l_direction: bool, r_speed: int, r_direction: bool
+    ):
+        """
+        Control both motors of the robot with a single frame.
+        """
+        return self.send_command(
+            CommandId.LR_MOTORS, l_speed, l_direction, r_speed, r_direction
         )
-        self.send_bytes(msg)
-        
+
     def stop(self):
         """
-        Send a stop command to the Teensy.
+        Send a stop command to the Teensy, it also aborts the trajectory.
+        """
+        self.trajectory.clear()
+        # Under the lock of the ControlLoop ticks: a tick cannot send its setpoint
+        # after the STOP
+        with self._drive_lock:
+            if self.control_loop is not None:
+                self.control_loop.setpoints.put(None)
+            self._left_limiter.reset()
+            self._right_limiter.reset()
+            return self.send_command(CommandId.STOP)
+
+    def drive_setpoint(self, v: float, omega: float) -> tuple[int, bool, int, bool]:
+        """
+        Wheel setpoints of a robot speed, clamped and ramped since the previous call.
+        The limits apply between two calls: the setpoint has to be sent periodically
+        (a controller does), a single call only moves by DRIVE_MAX_DT.
+        :param v: forward speed, in m/s
+        :param omega: rotation speed, in rad/s (counterclockwise)
+        :return: (l_speed, l_direction, r_speed, r_direction) of lr_motors
+        """
+        left, right = self.kinematics.wheel_speeds(v, omega)
+        with self._drive_lock:
+            now = time.monotonic()
+            dt = min(now - self._last_drive, DRIVE_MAX_DT)
+            self._last_drive = now
+            left = self._left_limiter.step(float(left), dt)
+            right = self._right_limiter.step(float(right), dt)
+        l_pwm = int(self.kinematics.to_pwm(left))
+        r_pwm = int(self.kinematics.to_pwm(right))
+        return abs(l_pwm), l_pwm >= 0, abs(r_pwm), r_pwm >= 0
+
+    def drive(self, v: float, omega: float):
+        """
+        Drive the robot at v m/s and omega rad/s, both wheels updated by a single frame
+        (see drive_setpoint).
+        While a ControlLoop runs, the setpoint goes to its mailbox: the loop is the only
+        one ramping and sending the drive setpoints (stop clears the mailbox).
+        """
+        if self.control_loop is not None:
+            self.control_loop.setpoints.put((v, omega))
+            return None
+        return self.lr_motors(*self.drive_setpoint(v, omega))
+
+    def drive_trajectory(self, durations, v, omega) -> int:
+        """
+        Upload a planned trajectory of (v, omega) setpoints, converted at once.
+        The planner is in charge of the acceleration limits.
+        :param durations: of each setpoint, in seconds
+        :return: number of setpoints queued
+        """
+        return self.upload_trajectory(durations, *self.kinematics.pwm(v, omega))
+
+    def straight(self, distance: float, speed: float | None = None, s_curve=True):
+        """
+        Move forward (backward if distance < 0) and stop, with a velocity profile played
+        by the Teensy (see motion_profile and drive_trajectory).
+        :param distance: in m
+        :param speed: cruise speed in m/s, defaults to max_wheel_speed
+        :param s_curve: jerk limited profile, trapezoidal otherwise
+        :return: the profile (duration, velocity(t)...)
+        :raises ValueError: max_acceleration is 0 (no limit for the limiters, but a
+        profile needs one)
+        """
+        limiter = self._left_limiter
+        profile = motion_profile.profile(
+            distance,
+            speed or self.kinematics.max_wheel_speed,
+            limiter.max_acceleration,
+            limiter.max_jerk if s_curve else 0.0,
+        )
+        durations, v = profile.sample()
+        self.drive_trajectory(durations, v, np.zeros_like(v))
+        return profile
+
+    def turn(self, angle: float, speed: float | None = None, s_curve=True):
+        """
+        Rotate on the spot (counterclockwise if angle > 0) and stop, see straight.
+        The wheel limits are converted to the rotation: omega = 2 v / wheel_base.
+        :param angle: in rad
+        :param speed: rotation speed in rad/s, defaults to the max wheel speed one
+        """
+        to_rotation = 2 / self.kinematics.wheel_base
+        limiter = self._left_limiter
+        profile = motion_profile.profile(
+            angle,
+            speed or self.kinematics.max_wheel_speed * to_rotation,
+            limiter.max_acceleration * to_rotation,
+            limiter.max_jerk * to_rotation if s_curve else 0.0,
+        )
+        durations, omega = profile.sample()
+        self.drive_trajectory(durations, np.zeros_like(omega), omega)
+        return profile
+
+    def upload_trajectory(self, durations, l_speeds, r_speeds) -> int:
+        """
+        Queue velocity setpoints played by the Teensy one after the other, on its own clock.
+        They are sent as the buffer of the Teensy empties (see TrajectoryStreamer),
+        a new upload is played after the previous one.
+        :param durations: of each setpoint, in seconds
+        :param l_speeds: signed PWM of the left motor (-255 to 255, negative: backward)
+        :param r_speeds: signed PWM of the right motor
+        :return: number of setpoints queued
+        """
+        return self.trajectory.upload(durations, l_speeds, r_speeds)
+
+    def abort_trajectory(self):
+        """
+        Stop the trajectory being played, the setpoints not played are dropped.
         """
-        msg = b"\x04"
-        self.send_bytes(msg)
\ No newline at end of file
+        return self.trajectory.abort()
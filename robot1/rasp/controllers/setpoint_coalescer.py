@@ -0,0 +1,143 @@
+from controllers.rolling_basis import Pipou
+
+# Import from common
+from logger import LogLevels
+
+import asyncio
+
+
+class SetpointCoalescer:
+    """
+    Put in front of Pipou, it keeps only the newest setpoint of each wheel and sends them
+    at a fixed link rate, so stale setpoints never queue up on the serial link.
+    * It has the same motion methods as Pipou (vromm, rotate, l_motor, r_motor, drive,
+    stop), so zombie mode instructions like "self.robot.l_motor(...)" work unchanged.
+    * vromm and rotate are stored as their effect on each wheel (as the firmware does).
+    * When both wheels changed since the last flush, a single LR_MOTORS frame is sent.
+    * stop is never delayed: it is sent immediately and discards the pending setpoints.
+    * Any other attribute is read from the Pipou.
+    """
+
+    def __init__(self, robot: Pipou, link_rate: float = 50) -> None:
+        """
+        :param robot: the rolling basis receiving the setpoints
+        :param link_rate: number of flushes per second
+        """
+        self.robot = robot
+        self.link_rate = link_rate
+
+        # (speed, direction) of each wheel, None when nothing is pending
+        self._left = None
+        self._right = None
+
+        self.received = 0  # Setpoints given to the coalescer
+        self.dropped = 0  # Setpoints replaced by a newer one before being sent
+        self.merged = 0  # L/R pairs sent as a single LR_MOTORS frame
+        self.sent = 0  # Frames sent
+
+    @property
+    def period(self) -> float:
+        return 1 / self.link_rate
+
+    def __getattr__(self, item):
+        # Only called when the attribute is not found on the coalescer
+        return getattr(self.robot, item)
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "dropped": self.dropped,
+            "merged": self.merged,
+            "sent": self.sent,
+        }
+
+    ##############
+    # Setpoints  #
+    ##############
+    def _set_left(self, speed: int, direction: bool) -> None:
+        self.received += 1
+        if self._left is not None:
+            self.dropped += 1
+        self._left = (speed, direction)
+
+    def _set_right(self, speed: int, direction: bool) -> None:
+        self.received += 1
+        if self._right is not None:
+            self.dropped += 1
+        self._right = (speed, direction)
+
+    def vromm(self, speed: int, direction: bool) -> None:
+        self._set_left(speed, direction)
+        self._set_right(speed, direction)
+
+    def rotate(self, speed: int, direction: bool) -> None:
+        self._set_left(speed, not direction)
+        self._set_right(speed, direction)
+
+    def l_motor(self, speed: int, direction: bool) -> None:
+        self._set_left(speed, direction)
+
+    def r_motor(self, speed: int, direction: bool) -> None:
+        self._set_right(speed, direction)
+
+    def drive(self, v: float, omega: float) -> None:
+        if self.robot.control_loop is not None:
+            # The control loop ramps and sends it (see Pipou.drive)
+            return self.robot.drive(v, omega)
+        # Ramped at each call, as Pipou.drive, only the newest setpoint is sent
+        l_speed, l_direction, r_speed, r_direction = self.robot.drive_setpoint(v, omega)
+        self._set_left(l_speed, l_direction)
+        self._set_right(r_speed, r_direction)
+
+    def stop(self):
+        if self._left is not None:
+            self.dropped += 1
+        if self._right is not None:
+            self.dropped += 1
+        self._left = None
+        self._right = None
+        self.sent += 1
+        return self.robot.stop()
+
+    ############
+    # Flushing #
+    ############
+    def flush(self):
+        """
+        Send the pending setpoints, in one frame if both wheels changed.
+        :return: what the Pipou command returned (future with the asyncio transport)
+        """
+        left, right = self._left, self._right
+        self._left = None
+        self._right = None
+
+        if left is not None and right is not None:
+            self.merged += 1
+            self.sent += 1
+            return self.robot.lr_motors(*left, *right)
+        if left is not None:
+            self.sent += 1
+            return self.robot.l_motor(*left)
+        if right is not None:
+            self.sent += 1
+            return self.robot.r_motor(*right)
+        return None
+
+    async def routine(self) -> None:
+        """
+        Flush the setpoints at the link rate, to be added as a background task.
+        """
+        self.robot.logger.log(
+            f"Setpoint coalescer started, link rate: {self.link_rate} Hz",
+            LogLevels.INFO,
+        )
+        while True:
+            try:
+                sending = self.flush()
+                if sending is not None:
+                    await sending
+            except Exception as error:
+                self.robot.logger.log(
+                    f"Setpoint coalescer flush error: {error}", LogLevels.ERROR
+                )
+            await asyncio.sleep(self.period)
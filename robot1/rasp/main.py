@@ -5,18 +5,19 @@ import math
 # Import from common
 from logger import Logger, LogLevels
 from WS_comms import WServerRouteManager, WSender, WSreceiver, WServer
-
+from planning import GridPlanner
+from brain import WorkerPool
 
 # Import from local path
 from brains import MainBrain
-from controllers import Pipou
+from controllers import Pipou, SetpointCoalescer, ControlLoop
 
 if __name__ == "__main__":
     """
     ###--- Initialization ---###
     """
     # State strip leds
-    #leds = LEDStrip(**CONFIG.LED_STRIP_CONFIG)
+    # leds = LEDStrip(**CONFIG.LED_STRIP_CONFIG)
 
     # Loggers
     logger_brain = Logger(
@@ -37,7 +38,7 @@ if __name__ == "__main__":
         print_log_level=LogLevels.DEBUG,
         file_log_level=LogLevels.DEBUG,
     )
-    
+
     # Websocket server
     ws_server = WServer(
         logger=logger_ws_server,
@@ -45,26 +46,81 @@ if __name__ == "__main__":
         port=CONFIG.WS_PORT,
         ping_pong_clients_interval=CONFIG.WS_PING_PONG_INTERVAL,
     )
-    
+
     ws_cmd = WServerRouteManager(
         WSreceiver(use_queue=True), WSender(CONFIG.WS_SENDER_NAME)
     )
-    
+
     ws_server.add_route_handler(CONFIG.WS_CMD_ROUTE, ws_cmd)
 
     # Robot
     pipou = Pipou(logger=logger_rolling_basis)
+    # Only the newest motor setpoints are sent, at the link rate
+    robot = pipou
+    if CONFIG.ROLLING_BASIS_SETPOINT_COALESCING:
+        robot = SetpointCoalescer(
+            pipou, link_rate=CONFIG.ROLLING_BASIS_SETPOINT_LINK_RATE
+        )
+    # Fixed rate drive loop on its own thread (control_rate > 0), fed by
+    # brain.control_loop.setpoints: robot.drive(v, omega) goes there while it runs
+    control_loop = None
+    if CONFIG.ROLLING_BASIS_CONTROL_RATE > 0 and CONFIG.TEENSY_TRANSPORT != "thread":
+        logger_rolling_basis.log(
+            "control_rate is ignored: the control loop needs the thread transport, "
+            f"not {CONFIG.TEENSY_TRANSPORT}",
+            LogLevels.WARNING,
+        )
+    elif CONFIG.ROLLING_BASIS_CONTROL_RATE > 0:
+        control_loop = ControlLoop(
+            pipou,
+            rate=CONFIG.ROLLING_BASIS_CONTROL_RATE,
+            priority=CONFIG.ROLLING_BASIS_CONTROL_PRIORITY,
+        )
+        control_loop.start()
+
+    # Path planner of the table, the distance transform is computed here, once
+    planner = GridPlanner(
+        width=CONFIG.TABLE_WIDTH,
+        height=CONFIG.TABLE_HEIGHT,
+        resolution=CONFIG.TABLE_RESOLUTION,
+        obstacles=CONFIG.TABLE_OBSTACLES,
+        robot_radius=CONFIG.PLANNER_ROBOT_RADIUS,
+        inflation=CONFIG.PLANNER_INFLATION,
+        inflation_cost=CONFIG.PLANNER_INFLATION_COST,
+        coarse=CONFIG.PLANNER_COARSE,
+        landmarks=CONFIG.PLANNER_LANDMARKS,
+        cache_size=CONFIG.PLANNER_CACHE_SIZE,
+    )
 
     # Brain
-    #leds.set_is_ready()
+    # leds.set_is_ready()
     brain = MainBrain(
         logger=logger_brain,
-        robot=pipou,
-        ws_cmd=ws_cmd
+        robot=robot,
+        ws_cmd=ws_cmd,
+        control_loop=control_loop,
+        planner=planner,
     )
-    
+
     # Add background tasks, in format ws_server.add_background_task(func, func_params)
-    for routine in brain.get_tasks():
+    if CONFIG.TEENSY_TRANSPORT == "asyncio":
+        ws_server.add_background_task(pipou.connect_async)
+    if CONFIG.ROLLING_BASIS_SETPOINT_COALESCING:
+        ws_server.add_background_task(robot.routine)
+    ws_server.add_background_task(pipou.odometry.routine)
+    # Warm processes for the one-shot process tasks, forked by get_tasks
+    worker_pool = None
+    if CONFIG.BRAIN_WORKER_POOL_SIZE > 0:
+        worker_pool = WorkerPool(
+            size=CONFIG.BRAIN_WORKER_POOL_SIZE,
+            max_tasks=CONFIG.BRAIN_WORKER_POOL_MAX_TASKS,
+            max_memory=CONFIG.BRAIN_WORKER_POOL_MAX_MEMORY,
+        )
+    for routine in brain.get_tasks(
+        central_scheduler=CONFIG.BRAIN_CENTRAL_SCHEDULER,
+        scheduler_tick=CONFIG.BRAIN_SCHEDULER_TICK,
+        worker_pool=worker_pool,
+    ):
         ws_server.add_background_task(routine)
 
     ws_server.run()
@@ -34,3 +34,43 @@ struct msg_STOP
 {
     byte command = STOP;
 };
+
+// Both wheels updated by the same frame
+struct msg_LR_MOTORS
+{
+    byte command = LR_MOTORS_CONTROL;
+    uint16_t l_speed;
+    bool l_direction;
+    uint16_t r_speed;
+    bool r_direction;
+};
+
+// Telemetry (teensy -> rasp): msg_type followed by one or more records,
+// see TelemetryRing in common/teensy_comms/telemetry.py
+struct msg_Encoders_Record
+{
+    uint32_t time_us;
+    int32_t left_ticks;
+    int32_t right_ticks;
+};
+
+struct msg_Motors_Record
+{
+    uint32_t time_us;
+    int16_t left_current; // mA
+    int16_t right_current; // mA
+    uint8_t left_pwm;
+    uint8_t right_pwm;
+};
+
+// Trajectory buffer level (teensy -> rasp): the rasp may have
+// capacity - (segments sent - played) segments in flight (credits)
+struct msg_Trajectory_Status
+{
+    byte command = TRAJECTORY_STATUS;
+    uint16_t received; // counters modulo 65536
+    uint16_t played;
+    uint16_t underruns;
+    uint8_t capacity;
+    uint8_t playing;
+};
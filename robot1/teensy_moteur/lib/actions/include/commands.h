@@ -7,13 +7,27 @@
 #define L_MOTOR_CONTROL 2
 #define R_MOTOR_CONTROL 3
 #define STOP 4
+#define LR_MOTORS_CONTROL 5
+#define TRAJECTORY_SEGMENTS 6 // n * Trajectory_Segment, queued and played one after the other
+#define TRAJECTORY_ABORT 7
 
 
-// two ways : 127 (Convention)
+// two ways : 123-127 (Convention)
+#define HELLO 123     // version | window
+#define SEQUENCED 124 // seq | msg_type | msg_data (protocol version 2)
+#define ACK 125       // next expected seq | bitmap of the following received seqs (uint32)
+#define SNACK 126     // seq missing
 #define NACK 127
 
+// Sequenced frames (must match common/teensy_comms/reliable_link.py)
+#define PROTOCOL_VERSION 2
+#define SEQ_WINDOW 8 // 256 must be a multiple of it
+
 // teensy -> rasp : 128-255 (Convention)
 #define STRING 130
+#define ENCODERS_TELEMETRY 131 // n * msg_Encoders_Record
+#define MOTORS_TELEMETRY 132   // n * msg_Motors_Record
+#define TRAJECTORY_STATUS 133  // msg_Trajectory_Status
 #define UNKNOWN_MSG_TYPE 255
 
 extern void (*functions[256])(byte *msg, byte size);
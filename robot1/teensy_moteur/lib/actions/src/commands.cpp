@@ -1,5 +1,95 @@
 #include <commands.h>
 
+// Sequenced frames reception (protocol version 2)
+byte expected_seq = 0;
+bool received[SEQ_WINDOW];            // out of order frames kept, slot = seq % SEQ_WINDOW
+byte stored_size[SEQ_WINDOW];
+byte stored[SEQ_WINDOW][256];
+
+// calls the function of the message and send back an error message if it is unknown
+void call_function(Com *com, byte *msg, byte size)
+{
+    if (functions[msg[0]] != 0) // verifies if the id of the function received by com is defined
+    {
+        functions[msg[0]](msg, size); // call the function by it's id and with the parameters received by com
+    }
+    else
+    {
+        // If message is unknown, inform the rasp 
+        msg_Unknown_Msg_Type error_message;
+        error_message.type_id = msg[0];
+        com->send_msg((byte *)&error_message, sizeof(msg_Unknown_Msg_Type)); 
+    }
+}
+
+void send_ack(Com *com)
+{
+    uint32_t bitmap = 0;
+    for (byte offset = 0; offset < SEQ_WINDOW - 1; offset++)
+    {
+        byte seq = expected_seq + 1 + offset;
+        if (received[seq % SEQ_WINDOW])
+            bitmap |= (uint32_t)1 << offset;
+    }
+    byte ack[6] = {ACK, expected_seq};
+    memcpy(ack + 2, &bitmap, 4);
+    com->send_control(ack, 6);
+}
+
+// msg : SEQUENCED | seq | msg_type | msg_data
+void handle_sequenced(Com *com, byte *msg, byte size)
+{
+    byte seq = msg[1];
+    byte offset = seq - expected_seq; // modulo 256
+
+    // Duplicates (offset >= 128) and frames out of the window are only acknowledged
+    if (offset < SEQ_WINDOW)
+    {
+        if (offset == 0)
+        {
+            call_function(com, msg + 2, size - 2);
+            expected_seq++;
+            // Deliver the frames received in advance
+            while (received[expected_seq % SEQ_WINDOW])
+            {
+                byte slot = expected_seq % SEQ_WINDOW;
+                received[slot] = false;
+                call_function(com, stored[slot], stored_size[slot]);
+                expected_seq++;
+            }
+        }
+        else if (!received[seq % SEQ_WINDOW])
+        {
+            byte slot = seq % SEQ_WINDOW;
+            memcpy(stored[slot], msg + 2, size - 2);
+            stored_size[slot] = size - 2;
+            received[slot] = true;
+
+            // Ask for the missing frames
+            for (byte missing = expected_seq; missing != seq; missing++)
+            {
+                if (!received[missing % SEQ_WINDOW])
+                {
+                    byte snack[2] = {SNACK, missing};
+                    com->send_control(snack, 2);
+                }
+            }
+        }
+    }
+    send_ack(com);
+}
+
+// msg : HELLO | version | window, reset the reception and answer with what is supported
+void handle_hello(Com *com, byte *msg, byte size)
+{
+    expected_seq = 0;
+    for (byte k = 0; k < SEQ_WINDOW; k++)
+        received[k] = false;
+
+    byte hello[3] = {HELLO, min(msg[1], (byte)PROTOCOL_VERSION), min(msg[2], (byte)SEQ_WINDOW)};
+    com->send_control(hello, 3);
+}
+
 // tries to call the functions called by the rasp and send back an error message otherwise
 void handle_callback(Com *com)
 {
@@ -8,24 +98,22 @@ void handle_callback(Com *com)
     {
         byte *msg = com->read_buffer();
 
-
-        if (functions[msg[0]] != 0) // verifies if the id of the function received by com is defined
-        {
-            functions[msg[0]](msg, size); // call the function by it's id and with the parameters received by com
-        }
-        else if (msg[0] == NACK)
+        if (msg[0] == NACK)
         {
             // send again the message that wasn't received by the rasp
             com->send_msg((byte*)&com->last_msg->msg, com->last_msg->size, true);
         }
+        else if (msg[0] == SEQUENCED)
+        {
+            handle_sequenced(com, msg, size);
+        }
+        else if (msg[0] == HELLO)
+        {
+            handle_hello(com, msg, size);
+        }
         else
         {
-            // If message is unknown, inform the rasp 
-            msg_Unknown_Msg_Type error_message;
-            error_message.type_id = msg[0];
-            com->send_msg((byte *)&error_message, sizeof(msg_Unknown_Msg_Type)); 
+            call_function(com, msg, size);
         }
     }
 }
-
-
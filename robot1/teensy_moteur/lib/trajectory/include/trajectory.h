@@ -0,0 +1,40 @@
+#include <Arduino.h>
+
+class Rolling_Basis;
+
+// Segments kept by the teensy, the rasp never sends more (credits, see msg_Trajectory_Status)
+#define TRAJECTORY_CAPACITY 128
+// Minimum time between two status reports while playing
+#define TRAJECTORY_REPORT_MS 20
+
+#pragma pack(push, 1)
+// Record of TRAJECTORY_SEGMENTS (commands.h), must match SEGMENT_DTYPE in common/teensy_comms/trajectory.py
+struct Trajectory_Segment
+{
+    uint16_t duration_ms;
+    int16_t left_speed;  // signed PWM, -255 to 255
+    int16_t right_speed; // signed PWM, -255 to 255
+};
+#pragma pack(pop)
+
+class Trajectory_Player
+{
+private:
+    Trajectory_Segment segments[TRAJECTORY_CAPACITY];
+    uint16_t head = 0; // next segment to play
+    uint16_t count = 0;
+    uint32_t segment_end_ms = 0;
+
+public:
+    bool playing = false;
+    // Counters since the boot (modulo 65536), reported to the rasp
+    uint16_t received = 0;
+    uint16_t played = 0;
+    uint16_t underruns = 0; // buffer empty at the end of a segment (the end of a trajectory too)
+    uint16_t overflows = 0; // segments received while the buffer was full, dropped
+
+    void push(const Trajectory_Segment *segment);
+    void abort(Rolling_Basis *rolling_basis);
+    // Starts the next segment when the current one is over, true if a segment started or ended
+    bool update(Rolling_Basis *rolling_basis);
+};
@@ -0,0 +1,60 @@
+#include <trajectory.h>
+#include <rolling_basis.h>
+
+void Trajectory_Player::push(const Trajectory_Segment *segment)
+{
+    this->received++;
+    if (this->count >= TRAJECTORY_CAPACITY)
+    {
+        // Dropped, counted as played so that received - played stays the buffer level
+        this->overflows++;
+        this->played++;
+        return;
+    }
+    this->segments[(this->head + this->count) % TRAJECTORY_CAPACITY] = *segment;
+    this->count++;
+}
+
+void Trajectory_Player::abort(Rolling_Basis *rolling_basis)
+{
+    // The dropped segments count as played, so the credits of the rasp stay right
+    this->played += this->count + (this->playing ? 1 : 0);
+    this->head = 0;
+    this->count = 0;
+    if (this->playing)
+        rolling_basis->shutdown_motor();
+    this->playing = false;
+}
+
+bool Trajectory_Player::update(Rolling_Basis *rolling_basis)
+{
+    uint32_t now = millis();
+    if (this->playing && (int32_t)(now - this->segment_end_ms) < 0)
+        return false;
+
+    bool ended = this->playing;
+    if (ended)
+        this->played++;
+
+    if (this->count == 0)
+    {
+        if (this->playing)
+        {
+            rolling_basis->shutdown_motor();
+            this->playing = false;
+            this->underruns++;
+        }
+        return ended;
+    }
+
+    Trajectory_Segment *segment = &this->segments[this->head];
+    this->head = (this->head + 1) % TRAJECTORY_CAPACITY;
+    this->count--;
+    // From the planned end of the previous segment, so the playback does not drift
+    this->segment_end_ms = (this->playing ? this->segment_end_ms : now) + segment->duration_ms;
+    this->playing = true;
+
+    rolling_basis->l_motor(abs(segment->left_speed), segment->left_speed >= 0);
+    rolling_basis->r_motor(abs(segment->right_speed), segment->right_speed >= 0);
+    return true;
+}
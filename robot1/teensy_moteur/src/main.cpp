@@ -1,6 +1,7 @@
 #include <Arduino.h>
 #include <TimerOne.h>
 #include <rolling_basis.h>
+#include <trajectory.h>
 #include <util/atomic.h>
 #include <messages.h>
 
@@ -20,6 +21,7 @@
 #define R_IN1 1
 
 Rolling_Basis *rolling_basis_ptr = new Rolling_Basis();
+Trajectory_Player *trajectory_ptr = new Trajectory_Player();
 
 /* Strat part */
 Com *com;
@@ -48,10 +50,49 @@ void r_motor(byte *msg, byte size)
   rolling_basis_ptr->r_motor(r_motor->speed, r_motor->direction);
 }
 
+// Set when the rasp has to know the buffer level as soon as possible
+bool trajectory_report = false;
+
 void stop(byte *msf, byte size){
+   trajectory_ptr->abort(rolling_basis_ptr);
+   trajectory_report = true;
    rolling_basis_ptr->shutdown_motor();
 }
 
+void lr_motors(byte *msg, byte size)
+{
+  msg_LR_MOTORS *lr_motors = (msg_LR_MOTORS *)msg;
+  rolling_basis_ptr->l_motor(lr_motors->l_speed, lr_motors->l_direction);
+  rolling_basis_ptr->r_motor(lr_motors->r_speed, lr_motors->r_direction);
+}
+
+// msg : TRAJECTORY_SEGMENTS | n * Trajectory_Segment
+void trajectory_segments(byte *msg, byte size)
+{
+  byte nb_segments = (size - 1) / sizeof(Trajectory_Segment);
+  for (byte i = 0; i < nb_segments; i++)
+    trajectory_ptr->push((Trajectory_Segment *)(msg + 1 + i * sizeof(Trajectory_Segment)));
+  trajectory_report = true;
+}
+
+void trajectory_abort(byte *msg, byte size)
+{
+  trajectory_ptr->abort(rolling_basis_ptr);
+  trajectory_report = true;
+}
+
+void send_trajectory_status()
+{
+  msg_Trajectory_Status status;
+  status.received = trajectory_ptr->received;
+  status.played = trajectory_ptr->played;
+  status.underruns = trajectory_ptr->underruns;
+  status.capacity = TRAJECTORY_CAPACITY;
+  status.playing = trajectory_ptr->playing;
+  // Not kept for the NACKs: the next status replaces it
+  com->send_control((byte *)&status, sizeof(msg_Trajectory_Status));
+}
+
 void (*functions[256])(byte *msg, byte size);
 
 extern void handle_callback(Com *com);
@@ -66,6 +107,9 @@ void setup()
   functions[L_MOTOR_CONTROL] = &l_motor;
   functions[R_MOTOR_CONTROL] = &r_motor;
   functions[STOP] = &stop;
+  functions[LR_MOTORS_CONTROL] = &lr_motors;
+  functions[TRAJECTORY_SEGMENTS] = &trajectory_segments;
+  functions[TRAJECTORY_ABORT] = &trajectory_abort;
 
   Serial.begin(115200);
 
@@ -87,6 +131,17 @@ void loop()
 {
   // Com
   handle_callback(com);
+
+  // Trajectory: the credits are sent back while playing, at most every TRAJECTORY_REPORT_MS
+  static uint32_t last_report_ms = 0;
+  bool changed = trajectory_ptr->update(rolling_basis_ptr);
+  if (trajectory_report || (changed && !trajectory_ptr->playing) ||
+      (changed && millis() - last_report_ms >= TRAJECTORY_REPORT_MS))
+  {
+    send_trajectory_status();
+    trajectory_report = false;
+    last_report_ms = millis();
+  }
 }
 
 /*